@@ -0,0 +1,176 @@
+"""
+Prefill benchmark for the Ollama chat path.
+
+Runs the same multi-day coaching conversation twice against a local stub of the
+Ollama API and reports how many prompt tokens had to be prefilled:
+
+  legacy  - flattened /api/generate prompt with the dates at the top of the data block
+  chat    - /api/chat messages with a byte-stable system prompt and the dates last
+
+The stub models Ollama's single-slot prompt cache: a request only prefills the
+tokens after the longest prefix it shares with the previous request (prompt plus
+generated reply). No model or Garmin account is needed.
+
+    uv run python benchmark_prompt_cache.py
+"""
+import re
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, "src")
+
+from modules import data_manager
+from modules.gemini_coach import build_system_prompt, build_full_prompt, build_chat_messages
+from modules.ollama_client import OllamaClient
+
+MODEL = "phi4"
+USER = "benchmark"
+DAYS = 3
+TURNS_PER_DAY = 5
+HISTORY_WINDOW = 5  # same rolling window as the chat page (messages[-6:-1])
+QUESTIONS = [
+    "How are my legs looking after this week?",
+    "Should I do the tempo run tomorrow?",
+    "What pace for the long run on Sunday?",
+    "Any changes because of my plantar fasciitis?",
+    "Summarize the plan for the next two days.",
+]
+
+def tokenize(text):
+    return re.findall(r"\w+|[^\w\s]|\s+", text)
+
+def render_chat_template(messages):
+    text = "".join(f"<|{m['role']}|>\n{m['content']}<|end|>\n" for m in messages)
+    return text + "<|assistant|>\n"
+
+class StubOllama(BaseHTTPRequestHandler):
+    cached_tokens = []
+    turn = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/chat":
+            prompt = render_chat_template(payload["messages"])
+        else:
+            prompt = payload["prompt"]
+        tokens = tokenize(prompt)
+        shared = 0
+        for cached, new in zip(StubOllama.cached_tokens, tokens):
+            if cached != new:
+                break
+            shared += 1
+
+        StubOllama.turn += 1
+        reply = f"Turn {StubOllama.turn}: keep it easy, 40 minutes at conversational pace, then reassess."
+        StubOllama.cached_tokens = tokens + tokenize(reply)
+        body = {
+            "done": True,
+            "prompt_eval_count": len(tokens) - shared,
+            "prompt_tokens": len(tokens),
+            "eval_count": len(tokenize(reply)),
+        }
+        if self.path == "/api/chat":
+            body["message"] = {"role": "assistant", "content": reply}
+        else:
+            body["response"] = reply
+
+        encoded = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+def legacy_system_prompt(system_prompt):
+    # Previous layout: TODAY/TOMORROW/instruction at the top of the data block
+    head, _, dates = system_prompt.rpartition("\n\nTODAY:")
+    instructions, _, data = head.partition("\nATHLETE:")
+    return f"{instructions}\nTODAY:{dates}\n\nATHLETE:{data}"
+
+def seed_user(start_day):
+    data_manager.create_user(USER)
+    data_manager.save_user_profile(USER, {
+        "name": "Bench Runner",
+        "goals": "Sub-3:30 marathon in the spring",
+        "injuries": "Mild plantar fasciitis in left foot",
+    })
+    activities = []
+    for offset in range(1, 29):
+        day = start_day - timedelta(days=offset)
+        activities.append({
+            "activityId": offset, "startTimeLocal": f"{day.isoformat()} 07:30:00",
+            "activityType": {"typeKey": "running"}, "distance": 8000 + 500 * (offset % 5),
+            "duration": 2700 + 60 * (offset % 7), "averageHR": 140 + offset % 9,
+            "averageSpeed": 3.1, "elevationGain": 40 + offset,
+        })
+    data_manager.save_garmin_activities(USER, activities)
+    for offset in range(1, 8):
+        day = start_day - timedelta(days=offset)
+        data_manager.save_journal_entry(USER, day, {
+            "date": day.isoformat(), "rpe": 4 + offset % 4, "mood": "🙂",
+            "soreness": offset % 3, "notes": "Felt fine, slight tightness in the calves.",
+        })
+
+def run_conversation(client, layout, start_day):
+    StubOllama.cached_tokens = []
+    StubOllama.turn = 0
+    total = prefilled = 0
+    for day_index in range(DAYS):
+        today = start_day + timedelta(days=day_index)
+        system_prompt = build_system_prompt(USER, MODEL, today)
+        if layout == "legacy":
+            system_prompt = legacy_system_prompt(system_prompt)
+        messages = []
+        with patch("modules.gemini_coach.get_system_prompt", return_value=system_prompt):
+            for question in QUESTIONS[:TURNS_PER_DAY]:
+                messages.append({"role": "user", "content": question})
+                history = messages[-(HISTORY_WINDOW + 1):-1]
+                if layout == "legacy":
+                    prompt = build_full_prompt(USER, MODEL, True, question, history)
+                    data = client.generate(MODEL, prompt)
+                    reply = data["response"]
+                else:
+                    chat = build_chat_messages(USER, MODEL, True, question, history)
+                    data = client.chat(MODEL, chat)
+                    reply = data["message"]["content"]
+                messages.append({"role": "assistant", "content": reply})
+                total += data["prompt_tokens"]
+                prefilled += data["prompt_eval_count"]
+    return total, prefilled
+
+def main():
+    data_dir = tempfile.mkdtemp(prefix="coach-bench-")
+    server = HTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start_day = date(2026, 3, 9)
+    try:
+        with patch("modules.data_manager.DATA_DIR", data_dir), \
+             patch("modules.data_manager.USERS_DIR", f"{data_dir}/users"):
+            seed_user(start_day)
+            client = OllamaClient(host=f"http://127.0.0.1:{server.server_port}")
+            print(f"{DAYS} days x {TURNS_PER_DAY} turns, history window {HISTORY_WINDOW}\n")
+            print(f"{'layout':<8} {'prompt tokens':>14} {'prefilled':>10} {'reused':>8}")
+            results = {}
+            for layout in ("legacy", "chat"):
+                total, prefilled = run_conversation(client, layout, start_day)
+                results[layout] = prefilled
+                print(f"{layout:<8} {total:>14} {prefilled:>10} {1 - prefilled / total:>8.1%}")
+            saved = 1 - results["chat"] / results["legacy"]
+            print(f"\nchat layout prefills {saved:.1%} fewer tokens than the legacy prompt")
+            print(f"client metrics: {client.metrics()}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,17 @@ from datetime import date, timedelta
 from modules.data_manager import (
     save_journal_entry, load_journal_entries,
     save_user_profile, load_user_profile,
-    list_users, create_user, load_garmin_activities,
+    list_users, create_user, query_activities, count_activities, list_activity_types,
     save_coach_plan, load_coach_plan,
-    save_chat_history, load_chat_history,
-    load_model_prompt, save_model_prompt
+    save_chat_history, load_chat_history, append_chat_message, delete_chat_message,
+    load_model_prompt, save_model_prompt, get_streams_dir, get_data_version
 )
-from modules.gemini_coach import get_ai_coach_response, DEFAULT_COACH_PROMPT
+from modules.charts import weekly_rollups, weekly_volume_chart, long_run_chart, hr_pace_points, hr_pace_chart
+from modules.stream_store import has_streams, read_tier, choose_tier, chart_series, lap_rows
+from modules.gemini_coach import DEFAULT_COACH_PROMPT, MLX_CACHE, preload_mlx_model, get_coach_assessment, peek_coach_assessment, coach_assessment_key
+from modules.coach_jobs import COACH_JOBS
 from modules.garmin_client import sync_garmin_activities, is_garmin_authenticated
+from modules.garmin_parser import ingest_inbox, get_inbox_dir
 
 MODEL_OPTIONS = [
     "deepseek-r1:8b", 
@@ -23,6 +27,108 @@ MODEL_OPTIONS = [
     "phi4"
 ]
 
+# Activities listed per page in the Garmin Activities tab
+ACTIVITY_PAGE_SIZE = 25
+
+# Chat messages loaded per page into the history container
+CHAT_PAGE_SIZE = 50
+
+# Parallel chunk fetches for bulk Garmin syncs
+SYNC_WORKERS = 4
+
+# Points per activity stream chart; the stream tier is picked to stay under it
+CHART_MAX_POINTS = 600
+
+@st.fragment(run_every=0.5)
+def show_pending_response(job_id):
+    """Polls a background coach job and shows its text so far; reruns the app once it has finished."""
+    job = COACH_JOBS.get(job_id)
+    if job is None:
+        st.session_state.pending_job = None
+        return
+    with st.chat_message("assistant"):
+        st.markdown(job.text or "_Coach Conejito is thinking..._")
+    if job.finished:
+        # The job already appended its answer to the saved history
+        st.session_state.pending_job = None
+        st.session_state.messages = load_chat_history(
+            job.user_id, limit=max(CHAT_PAGE_SIZE, len(st.session_state.messages) + 1), include_ids=True
+        )
+        st.session_state.last_response_stats = job.error or job.stats.summary()
+        st.rerun()
+
+def activity_row(act):
+    """Summary columns for one activity in the activities table."""
+    return {
+        "Date": act.get('startTimeLocal', 'Unknown')[:10],
+        "Type": act.get('activityType', {}).get('typeKey', 'unknown'),
+        "Name": act.get('activityName', ''),
+        "Distance (km)": round(act.get('distance', 0) / 1000, 2),
+        "Duration (min)": round(act.get('duration', 0) / 60, 1),
+        "Effect": act.get('trainingEffectLabel', 'N/A'),
+    }
+
+def show_activity_details(act):
+    date_str = act.get('startTimeLocal', 'Unknown')[:10]
+    dist = round(act.get('distance', 0) / 1000, 2)
+    label = act.get('trainingEffectLabel', 'N/A')
+    type_key = act.get('activityType', {}).get('typeKey', 'unknown')
+    act_name = act.get('activityName', '')
+    title = f"{date_str} — {type_key} — {dist}km ({label})"
+    if act_name:
+        title = f"{date_str} — {type_key}: {act_name} — {dist}km ({label})"
+    st.markdown(f"**{title}**")
+
+    duration_min = round(act.get('duration', 0) / 60, 1)
+    is_running = 'running' in type_key.lower()
+
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.write(f"**Duration:** {duration_min} min")
+        if is_running and dist > 0:
+            pace_sec = act.get('duration', 0) / (dist if dist else 1)
+            pace_min = int(pace_sec // 60)
+            pace_rem = int(pace_sec % 60)
+            st.write(f"**Avg Pace:** {pace_min}:{pace_rem:02d} min/km")
+        avg_hr = act.get('averageHR')
+        st.write(f"**Avg HR:** {avg_hr if avg_hr else 'N/A'} bpm")
+        max_hr = act.get('maxHR')
+        st.write(f"**Max HR:** {max_hr if max_hr else 'N/A'} bpm")
+    with col_b:
+        elev = act.get('elevationGain')
+        st.write(f"**Elevation Gain:** {round(elev, 1) if elev else 'N/A'} m")
+        cals = act.get('calories')
+        st.write(f"**Calories:** {round(cals) if cals else 'N/A'} kcal")
+        if is_running:
+            cadence = act.get('averageRunningCadenceInStepsPerMinute')
+            st.write(f"**Cadence:** {round(cadence) if cadence else 'N/A'} spm")
+        vo2 = act.get('vO2MaxValue')
+        st.write(f"**VO2 Max:** {vo2 if vo2 else 'N/A'}")
+        te = act.get('aerobicTrainingEffect')
+        st.write(f"**Training Effect:** {te if te else 'N/A'} / 5.0")
+
+def show_activity_streams(user_id, act):
+    """HR/pace chart and splits for activities imported from FIT files."""
+    streams_dir = get_streams_dir(user_id)
+    activity_id = act.get('activityId')
+    if not has_streams(streams_dir, activity_id):
+        return
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    samples = read_tier(streams_dir, activity_id, choose_tier(act.get('duration', 0), CHART_MAX_POINTS))
+    minutes, heart_rate, pace = chart_series(samples)
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=minutes, y=heart_rate, name="HR (bpm)"), secondary_y=False)
+    fig.add_trace(go.Scatter(x=minutes, y=pace, name="Pace (min/km)"), secondary_y=True)
+    fig.update_yaxes(autorange="reversed", secondary_y=True)
+    fig.update_layout(height=300, margin=dict(l=0, r=0, t=30, b=0), xaxis_title="Minutes")
+    st.plotly_chart(fig, use_container_width=True)
+
+    laps = read_tier(streams_dir, activity_id, "laps")
+    if len(laps):
+        st.dataframe(lap_rows(laps), hide_index=True)
+
 # Page Config
 st.set_page_config(
     page_title="Coach Conejito HQ",
@@ -46,8 +152,17 @@ if "last_user" not in st.session_state:
     st.session_state.last_user = current_user
 
 if st.session_state.last_user != current_user:
-    st.session_state.messages = load_chat_history(current_user)
+    st.session_state.messages = load_chat_history(current_user, limit=CHAT_PAGE_SIZE, include_ids=True)
     st.session_state.last_user = current_user
+    st.session_state.pending_job = None
+    st.session_state.last_response_stats = None
+    st.session_state.assessment = None
+    st.session_state.assessment_key = None
+
+# Pick up a reply still generating for this athlete (e.g. after a browser reload)
+if not st.session_state.get("pending_job"):
+    active_jobs = COACH_JOBS.active_jobs(current_user)
+    st.session_state.pending_job = active_jobs[-1].id if active_jobs else None
 
 if st.sidebar.button("🗑️ Clear Chat History"):
     save_chat_history(current_user, [])
@@ -94,48 +209,53 @@ if page == "Command Center":
         
         # 1. Initialize and Load history
         if "messages" not in st.session_state:
-            st.session_state.messages = load_chat_history(current_user)
+            st.session_state.messages = load_chat_history(current_user, limit=CHAT_PAGE_SIZE, include_ids=True)
 
         # 2. Display existing history
         with st.container(height=600):
+            oldest_id = st.session_state.messages[0]["id"] if st.session_state.messages else None
+            if oldest_id and load_chat_history(current_user, limit=1, before=oldest_id):
+                if st.button("⬆️ Load earlier messages", key="load_earlier"):
+                    earlier = load_chat_history(current_user, limit=CHAT_PAGE_SIZE, before=oldest_id, include_ids=True)
+                    st.session_state.messages = earlier + st.session_state.messages
+                    st.rerun()
+
             for i, msg in enumerate(st.session_state.messages):
                 with st.chat_message(msg["role"]):
                     c1, c2 = st.columns([0.9, 0.1])
                     with c1:
                         st.markdown(msg["content"])
                     with c2:
-                        if st.button("❌", key=f"del_{i}", help="Delete this message"):
-                            st.session_state.messages.pop(i)
-                            save_chat_history(current_user, st.session_state.messages)
+                        if st.button("❌", key=f"del_{msg['id']}", help="Delete this message"):
+                            delete_chat_message(current_user, st.session_state.messages.pop(i)["id"])
                             st.rerun()
 
+            # Reply generating in the background; reruns do not interrupt it
+            if st.session_state.pending_job:
+                show_pending_response(st.session_state.pending_job)
+            elif st.session_state.get("last_response_stats"):
+                st.caption(st.session_state.last_response_stats)
+
         # 3. Handle Chat Input
-        if prompt := st.chat_input("Ask Coach Conejito..."):
-            # Append and display user message
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.markdown(prompt)
-
-            # Generate and display assistant response
-            with st.chat_message("assistant"):
-                with st.spinner("Coach is thinking..."):
-                    # Use a rolling window of history for context
-                    history_context = st.session_state.messages[-6:-1] if len(st.session_state.messages) > 1 else []
-                    
-                    response, duration = get_ai_coach_response(
-                        st.session_state.gemini_api_key,
-                        current_user,
-                        model_name=st.session_state.model_name,
-                        chat_mode=True,
-                        user_message=prompt,
-                        history=history_context
-                    )
-                    st.markdown(response)
-                    st.caption(f"Generated in {duration:.2f}s")
-                    
-                    # Persist to state and disk immediately
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    save_chat_history(current_user, st.session_state.messages)
+        # One turn at a time: the next question's history must include this reply
+        if prompt := st.chat_input("Ask Coach Conejito...", disabled=bool(st.session_state.pending_job)):
+            # Persist the question first so it survives reruns while the answer is generated
+            message = {"role": "user", "content": prompt}
+            message["id"] = append_chat_message(current_user, message)
+            st.session_state.messages.append(message)
+
+            # Use a rolling window of history for context
+            history_context = st.session_state.messages[-6:-1] if len(st.session_state.messages) > 1 else []
+
+            st.session_state.pending_job = COACH_JOBS.submit(
+                current_user,
+                st.session_state.gemini_api_key,
+                st.session_state.model_name,
+                prompt,
+                history_context
+            )
+            st.session_state.last_response_stats = None
+            st.rerun()
 
         # 4. Action Button for the LAST message
         if st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
@@ -148,59 +268,100 @@ if page == "Command Center":
     with col_data:
         st.subheader("📊 Athlete Data")
         
-        tab_plan, tab1, tab2 = st.tabs(["📋 Active Plan", "🏃 Garmin Activities", "📓 Subjective Journals"])
+        tab_plan, tab_trends, tab1, tab2 = st.tabs(["📋 Active Plan", "📈 Trends", "🏃 Garmin Activities", "📓 Subjective Journals"])
         
         with tab_plan:
+            col_analyze, col_refresh = st.columns([1, 1])
+            with col_analyze:
+                analyze = st.button("🔍 Analyze", help="Brief assessment of your current state and the next 2 days. Reused until your data changes.")
+            with col_refresh:
+                regenerate = st.button("🔄 Regenerate", help="Ask the model again even if nothing changed.")
+            # Changes with a sync, a journal save, another model or a new day
+            assessment_key = coach_assessment_key(current_user, st.session_state.model_name)
+            if analyze or regenerate:
+                with st.spinner("Analyzing..."):
+                    st.session_state.assessment = get_coach_assessment(
+                        st.session_state.gemini_api_key,
+                        current_user,
+                        model_name=st.session_state.model_name,
+                        use_cache=not regenerate
+                    )
+                st.session_state.assessment_key = assessment_key
+            elif st.session_state.get("assessment_key") != assessment_key:
+                # The shown assessment is stale: swap in the one cached for the current data, if any
+                # (prepared overnight by modules.coach_briefs or earlier today)
+                st.session_state.assessment = peek_coach_assessment(current_user, st.session_state.model_name)
+                st.session_state.assessment_key = assessment_key
+            if st.session_state.get("assessment"):
+                text, duration, cached = st.session_state.assessment
+                st.markdown(text)
+                if cached:
+                    st.caption(f"⚡ Cached · originally generated in {duration:.1f}s · your data has not changed since")
+                else:
+                    st.caption(f"Generated in {duration:.1f}s")
+                st.markdown("---")
+
             plan = load_coach_plan(current_user)
             st.markdown(plan)
 
+        with tab_trends:
+            # Cached per data version: rebuilt only after a sync or journal save
+            data_version = get_data_version(current_user)
+            if weekly_rollups(current_user, data_version).empty:
+                st.info("No Garmin data. Sync in Settings.")
+            else:
+                st.caption("Weekly volume")
+                st.altair_chart(weekly_volume_chart(current_user, data_version), use_container_width=True)
+                st.caption("Long run trend")
+                st.altair_chart(long_run_chart(current_user, data_version), use_container_width=True)
+                if not hr_pace_points(current_user, data_version).empty:
+                    st.caption("HR vs pace (runs)")
+                    st.altair_chart(hr_pace_chart(current_user, data_version), use_container_width=True)
+
         with tab1:
-            activities = load_garmin_activities(current_user)
-            if activities:
-                for act in activities:
-                    date_str = act.get('startTimeLocal', 'Unknown')[:10]
-                    dist = round(act.get('distance', 0) / 1000, 2)
-                    label = act.get('trainingEffectLabel', 'N/A')
-                    type_key = act.get('activityType', {}).get('typeKey', 'unknown')
-                    act_name = act.get('activityName', '')
-                    title = f"{date_str} — {type_key} — {dist}km ({label})"
-                    if act_name:
-                        title = f"{date_str} — {type_key}: {act_name} — {dist}km ({label})"
-                    with st.expander(title):
-                        duration_min = round(act.get('duration', 0) / 60, 1)
-                        is_running = 'running' in type_key.lower()
-
-                        col_a, col_b = st.columns(2)
-                        with col_a:
-                            st.write(f"**Duration:** {duration_min} min")
-                            if is_running and dist > 0:
-                                pace_sec = act.get('duration', 0) / (dist if dist else 1)
-                                pace_min = int(pace_sec // 60)
-                                pace_rem = int(pace_sec % 60)
-                                st.write(f"**Avg Pace:** {pace_min}:{pace_rem:02d} min/km")
-                            avg_hr = act.get('averageHR')
-                            st.write(f"**Avg HR:** {avg_hr if avg_hr else 'N/A'} bpm")
-                            max_hr = act.get('maxHR')
-                            st.write(f"**Max HR:** {max_hr if max_hr else 'N/A'} bpm")
-                        with col_b:
-                            elev = act.get('elevationGain')
-                            st.write(f"**Elevation Gain:** {round(elev, 1) if elev else 'N/A'} m")
-                            cals = act.get('calories')
-                            st.write(f"**Calories:** {round(cals) if cals else 'N/A'} kcal")
-                            if is_running:
-                                cadence = act.get('averageRunningCadenceInStepsPerMinute')
-                                st.write(f"**Cadence:** {round(cadence) if cadence else 'N/A'} spm")
-                            vo2 = act.get('vO2MaxValue')
-                            st.write(f"**VO2 Max:** {vo2 if vo2 else 'N/A'}")
-                            te = act.get('aerobicTrainingEffect')
-                            st.write(f"**Training Effect:** {te if te else 'N/A'} / 5.0")
+            activity_types = list_activity_types(current_user)
+            if activity_types:
+                col_dates, col_type = st.columns([1, 1])
+                with col_dates:
+                    date_range = st.date_input("Dates", value=(), key="activity_dates")
+                with col_type:
+                    type_filter = st.selectbox("Type", ["All"] + activity_types, key="activity_type")
+                start_date = date_range[0] if len(date_range) > 0 else None
+                end_date = date_range[1] if len(date_range) > 1 else None
+                type_key = None if type_filter == "All" else type_filter
+
+                # Only the current page is read from the index and rendered
+                total = count_activities(current_user, start_date, end_date, type_key)
+                pages = max(1, -(-total // ACTIVITY_PAGE_SIZE))
+                page = st.number_input(
+                    "Page", min_value=1, max_value=pages, value=1, step=1,
+                    key=f"activity_page_{start_date}_{end_date}_{type_key}"
+                )
+                activities = query_activities(
+                    current_user, start_date, end_date, type_key, page=page - 1, page_size=ACTIVITY_PAGE_SIZE
+                )
+                st.caption(f"{total} activities · page {page} of {pages}")
+
+                table = st.dataframe(
+                    [activity_row(act) for act in activities],
+                    hide_index=True,
+                    on_select="rerun",
+                    selection_mode="single-row",
+                    key=f"activity_table_{page}_{start_date}_{end_date}_{type_key}"
+                )
+                # Details are built only for the selected row
+                if table.selection.rows:
+                    show_activity_details(activities[table.selection.rows[0]])
+                    show_activity_streams(current_user, activities[table.selection.rows[0]])
+                else:
+                    st.caption("Select a row for details.")
             else:
                 st.info("No Garmin data. Sync in Settings.")
 
         with tab2:
-            entries = load_journal_entries(current_user)
+            entries = load_journal_entries(current_user, limit=5)
             if entries:
-                for entry in entries[:5]:
+                for entry in entries:
                     with st.expander(f"{entry['date']} | RPE: {entry['rpe']}"):
                         st.write(f"**Mood:** {entry['mood']} | **Soreness:** {entry['soreness']}")
                         st.caption(entry['notes'])
@@ -229,7 +390,21 @@ elif page == "Settings":
     if st.session_state.model_name not in MODEL_OPTIONS:
         MODEL_OPTIONS.append(st.session_state.model_name)
 
-    st.session_state.model_name = st.selectbox("Model", MODEL_OPTIONS, index=MODEL_OPTIONS.index(st.session_state.model_name))
+    selected_model = st.selectbox("Model", MODEL_OPTIONS, index=MODEL_OPTIONS.index(st.session_state.model_name))
+    if selected_model != st.session_state.model_name:
+        # Start loading MLX weights now so the first chat turn does not wait for them
+        preload_mlx_model(selected_model)
+    st.session_state.model_name = selected_model
+
+    if selected_model.startswith("mlx-"):
+        cache_stats = MLX_CACHE.stats()
+        loaded = ", ".join(
+            f"{name} ({cache_stats['load_seconds'][name]:.1f}s load)" for name in cache_stats["models"]
+        ) or "none"
+        st.caption(
+            f"MLX models in memory: {loaded} · {cache_stats['resident_bytes'] / 1024 ** 3:.1f} / "
+            f"{cache_stats['max_bytes'] / 1024 ** 3:.0f} GB · {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+        )
 
     st.markdown("---")
     st.subheader("📝 System Prompt")
@@ -259,7 +434,7 @@ elif page == "Settings":
     
     if is_auth:
         st.success("Status: Authenticated ✅")
-        if st.button("Sync Last 7 Days"):
+        if st.button("Sync New Activities", help="Fetches activities since the last sync (or the last 7 days on first sync)."):
             with st.spinner("Syncing..."):
                 result = sync_garmin_activities(current_user)
                 if "Session expired" in result:
@@ -272,7 +447,7 @@ elif page == "Settings":
             start_date = st.date_input("Since", value=date.today() - timedelta(days=30))
             if st.button("Start Bulk Sync"):
                 with st.spinner("Bulk Syncing..."):
-                    result = sync_garmin_activities(current_user, start_date_obj=start_date)
+                    result = sync_garmin_activities(current_user, start_date_obj=start_date, workers=SYNC_WORKERS)
                     if "Session expired" in result:
                         st.error(result)
                         is_auth = False
@@ -291,11 +466,23 @@ elif page == "Settings":
             if st.form_submit_button("Login & Sync"):
                 with st.spinner("Logging in..."):
                     start_date = date.today() - timedelta(days=30) if do_bulk else None
-                    result = sync_garmin_activities(current_user, g_email, g_pass, start_date_obj=start_date)
+                    result = sync_garmin_activities(current_user, g_email, g_pass, start_date_obj=start_date, workers=SYNC_WORKERS)
                     st.info(result)
                     if "Successfully" in result:
                         st.rerun()
 
+    with st.expander("Import FIT Files"):
+        st.caption(f"Copy .fit files into `{get_inbox_dir(current_user)}`, then import them.")
+        if st.button("Import FIT Files"):
+            with st.spinner("Parsing FIT files..."):
+                report = ingest_inbox(current_user)
+            st.info(
+                f"Imported {len(report['ingested'])} activities, added streams to {len(report['matched'])} synced ones, "
+                f"skipped {len(report['duplicates'])} already imported files."
+            )
+            for name, error in report["failed"].items():
+                st.error(f"{name}: {error}")
+
     st.markdown("---")
     st.subheader("👤 Profile")
     profile = load_user_profile(current_user)
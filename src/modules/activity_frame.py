@@ -0,0 +1,149 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from modules.file_io import atomic_write_bytes
+
+# Columnar copy of a user's activities for vectorized analytics.
+# Stored under processed/activity_frame/ as Arrow IPC part files: each sync
+# appends one part with just the activities it wrote, and reads memory-map
+# every part and keep the newest row per activity id. Once there are too many
+# parts they are merged back into one. The frame is derived data: it records
+# the activity index's content token it was built from (source_token) and is
+# rebuilt from the index whenever the index has changed since.
+FRAME_DIRNAME = "activity_frame"
+MAX_PARTS = 16
+SOURCE_TOKEN_FILENAME = "source_token"
+
+SCHEMA = pa.schema([
+    ("activity_id", pa.string()),
+    ("start_time", pa.string()),
+    ("date", pa.timestamp("ns")),
+    ("type", pa.string()),
+    ("name", pa.string()),
+    ("distance_km", pa.float64()),
+    ("duration_min", pa.float64()),
+    ("avg_hr", pa.float64()),
+    ("max_hr", pa.float64()),
+    ("avg_speed", pa.float64()),
+    ("elevation_m", pa.float64()),
+    ("cadence_spm", pa.float64()),
+    ("aerobic_te", pa.float64()),
+    ("te_label", pa.string()),
+    ("calories", pa.float64()),
+    ("vo2max", pa.float64()),
+])
+
+# frame column -> Garmin activity key for the plain numeric fields
+NUMERIC_FIELDS = {
+    "avg_hr": "averageHR",
+    "max_hr": "maxHR",
+    "avg_speed": "averageSpeed",
+    "elevation_m": "elevationGain",
+    "cadence_spm": "averageRunningCadenceInStepsPerMinute",
+    "aerobic_te": "aerobicTrainingEffect",
+    "calories": "calories",
+    "vo2max": "vO2MaxValue",
+}
+
+def _number(value):
+    return np.nan if value is None or isinstance(value, str) else float(value)
+
+def normalize_activities(activities):
+    """Raw Garmin activity dicts -> typed DataFrame in the same order."""
+    activities = activities or []
+    start_times = pd.Series([a.get("startTimeLocal") or "" for a in activities], dtype=object)
+    columns = {
+        "activity_id": [str(a.get("activityId", "")) for a in activities],
+        "start_time": start_times,
+        "date": pd.to_datetime(start_times.str[:10], format="%Y-%m-%d", errors="coerce"),
+        "type": [(a.get("activityType") or {}).get("typeKey") for a in activities],
+        "name": [a.get("activityName") for a in activities],
+        "distance_km": np.array([_number(a.get("distance") or 0) for a in activities], dtype="float64") / 1000,
+        "duration_min": np.array([_number(a.get("duration") or 0) for a in activities], dtype="float64") / 60,
+        "te_label": [a.get("trainingEffectLabel") for a in activities],
+    }
+    for column, key in NUMERIC_FIELDS.items():
+        columns[column] = np.array([_number(a.get(key)) for a in activities], dtype="float64")
+    frame = pd.DataFrame(columns)
+    return frame[SCHEMA.names]
+
+def _to_table(frame):
+    return pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+def _part_paths(frame_dir):
+    return sorted(glob.glob(os.path.join(frame_dir, "part-*.arrow")))
+
+def _write_part(frame_dir, table, seq):
+    """Writes one part through a temp file + rename; returns its path."""
+    path = os.path.join(frame_dir, f"part-{seq:08d}.arrow")
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, SCHEMA) as writer:
+        writer.write_table(table)
+    atomic_write_bytes(path, sink.getvalue())
+    return path
+
+def _next_seq(parts):
+    if not parts:
+        return 1
+    return int(os.path.basename(parts[-1])[len("part-"):-len(".arrow")]) + 1
+
+def read_source_token(frame_dir):
+    """The activity index content token the frame matches, or None."""
+    try:
+        with open(os.path.join(frame_dir, SOURCE_TOKEN_FILENAME), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _write_source_token(frame_dir, source_token):
+    if source_token is not None:
+        atomic_write_bytes(os.path.join(frame_dir, SOURCE_TOKEN_FILENAME), source_token.encode("ascii"))
+
+def append_activities(frame_dir, activities, source_token=None):
+    """
+    Appends one part with the given activities, merging parts once there are more than MAX_PARTS.
+    source_token, if given, is recorded as the index state the frame now matches.
+    """
+    if not activities:
+        return
+    os.makedirs(frame_dir, exist_ok=True)
+    parts = _part_paths(frame_dir)
+    _write_part(frame_dir, _to_table(normalize_activities(activities)), _next_seq(parts))
+    if len(parts) + 1 > MAX_PARTS:
+        compact(frame_dir)
+    _write_source_token(frame_dir, source_token)
+
+def write_frame(frame_dir, frame, source_token=None):
+    """Replaces every part with a single part holding `frame`."""
+    os.makedirs(frame_dir, exist_ok=True)
+    parts = _part_paths(frame_dir)
+    _write_part(frame_dir, _to_table(frame), _next_seq(parts))
+    for path in parts:
+        os.remove(path)
+    _write_source_token(frame_dir, source_token)
+
+def compact(frame_dir):
+    write_frame(frame_dir, read_frame(frame_dir))
+
+def read_frame(frame_dir):
+    """All activities newest first, one row per activity id (the most recently appended wins)."""
+    sources = []
+    for path in _part_paths(frame_dir):
+        try:
+            sources.append(pa.memory_map(path))
+        except FileNotFoundError:
+            # Merged away by a concurrent compaction; its rows are in the newer part
+            continue
+    if not sources:
+        return normalize_activities([])
+    try:
+        # Record batches reference the mapped pages directly until to_pandas() materializes them
+        tables = [pa.ipc.open_file(source).read_all() for source in sources]
+        frame = pa.concat_tables(tables).to_pandas()
+    finally:
+        for source in sources:
+            source.close()
+    frame = frame.drop_duplicates("activity_id", keep="last")
+    return frame.sort_values("start_time", ascending=False, kind="stable").reset_index(drop=True)
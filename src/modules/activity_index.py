@@ -0,0 +1,459 @@
+import os
+import json
+import uuid
+import hashlib
+import sqlite3
+import time
+from datetime import datetime
+from modules.file_io import atomic_write_bytes, append_lines
+
+# Per-user SQLite index over raw/garmin/activity_*.json.
+# Each row keeps a compact copy of the activity plus the source file's
+# mtime/size, so reads only re-parse files that changed on disk.
+# The rollups table holds weekly/monthly/yearly totals, recomputed only
+# for the periods touched by each index write.
+# Activities may also live in an append-only pack file (one compact JSON
+# object per line); their rows are keyed "<pack name>:<activity id>" and
+# the pack is re-read from the last indexed offset when it grows.
+# Activity files are written by rename, which bumps the directory mtime, so a
+# refresh whose garmin_dir and pack stats match the last scan skips the scandir.
+INDEX_FILENAME = "activity_index.sqlite"
+PACK_FILENAME = "activities.pack.jsonl"
+
+# The index is derived data: bumping this rebuilds it from the raw files.
+SCHEMA_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    filename TEXT PRIMARY KEY,
+    activity_id TEXT,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    week_key TEXT,
+    month_key TEXT,
+    year_key TEXT,
+    type_key TEXT,
+    distance REAL NOT NULL,
+    duration REAL NOT NULL,
+    elevation REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_activities_activity_id ON activities (activity_id);
+CREATE INDEX IF NOT EXISTS idx_activities_start_time ON activities (start_time);
+CREATE INDEX IF NOT EXISTS idx_activities_week ON activities (week_key);
+CREATE INDEX IF NOT EXISTS idx_activities_month ON activities (month_key);
+CREATE INDEX IF NOT EXISTS idx_activities_year ON activities (year_key);
+CREATE INDEX IF NOT EXISTS idx_activities_type ON activities (type_key, start_time);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    period_key TEXT NOT NULL,
+    distance_km REAL NOT NULL,
+    duration_min REAL NOT NULL,
+    elevation_m REAL NOT NULL,
+    sessions INTEGER NOT NULL,
+    longest_km REAL NOT NULL,
+    PRIMARY KEY (period, period_key)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# A scan stamp is only trusted once its mtimes are this old, so a change made in
+# the same filesystem timestamp tick as the scan is never missed
+SCAN_STAMP_SETTLE_NS = 2_000_000_000
+
+# rollups.period -> activities column holding that period's key
+PERIOD_COLUMNS = {"week": "week_key", "month": "month_key", "year": "year_key"}
+
+def is_activity_file(filename):
+    return filename.endswith(".json") and filename.startswith("activity_")
+
+def connect(index_path):
+    conn = sqlite3.connect(index_path, timeout=30)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS activities")
+            conn.execute("DROP TABLE IF EXISTS rollups")
+            conn.execute("DROP TABLE IF EXISTS meta")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+def period_keys(start_time):
+    """(week, month, year) keys for a startTimeLocal string, or Nones if it has no usable date."""
+    date_str = (start_time or "")[:10]
+    try:
+        act_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, None
+    return act_date.strftime('%G-W%V'), date_str[:7], date_str[:4]
+
+def content_hash(activity):
+    """Stable hash of an activity's content, independent of key order and formatting."""
+    canonical = json.dumps(activity, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _pack_key(activity_id):
+    return f"{PACK_FILENAME}:{activity_id}"
+
+def _row_for(filename, mtime_ns, size, activity):
+    """Index row; for pack entries mtime_ns is 0 and size is the line's byte offset."""
+    start_time = activity.get("startTimeLocal", "") or ""
+    week_key, month_key, year_key = period_keys(start_time)
+    return (
+        filename,
+        str(activity.get("activityId", "")),
+        mtime_ns,
+        size,
+        start_time,
+        week_key,
+        month_key,
+        year_key,
+        (activity.get("activityType") or {}).get("typeKey"),
+        activity.get("distance") or 0,
+        activity.get("duration") or 0,
+        activity.get("elevationGain") or 0,
+        content_hash(activity),
+        json.dumps(activity, separators=(",", ":")),
+    )
+
+def _touched_periods(conn, filenames):
+    touched = set()
+    for filename in filenames:
+        row = conn.execute(
+            "SELECT week_key, month_key, year_key FROM activities WHERE filename = ?", (filename,)
+        ).fetchone()
+        if row:
+            touched.update(zip(PERIOD_COLUMNS, row))
+    return touched
+
+def _update_rollups(conn, periods):
+    for period, key in periods:
+        if key is None:
+            continue
+        column = PERIOD_COLUMNS[period]
+        distance, duration, elevation, sessions, longest = conn.execute(
+            "SELECT SUM(distance), SUM(duration), SUM(elevation), COUNT(*), MAX(distance) "
+            f"FROM activities WHERE {column} = ?",
+            (key,),
+        ).fetchone()
+        if not sessions:
+            conn.execute("DELETE FROM rollups WHERE period = ? AND period_key = ?", (period, key))
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (period, key, distance / 1000, duration / 60, elevation, sessions, longest / 1000),
+        )
+
+def _apply(conn, rows, removed_filenames):
+    """
+    Upserts/deletes activity rows and refreshes the rollups of every period they touch.
+    An upserted activity replaces any row for the same activity id from another source.
+    """
+    with conn:
+        removed_filenames = list(removed_filenames)
+        for row in rows:
+            if row[1]:
+                removed_filenames.extend(
+                    filename for (filename,) in conn.execute(
+                        "SELECT filename FROM activities WHERE activity_id = ? AND filename != ?", (row[1], row[0])
+                    )
+                )
+        touched = _touched_periods(conn, [row[0] for row in rows] + removed_filenames)
+        for row in rows:
+            touched.update(zip(PERIOD_COLUMNS, row[5:8]))
+        conn.executemany(
+            "INSERT OR REPLACE INTO activities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.executemany("DELETE FROM activities WHERE filename = ?", [(f,) for f in removed_filenames])
+        _update_rollups(conn, touched)
+        if rows or removed_filenames:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("content_token", json.dumps(uuid.uuid4().hex)))
+
+def index_activity_file(conn, path, activity):
+    """Record an activity that was just written to `path`, without re-reading it."""
+    stat = os.stat(path)
+    _apply(conn, [_row_for(os.path.basename(path), stat.st_mtime_ns, stat.st_size, activity)], [])
+
+def _scan_stamp(garmin_dir):
+    """[mtime_ns, size] of garmin_dir and of the pack file (None where missing)."""
+    stamp = []
+    for path in (garmin_dir, os.path.join(garmin_dir, PACK_FILENAME)):
+        try:
+            stat = os.stat(path)
+            stamp.append([stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+def refresh_index(conn, garmin_dir):
+    """
+    Brings the index in line with the files in garmin_dir.
+    Nothing is scanned while garmin_dir and the pack file are unchanged since the last scan;
+    otherwise only files whose mtime or size differ from the indexed row are parsed.
+    Returns the number of rows added, updated or removed.
+    """
+    stamp = _scan_stamp(garmin_dir)
+    last_stamp = _get_meta(conn, "scan")
+    if last_stamp is not None and last_stamp == stamp:
+        return 0
+
+    on_disk = {}
+    if os.path.isdir(garmin_dir):
+        with os.scandir(garmin_dir) as it:
+            for entry in it:
+                if is_activity_file(entry.name) and entry.is_file():
+                    on_disk[entry.name] = entry.stat()
+
+    indexed = {
+        filename: (mtime_ns, size)
+        for filename, mtime_ns, size in conn.execute("SELECT filename, mtime_ns, size FROM activities")
+        if is_activity_file(filename)
+    }
+
+    changed = []
+    for filename, stat in on_disk.items():
+        if indexed.get(filename) != (stat.st_mtime_ns, stat.st_size):
+            with open(os.path.join(garmin_dir, filename), "r") as f:
+                changed.append(_row_for(filename, stat.st_mtime_ns, stat.st_size, json.load(f)))
+    removed = [filename for filename in indexed if filename not in on_disk]
+
+    if changed or removed:
+        _apply(conn, changed, removed)
+    count = len(changed) + len(removed) + _refresh_pack(conn, garmin_dir)
+    now = time.time_ns()
+    settled = all(part is None or now - part[0] > SCAN_STAMP_SETTLE_NS for part in stamp)
+    if (stamp if settled else None) != last_stamp:
+        _set_meta(conn, "scan", stamp if settled else None)
+    return count
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def _set_meta(conn, key, value):
+    with conn:
+        if value is None:
+            conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+def content_token(conn):
+    """
+    Opaque token that changes with every write to the activity rows (adds, edits, deletes),
+    for derived copies such as the activity frame to detect that they are stale.
+    """
+    token = _get_meta(conn, "content_token")
+    if token is None:
+        # Index written before tokens existed: start one so derived copies rebuild once
+        token = uuid.uuid4().hex
+        _set_meta(conn, "content_token", token)
+    return token
+
+def _pack_filenames(conn):
+    return [
+        filename for (filename,) in
+        conn.execute("SELECT filename FROM activities WHERE filename LIKE ?", (PACK_FILENAME + ":%",))
+    ]
+
+def _read_pack_rows(path, offset):
+    """
+    Parses complete lines from `offset`; later lines for the same activity win.
+    Returns (rows, end offset of the last complete line). Unparseable lines are skipped.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        buf = f.read()
+    rows = {}
+    pos = 0
+    while True:
+        newline = buf.find(b"\n", pos)
+        if newline < 0:
+            break  # trailing partial line from an interrupted append
+        line = buf[pos:newline].strip()
+        if line:
+            try:
+                activity = json.loads(line)
+            except ValueError:
+                activity = None
+            if isinstance(activity, dict) and activity.get("activityId"):
+                key = _pack_key(activity["activityId"])
+                rows[key] = _row_for(key, 0, offset + pos, activity)
+        pos = newline + 1
+    return list(rows.values()), offset + pos
+
+def _refresh_pack(conn, garmin_dir):
+    path = os.path.join(garmin_dir, PACK_FILENAME)
+    state = _get_meta(conn, "pack")
+    if not os.path.exists(path):
+        stale = _pack_filenames(conn)
+        if stale or state:
+            _apply(conn, [], stale)
+            _set_meta(conn, "pack", None)
+        return len(stale)
+
+    stat = os.stat(path)
+    if state and state["size"] == stat.st_size and state["mtime_ns"] == stat.st_mtime_ns:
+        return 0
+
+    if state and stat.st_size > state["size"]:
+        # Appended since last read: only parse the new tail
+        rows, end = _read_pack_rows(path, state["size"])
+        removed = []
+    else:
+        rows, end = _read_pack_rows(path, 0)
+        keys = {row[0] for row in rows}
+        removed = [filename for filename in _pack_filenames(conn) if filename not in keys]
+    # A loose activity_<id>.json takes precedence over the pack copy
+    loose_ids = {
+        activity_id for filename, activity_id in conn.execute("SELECT filename, activity_id FROM activities")
+        if is_activity_file(filename)
+    }
+    rows = [row for row in rows if row[1] not in loose_ids]
+    _apply(conn, rows, removed)
+    # Remember where the last complete line ends so a partial tail is re-read once finished
+    _set_meta(conn, "pack", {"size": end, "mtime_ns": stat.st_mtime_ns if end == stat.st_size else 0})
+    return len(rows) + len(removed)
+
+def _pack_line(activity):
+    return (json.dumps(activity, separators=(",", ":")) + "\n").encode("utf-8")
+
+def append_to_pack(conn, garmin_dir, activities):
+    """Appends activities to the pack file with a single fsync and indexes them."""
+    if not activities:
+        return
+    _refresh_pack(conn, garmin_dir)
+    path = os.path.join(garmin_dir, PACK_FILENAME)
+    lines = [_pack_line(activity) for activity in activities]
+    offset = append_lines(path, lines)
+    rows = []
+    for activity, line in zip(activities, lines):
+        rows.append(_row_for(_pack_key(activity["activityId"]), 0, offset, activity))
+        offset += len(line)
+    _apply(conn, rows, [])
+    stat = os.stat(path)
+    _set_meta(conn, "pack", {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+def compact_pack(conn, garmin_dir):
+    """
+    Rewrites every indexed activity (loose files and pack) into a fresh pack file,
+    atomically replacing the old one, then removes the loose activity_*.json files.
+    Returns the number of activities in the new pack.
+    """
+    refresh_index(conn, garmin_dir)
+    path = os.path.join(garmin_dir, PACK_FILENAME)
+    activities = load_indexed_activities(conn)
+    atomic_write_bytes(path, b"".join(_pack_line(activity) for activity in reversed(activities)))
+    for filename in os.listdir(garmin_dir):
+        if is_activity_file(filename):
+            os.remove(os.path.join(garmin_dir, filename))
+    _set_meta(conn, "pack", None)
+    refresh_index(conn, garmin_dir)
+    return len(activities)
+
+def indexed_hashes(conn, activity_ids):
+    """activity id (str) -> content hash for the given ids that are in the index."""
+    hashes = {}
+    ids = [str(a) for a in activity_ids]
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        hashes.update(conn.execute(
+            f"SELECT activity_id, content_hash FROM activities WHERE activity_id IN ({placeholders})", batch
+        ).fetchall())
+    return hashes
+
+def indexed_ids_by_start_gmt(conn, start_times):
+    """startTimeGMT -> activity id (str) for the given start times that are in the index."""
+    ids = {}
+    times = list(start_times)
+    for i in range(0, len(times), 500):
+        batch = times[i:i + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        ids.update(conn.execute(
+            f"SELECT json_extract(data, '$.startTimeGMT'), activity_id FROM activities "
+            f"WHERE json_extract(data, '$.startTimeGMT') IN ({placeholders})", batch
+        ).fetchall())
+    return ids
+
+def load_indexed_activities(conn):
+    """All indexed activities, newest first."""
+    return list(iter_indexed_activities(conn))
+
+def _activity_filters(since=None, until=None, type_key=None):
+    """WHERE clause for start_time in [since, until) and an exact activity type."""
+    clauses = []
+    params = []
+    if since:
+        clauses.append("start_time >= ?")
+        params.append(since)
+    if until:
+        clauses.append("start_time < ?")
+        params.append(until)
+    if type_key:
+        clauses.append("type_key = ?")
+        params.append(type_key)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def iter_indexed_activities(conn, since=None, limit=None, until=None, type_key=None, offset=0):
+    """
+    Yields indexed activities newest first, straight off the SQLite cursor.
+    `since`/`until` are ISO date/datetime strings bounding the start time (until is exclusive);
+    `type_key` keeps one activity type; `offset` skips that many matches (for paging).
+    """
+    where, params = _activity_filters(since, until, type_key)
+    query = f"SELECT data FROM activities{where} ORDER BY start_time DESC"
+    if limit is not None or offset:
+        query += " LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+    for (data,) in conn.execute(query, params):
+        yield json.loads(data)
+
+def count_indexed_activities(conn, since=None, until=None, type_key=None):
+    where, params = _activity_filters(since, until, type_key)
+    return conn.execute(f"SELECT COUNT(*) FROM activities{where}", params).fetchone()[0]
+
+def indexed_activity_types(conn):
+    """Distinct activity type keys, most frequent first."""
+    rows = conn.execute(
+        "SELECT type_key FROM activities WHERE type_key IS NOT NULL GROUP BY type_key ORDER BY COUNT(*) DESC, type_key"
+    )
+    return [type_key for (type_key,) in rows]
+
+def _rollup_dict(row):
+    key, distance_km, duration_min, elevation_m, sessions, longest_km = row
+    return {
+        "key": key,
+        "distance_km": distance_km,
+        "duration_min": duration_min,
+        "elevation_m": elevation_m,
+        "sessions": sessions,
+        "longest_km": longest_km,
+    }
+
+ROLLUP_COLUMNS = "period_key, distance_km, duration_min, elevation_m, sessions, longest_km"
+
+def load_rollups(conn, period, keys=None, latest=None):
+    """
+    Rollup rows for a period ("week", "month" or "year"), oldest first.
+    Either the given keys, or the `latest` N keys present.
+    """
+    if keys is not None:
+        placeholders = ", ".join("?" for _ in keys)
+        rows = conn.execute(
+            f"SELECT {ROLLUP_COLUMNS} FROM rollups WHERE period = ? AND period_key IN ({placeholders}) "
+            "ORDER BY period_key",
+            [period, *keys],
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT {ROLLUP_COLUMNS} FROM rollups WHERE period = ? ORDER BY period_key DESC LIMIT ?",
+            (period, -1 if latest is None else latest),
+        ).fetchall()[::-1]
+    return [_rollup_dict(row) for row in rows]
@@ -0,0 +1,64 @@
+from contextlib import closing
+import altair as alt
+import pandas as pd
+import streamlit as st
+from modules.activity_index import load_rollups
+from modules.data_manager import open_activity_index, load_activity_frame
+
+# Dashboard charts for the Trends tab.
+# Every function takes the user's data version (data_manager.get_data_version)
+# next to the user id, so st.cache_data serves the same data and figures on
+# every rerun until a sync or journal save bumps the version.
+TREND_WEEKS = 16
+# Most recent runs plotted on the HR-vs-pace chart
+HR_PACE_RUNS = 60
+RUN_TYPE_KEYS = ("running", "trail_running", "treadmill_running", "track_running")
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def weekly_rollups(user_id, data_version, weeks=TREND_WEEKS):
+    """Weekly distance/duration/longest-session rows from the activity index, oldest first."""
+    with closing(open_activity_index(user_id)) as conn:
+        rows = load_rollups(conn, "week", latest=weeks)
+    return pd.DataFrame(rows, columns=["key", "distance_km", "duration_min", "elevation_m", "sessions", "longest_km"])
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def hr_pace_points(user_id, data_version, runs=HR_PACE_RUNS):
+    """Average HR and pace (min/km) of the latest runs that recorded both."""
+    frame = load_activity_frame(user_id)
+    runs_frame = frame[
+        frame["type"].isin(RUN_TYPE_KEYS) & frame["avg_hr"].notna() & (frame["avg_speed"] > 0)
+    ].head(runs)
+    return pd.DataFrame({
+        "date": runs_frame["date"],
+        "pace_min_km": 1000 / runs_frame["avg_speed"] / 60,
+        "avg_hr": runs_frame["avg_hr"],
+        "distance_km": runs_frame["distance_km"].round(1),
+    }).reset_index(drop=True)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def weekly_volume_chart(user_id, data_version):
+    data = weekly_rollups(user_id, data_version)
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("key:N", title="Week", sort=None),
+        y=alt.Y("distance_km:Q", title="Distance (km)"),
+        tooltip=["key", alt.Tooltip("distance_km:Q", format=".1f"), "sessions", alt.Tooltip("duration_min:Q", format=".0f")],
+    ).properties(height=220)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def long_run_chart(user_id, data_version):
+    data = weekly_rollups(user_id, data_version)
+    return alt.Chart(data).mark_line(point=True).encode(
+        x=alt.X("key:N", title="Week", sort=None),
+        y=alt.Y("longest_km:Q", title="Longest session (km)"),
+        tooltip=["key", alt.Tooltip("longest_km:Q", format=".1f")],
+    ).properties(height=220)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def hr_pace_chart(user_id, data_version):
+    data = hr_pace_points(user_id, data_version)
+    return alt.Chart(data).mark_circle(size=60).encode(
+        x=alt.X("pace_min_km:Q", title="Pace (min/km)", scale=alt.Scale(zero=False, reverse=True)),
+        y=alt.Y("avg_hr:Q", title="Avg HR (bpm)", scale=alt.Scale(zero=False)),
+        color=alt.Color("date:T", title="Date"),
+        tooltip=[alt.Tooltip("date:T"), alt.Tooltip("pace_min_km:Q", format=".2f"), "avg_hr", "distance_km"],
+    ).properties(height=220)
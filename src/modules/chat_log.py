@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import uuid
+from modules.file_io import atomic_write_bytes, append_lines
+
+# Append-only chat store: one compact JSON record per line.
+#   {"op": "add", "id": ..., "role": ..., "content": ..., "ts": ...}
+#   {"op": "del", "id": ...}   (tombstone for an earlier "add")
+# New messages and deletions are single appends, so a turn costs O(1) writes.
+# Recent messages are read backwards from the end of the file, so loading the
+# last page does not parse the whole history. A partial last line left by an
+# interrupted append is ignored. Compaction rewrites only the live messages
+# through a temp file + rename. The add/tombstone counts that decide when to
+# compact are kept in a sidecar file (<log>.counts) together with the offset
+# they cover, so each check only parses the lines appended since the last one.
+CHAT_LOG_FILENAME = "chat_log.jsonl"
+COUNTS_SUFFIX = ".counts"
+READ_BLOCK_SIZE = 64 * 1024
+# Compact once there are at least this many tombstones and they outnumber live messages
+COMPACT_MIN_TOMBSTONES = 20
+
+def new_message_id():
+    return uuid.uuid4().hex
+
+def _encode(record):
+    return (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+def _add_record(message):
+    return {
+        "op": "add",
+        "id": message.get("id") or new_message_id(),
+        "role": message["role"],
+        "content": message["content"],
+        "ts": message.get("ts", time.time()),
+    }
+
+def append_records(path, records):
+    """Appends records with a single fsync."""
+    append_lines(path, [_encode(record) for record in records])
+
+def append_message(path, message):
+    """Appends one {"role", "content"} message and returns its id."""
+    record = _add_record(message)
+    append_records(path, [record])
+    return record["id"]
+
+def delete_message(path, message_id):
+    append_records(path, [{"op": "del", "id": message_id}])
+
+def write_messages(path, messages):
+    """Atomically replaces the log with the given messages (ids are kept when present)."""
+    data = b"".join(_encode(_add_record(message)) for message in messages)
+    atomic_write_bytes(path, data)
+    _save_counts(path, len(messages), 0, len(data))
+
+def _reversed_lines(path):
+    """Yields complete lines from the end of the file backwards."""
+    block_size = READ_BLOCK_SIZE
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b""
+        pending_tail = True
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+            if pending_tail:
+                if b"\n" not in buffer:
+                    continue
+                # Anything after the last newline is an interrupted append
+                buffer = buffer[:buffer.rindex(b"\n") + 1]
+                pending_tail = False
+            lines = buffer.split(b"\n")
+            # The first piece may continue in the previous block
+            buffer = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if not pending_tail and buffer:
+            yield buffer
+
+def _reversed_records(path):
+    if not os.path.exists(path):
+        return
+    for line in _reversed_lines(path):
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+def read_messages(path, limit=None, before=None):
+    """
+    Live messages oldest first, as {"id", "role", "content", "ts"}.
+    limit keeps only the newest N; before (a message id) pages back to messages older than it.
+    """
+    deleted = set()
+    messages = []
+    collecting = before is None
+    for record in _reversed_records(path):
+        if record.get("op") == "del":
+            deleted.add(record["id"])
+            continue
+        if record["id"] in deleted:
+            continue
+        if not collecting:
+            collecting = record["id"] == before
+            continue
+        messages.append({"id": record["id"], "role": record["role"], "content": record["content"], "ts": record.get("ts")})
+        if limit is not None and len(messages) >= limit:
+            break
+    messages.reverse()
+    return messages
+
+def _load_counts(path):
+    try:
+        with open(path + COUNTS_SUFFIX, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_counts(path, adds, tombstones, offset):
+    stat = os.stat(path)
+    counts = {"adds": adds, "tombstones": tombstones, "offset": offset, "inode": stat.st_ino}
+    atomic_write_bytes(path + COUNTS_SUFFIX, json.dumps(counts).encode("utf-8"))
+
+def _count_from(path, offset):
+    """(adds, tombstones, end of the last complete line) for the lines from offset on."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        buf = f.read()
+    end = buf.rfind(b"\n") + 1
+    adds = tombstones = 0
+    for line in buf[:end].split(b"\n"):
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("op") == "del":
+            tombstones += 1
+        else:
+            adds += 1
+    return adds, tombstones, offset + end
+
+def log_counts(path):
+    """(add records, tombstones) in the log; only lines appended since the last call are parsed."""
+    if not os.path.exists(path):
+        return 0, 0
+    stat = os.stat(path)
+    counts = _load_counts(path)
+    if counts and counts["inode"] == stat.st_ino and counts["offset"] <= stat.st_size:
+        adds, tombstones, offset = counts["adds"], counts["tombstones"], counts["offset"]
+    else:
+        # No sidecar, or the log was replaced behind our back: count from the start
+        adds = tombstones = offset = 0
+    if offset < stat.st_size:
+        new_adds, new_tombstones, offset = _count_from(path, offset)
+        adds += new_adds
+        tombstones += new_tombstones
+        _save_counts(path, adds, tombstones, offset)
+    return adds, tombstones
+
+def needs_compaction(path):
+    adds, tombstones = log_counts(path)
+    return tombstones >= COMPACT_MIN_TOMBSTONES and tombstones > adds - tombstones
+
+def compact(path):
+    """Rewrites the log with only live messages; returns how many were kept."""
+    messages = read_messages(path)
+    write_messages(path, messages)
+    return len(messages)
@@ -0,0 +1,17 @@
+import argparse
+
+# argparse `type=` checks shared by the command-line entry points
+# (sync_scheduler, coach_briefs), so out-of-range counts fail with a usage
+# error instead of being clamped or silently disabling a feature.
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {value}")
+    return value
@@ -0,0 +1,142 @@
+import sys
+import time
+import queue
+import argparse
+import threading
+from datetime import datetime
+from modules.cli_args import positive_int
+from modules.data_manager import list_users, count_activities, load_journal_entries, save_brief_report
+from modules.gemini_coach import (
+    prepare_coach_assessment, get_coach_assessments_mlx, MLX_BATCH_SIZE,
+)
+
+# Nightly pre-generation of the Command Center assessment ("brief") for every athlete.
+# On Ollama, users are fed through a bounded queue to a few worker threads that
+# call prepare_coach_assessment, so the result lands in
+# the athlete's assessment cache keyed by the fingerprint of its prompt inputs
+# (profile, plan, activities, journals, model and date). Opening the app then
+# shows the brief without generating; it is only produced again once a sync or
+# journal entry changes the fingerprint. On MLX the athletes' prompts are instead
+# decoded together in padded batches (gemini_coach.generate_mlx_batch) and the
+# report lists each batch's throughput. The fingerprint includes the date, so
+# schedule the run after midnight:
+#
+#   python -m modules.coach_briefs --model deepseek-r1:8b
+DEFAULT_MODEL = "deepseek-r1:8b"
+# Ollama answers one request per loaded model unless OLLAMA_NUM_PARALLEL is raised
+BRIEF_WORKERS = 1
+# Users waiting for a worker; the producer blocks beyond this
+BRIEF_QUEUE_SIZE = 4
+
+GENERATED = "generated"
+FRESH = "fresh"
+NO_DATA = "no_data"
+FAILED = "failed"
+
+def has_coaching_data(user_id):
+    return count_activities(user_id) > 0 or bool(load_journal_entries(user_id, limit=1))
+
+def prepare_brief(user_id, model_name=DEFAULT_MODEL):
+    """Makes sure user_id has a cached assessment for today's data; returns its report entry."""
+    started = time.monotonic()
+    if not has_coaching_data(user_id):
+        return {"status": NO_DATA, "seconds": 0.0}
+    text, duration, cached, ok = prepare_coach_assessment("", user_id, model_name=model_name)
+    status = FRESH if cached else GENERATED if ok else FAILED
+    entry = {"status": status, "seconds": round(time.monotonic() - started, 2)}
+    if status == FAILED:
+        entry["error"] = text
+    return entry
+
+def _worker(jobs, model_name, results, prepare):
+    while True:
+        user_id = jobs.get()
+        if user_id is None:
+            return
+        try:
+            results[user_id] = prepare(user_id, model_name)
+        except Exception as e:
+            results[user_id] = {"status": FAILED, "seconds": 0.0, "error": str(e)}
+
+def _run_queue(users, model_name, workers, queue_size, prepare):
+    results = {}
+    jobs = queue.Queue(maxsize=queue_size)
+    threads = [
+        threading.Thread(target=_worker, args=(jobs, model_name, results, prepare), daemon=True, name=f"coach-briefs-{i}")
+        for i in range(max(1, workers))
+    ]
+    for thread in threads:
+        thread.start()
+    for user_id in users:
+        jobs.put(user_id)
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+    return results
+
+def _run_mlx_batches(users, model_name, batch_size, generate_batch):
+    """Briefs for an mlx-* model: every athlete that needs one is generated in shared batches."""
+    results = {user_id: {"status": NO_DATA, "seconds": 0.0} for user_id in users if not has_coaching_data(user_id)}
+    with_data = [user_id for user_id in users if user_id not in results]
+    kwargs = {"generate_batch": generate_batch} if generate_batch else {}
+    assessments, batches = get_coach_assessments_mlx(with_data, model_name, batch_size=batch_size, **kwargs)
+    for user_id, (text, duration, cached, ok) in assessments.items():
+        if cached:
+            results[user_id] = {"status": FRESH, "seconds": 0.0}
+        elif ok:
+            results[user_id] = {"status": GENERATED, "seconds": round(duration, 2)}
+        else:
+            results[user_id] = {"status": FAILED, "seconds": 0.0, "error": text}
+    return results, [batch.as_dict() for batch in batches]
+
+def run_briefs(users=None, model_name=DEFAULT_MODEL, workers=BRIEF_WORKERS, queue_size=BRIEF_QUEUE_SIZE,
+               prepare=prepare_brief, batch_size=MLX_BATCH_SIZE, generate_batch=None):
+    """
+    Prepares briefs for the given users (default: every athlete) and saves the run report.
+    Ollama models go through the worker queue; mlx-* models through batched generation,
+    where generate_batch can replace the MLX decode (see gemini_coach.generate_mlx_batch).
+    """
+    if model_name.startswith("gemini"):
+        raise ValueError("Nightly briefs run on the local Ollama or MLX backend, not Gemini.")
+    users = sorted(list_users()) if users is None else list(users)
+    started_at = datetime.now()
+    batches = None
+    if model_name.startswith("mlx-"):
+        results, batches = _run_mlx_batches(users, model_name, batch_size, generate_batch)
+    else:
+        results = _run_queue(users, model_name, workers, queue_size, prepare)
+
+    statuses = [results[user_id]["status"] for user_id in users]
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "model": model_name,
+        **{status: statuses.count(status) for status in (GENERATED, FRESH, NO_DATA, FAILED)},
+        "users": {user_id: results[user_id] for user_id in users},
+    }
+    if batches is not None:
+        report["batches"] = batches
+    save_brief_report(report)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate the coaching brief for every athlete.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Ollama model or mlx-* model name")
+    parser.add_argument("--workers", type=positive_int, default=BRIEF_WORKERS, help="briefs generated at once")
+    parser.add_argument("--queue-size", type=positive_int, default=BRIEF_QUEUE_SIZE, help="athletes waiting for a worker")
+    parser.add_argument("--batch-size", type=positive_int, default=MLX_BATCH_SIZE, help="prompts per MLX batch")
+    args = parser.parse_args(argv)
+    report = run_briefs(
+        model_name=args.model, workers=args.workers, queue_size=args.queue_size, batch_size=args.batch_size
+    )
+    for batch in report.get("batches", []):
+        print(
+            f"batch of {batch['size']}: {batch['generated_tokens']} tokens in {batch['seconds']}s "
+            f"({batch['tokens_per_sec']} tok/s, {batch['padded_tokens']} padding tokens)"
+        )
+    print(report)
+    return 0 if report[FAILED] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
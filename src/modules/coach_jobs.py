@@ -0,0 +1,109 @@
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from modules.data_manager import append_chat_message
+from modules.gemini_coach import stream_ai_coach_response, StreamStats
+
+# Background generation for the chat page.
+# Each athlete gets one worker thread draining a FIFO queue, so their turns are
+# answered in order while the Streamlit script thread stays free to rerun.
+# A finished job appends its answer to the saved chat history itself, so the
+# reply is kept even if the page was rerun or closed while it was generating.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs kept for polling; older ones are forgotten first
+MAX_FINISHED_JOBS = 100
+
+class CoachJob:
+    """One chat turn: the request, the text generated so far and its status."""
+
+    def __init__(self, user_id, api_key, model_name, user_message, history):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.api_key = api_key
+        self.model_name = model_name
+        self.user_message = user_message
+        self.history = list(history or [])
+        self.status = QUEUED
+        self.chunks = []
+        self.stats = StreamStats()
+        self.error = None
+        self.created_at = time.time()
+        self._finished = threading.Event()
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+class CoachJobQueue:
+    """Per-user job queues with one daemon worker each; jobs are looked up by id."""
+
+    def __init__(self, generate=stream_ai_coach_response, max_finished=MAX_FINISHED_JOBS):
+        self.generate = generate
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, api_key, model_name, user_message, history=None):
+        """Queues a chat turn for user_id and returns its job id."""
+        job = CoachJob(user_id, api_key, model_name, user_message, history)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if user_id not in self._queues:
+                self._queues[user_id] = queue.Queue()
+                threading.Thread(
+                    target=self._worker, args=(self._queues[user_id],), daemon=True, name=f"coach-jobs-{user_id}"
+                ).start()
+            self._queues[user_id].put(job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self, user_id):
+        """Unfinished jobs for user_id, oldest first."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.user_id == user_id and not job.finished]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def _worker(self, jobs):
+        while True:
+            self._run(jobs.get())
+
+    def _run(self, job):
+        job.status = RUNNING
+        try:
+            for chunk in self.generate(
+                job.api_key, job.user_id, model_name=job.model_name, chat_mode=True,
+                user_message=job.user_message, history=job.history, stats=job.stats,
+            ):
+                job.chunks.append(chunk)
+            append_chat_message(job.user_id, {"role": "assistant", "content": job.text})
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job._finished.set()
+
+# Shared by every Streamlit session in this process
+COACH_JOBS = CoachJobQueue()
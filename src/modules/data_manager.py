@@ -2,64 +2,303 @@ import json
 import os
 import yaml
 import shutil
-from datetime import date
+import time
+import threading
+from contextlib import closing
+from datetime import date, timedelta
+from modules.activity_index import (
+    INDEX_FILENAME, connect as connect_activity_index, refresh_index,
+    index_activity_file, load_indexed_activities, iter_indexed_activities, load_rollups,
+    count_indexed_activities, indexed_activity_types, indexed_ids_by_start_gmt,
+    content_hash, content_token, indexed_hashes, append_to_pack, compact_pack, PACK_FILENAME,
+)
+from modules.activity_frame import (
+    FRAME_DIRNAME, read_frame, write_frame, read_source_token, append_activities as append_to_frame,
+    normalize_activities,
+)
+from modules.stream_store import STREAMS_DIRNAME, STREAMS_VERSION_FILENAME
+from modules.file_io import atomic_write_bytes
+from modules.journal_store import get_journal_repository
+from modules.user_store import get_user_store
+from modules.chat_log import (
+    CHAT_LOG_FILENAME, read_messages as read_chat_messages, write_messages as write_chat_messages,
+    append_message as append_chat_log_message, delete_message as delete_chat_log_message,
+    needs_compaction as chat_log_needs_compaction, compact as compact_chat_log,
+)
 
 DATA_DIR = "data"
 USERS_DIR = os.path.join(DATA_DIR, "users")
 
+# How synced activities are stored under raw/garmin/:
+# "files" - one activity_<id>.json per activity
+# "pack"  - a single append-only activities.pack.jsonl per user
+ACTIVITY_STORAGE = "files"
+
+# Serializes chat log writes between the UI and background coach jobs
+CHAT_HISTORY_LOCK = threading.RLock()
+
+# processed/<file> holding the user's data version (see get_data_version)
+DATA_VERSION_FILENAME = "data_version"
+# Summary of the last scheduled multi-athlete sync (see sync_scheduler)
+SYNC_REPORT_FILENAME = "sync_report.json"
+# Summary of the last nightly coaching-brief run (see coach_briefs)
+BRIEF_REPORT_FILENAME = "brief_report.json"
+
+def atomic_write_json(filename, data, indent=4):
+    """Writes JSON via a temp file + rename so readers never see a half-written file."""
+    atomic_write_bytes(filename, json.dumps(data, indent=indent).encode("utf-8"))
+
+def user_store(user_id):
+    """The shared UserStore (paths only) for user_id; call .ensure() before writing."""
+    return get_user_store(USERS_DIR, user_id)
+
 def ensure_user_dirs(user_id):
-    user_dir = os.path.join(USERS_DIR, user_id)
-    journal_dir = os.path.join(user_dir, "journal")
-    profile_dir = os.path.join(user_dir, "profile")
-    raw_garmin_dir = os.path.join(user_dir, "raw", "garmin")
-    
-    os.makedirs(journal_dir, exist_ok=True)
-    os.makedirs(profile_dir, exist_ok=True)
-    os.makedirs(raw_garmin_dir, exist_ok=True)
-    return journal_dir, profile_dir, raw_garmin_dir
+    """Creates the user's directory tree (once per process) and returns (journal, profile, raw garmin) dirs."""
+    store = user_store(user_id).ensure()
+    return store.journal_dir, store.profile_dir, store.garmin_dir
 
 def list_users():
     if not os.path.exists(USERS_DIR):
         return []
     return [d for d in os.listdir(USERS_DIR) if os.path.isdir(os.path.join(USERS_DIR, d))]
 
+def _report_path(filename):
+    return os.path.join(DATA_DIR, filename)
+
+def _save_report(filename, report):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    atomic_write_json(_report_path(filename), report)
+
+def _load_report(filename):
+    path = _report_path(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_sync_report(report):
+    _save_report(SYNC_REPORT_FILENAME, report)
+
+def load_sync_report():
+    return _load_report(SYNC_REPORT_FILENAME)
+
+def save_brief_report(report):
+    _save_report(BRIEF_REPORT_FILENAME, report)
+
+def load_brief_report():
+    return _load_report(BRIEF_REPORT_FILENAME)
+
 def save_journal_entry(user_id, entry_date, data):
-    journal_dir, _, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(journal_dir, f"{entry_date.isoformat()}.json")
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
-
-def load_journal_entries(user_id):
-    journal_dir, _, _ = ensure_user_dirs(user_id)
-    entries = []
-    if os.path.exists(journal_dir):
-        for filename in os.listdir(journal_dir):
-            if filename.endswith(".json"):
-                with open(os.path.join(journal_dir, filename), "r") as f:
-                    entries.append(json.load(f))
-    # Sort by date descending
-    return sorted(entries, key=lambda x: x['date'], reverse=True)
+    get_journal_repository(user_store(user_id).ensure().journal_dir).save(entry_date, data)
+    bump_data_version(user_id)
+
+def load_journal_entries(user_id, limit=None):
+    """Journal entries newest first; limit keeps only the newest N (only those files are read)."""
+    return get_journal_repository(user_store(user_id).journal_dir).latest(limit)
+
+def load_journal_range(user_id, start_date, end_date):
+    """Journal entries dated start_date..end_date inclusive, newest first."""
+    return get_journal_repository(user_store(user_id).journal_dir).range(start_date, end_date)
+
+def get_processed_dir(user_id):
+    """processed/ for derived data, created on first use."""
+    return user_store(user_id).ensure().processed_dir
+
+def get_data_version(user_id):
+    """
+    Token that changes whenever a user's activities or journals change; caches of
+    derived data (charts) key on it. "0" before the first change.
+    """
+    try:
+        with open(user_store(user_id).processed_path(DATA_VERSION_FILENAME), "r") as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+def bump_data_version(user_id):
+    # A fresh timestamp rather than a counter, so concurrent bumps never repeat a version
+    version = str(time.time_ns())
+    atomic_write_bytes(os.path.join(get_processed_dir(user_id), DATA_VERSION_FILENAME), version.encode("ascii"))
+    return version
+
+def get_streams_dir(user_id):
+    """Per-activity time series tiers (see stream_store)."""
+    return os.path.join(user_store(user_id).processed_dir, STREAMS_DIRNAME)
+
+def open_activity_index(user_id):
+    """
+    Opens the user's activity index, re-indexing any activity files changed on disk.
+    Before anything was synced (no raw/garmin/ yet) this is an empty in-memory index,
+    so reads never create the athlete's directories or an index file.
+    """
+    store = user_store(user_id)
+    if not os.path.isdir(store.garmin_dir):
+        return connect_activity_index(":memory:")
+    store.ensure()
+    conn = connect_activity_index(store.processed_path(INDEX_FILENAME))
+    refresh_index(conn, store.garmin_dir)
+    return conn
 
 def load_garmin_activities(user_id):
-    _, _, garmin_dir = ensure_user_dirs(user_id)
-    activities = []
-    if os.path.exists(garmin_dir):
-        for filename in os.listdir(garmin_dir):
-            if filename.endswith(".json") and filename.startswith("activity_"):
-                with open(os.path.join(garmin_dir, filename), "r") as f:
-                    activities.append(json.load(f))
-    # Sort by start time descending
-    return sorted(activities, key=lambda x: x.get('startTimeLocal', ''), reverse=True)
+    with closing(open_activity_index(user_id)) as conn:
+        # Sorted by start time descending
+        return load_indexed_activities(conn)
+
+def iter_activities(user_id, since=None, limit=None, fields=None):
+    """
+    Yields activities newest-first from the activity index without loading the whole history.
+    since: date or ISO string; older activities are not read.
+    limit: stop after this many activities.
+    fields: optional list of top-level keys to keep in each yielded dict.
+    """
+    if isinstance(since, date):
+        since = since.isoformat()
+    with closing(open_activity_index(user_id)) as conn:
+        for activity in iter_indexed_activities(conn, since=since, limit=limit):
+            if fields is not None:
+                activity = {k: activity[k] for k in fields if k in activity}
+            yield activity
+
+def _date_bounds(start_date, end_date):
+    """Inclusive dates -> (since, until) ISO strings for the index, until being exclusive."""
+    since = start_date.isoformat() if start_date else None
+    until = (end_date + timedelta(days=1)).isoformat() if end_date else None
+    return since, until
+
+def count_activities(user_id, start_date=None, end_date=None, type_key=None):
+    since, until = _date_bounds(start_date, end_date)
+    with closing(open_activity_index(user_id)) as conn:
+        return count_indexed_activities(conn, since=since, until=until, type_key=type_key)
+
+def query_activities(user_id, start_date=None, end_date=None, type_key=None, page=0, page_size=25):
+    """
+    One page of activities (newest first) matching the filters.
+    start_date/end_date are inclusive dates; page is 0-based.
+    """
+    since, until = _date_bounds(start_date, end_date)
+    with closing(open_activity_index(user_id)) as conn:
+        return list(iter_indexed_activities(
+            conn, since=since, until=until, type_key=type_key, limit=page_size, offset=page * page_size
+        ))
+
+def list_activity_types(user_id):
+    """Activity type keys present in the athlete's history, most frequent first."""
+    with closing(open_activity_index(user_id)) as conn:
+        return indexed_activity_types(conn)
+
+def find_activities_by_start_gmt(user_id, start_times):
+    """startTimeGMT -> activity id (str) of the indexed activities starting at any of start_times."""
+    with closing(open_activity_index(user_id)) as conn:
+        return indexed_ids_by_start_gmt(conn, start_times)
+
+def load_activity_frame(user_id):
+    """
+    All activities as a typed pandas DataFrame (see activity_frame.SCHEMA), newest first.
+    When the stored frame no longer matches the activity index (e.g. an activity file was
+    replaced outside a sync) the frame is built from the index in memory; only
+    save_garmin_activities writes the stored frame, so reads never race to rewrite it.
+    """
+    store = user_store(user_id)
+    if not os.path.isdir(store.garmin_dir):
+        return normalize_activities([])
+    frame_dir = os.path.join(store.processed_dir, FRAME_DIRNAME)
+    with closing(open_activity_index(user_id)) as conn:
+        if read_source_token(frame_dir) == content_token(conn):
+            frame = read_frame(frame_dir)
+            # The count check also catches parts removed from under a current token
+            if len(frame) == count_indexed_activities(conn):
+                return frame
+        return normalize_activities(load_indexed_activities(conn))
+
+def load_training_rollups(user_id, today):
+    """
+    Precomputed training totals from the activity index:
+    the latest 4 weeks with data, plus the rollup rows for today's month and year (None if empty).
+    """
+    month_key = today.strftime("%Y-%m")
+    year_key = str(today.year)
+    with closing(open_activity_index(user_id)) as conn:
+        month = load_rollups(conn, "month", keys=[month_key])
+        year = load_rollups(conn, "year", keys=[year_key])
+        return {
+            "weeks": load_rollups(conn, "week", latest=4),
+            "month": month[0] if month else None,
+            "year": year[0] if year else None,
+        }
+
+def _rebuild_frame(conn, frame_dir):
+    write_frame(frame_dir, normalize_activities(load_indexed_activities(conn)), source_token=content_token(conn))
+
+def save_garmin_activities(user_id, activities, storage=None):
+    """
+    Persists activities and records them in the activity index.
+    Activities whose content matches the indexed copy are skipped.
+    storage overrides ACTIVITY_STORAGE ("files" or "pack").
+    Returns the number of activities written.
+    """
+    storage = storage or ACTIVITY_STORAGE
+    garmin_dir = user_store(user_id).ensure().garmin_dir
+    unique = {}
+    for activity in activities:
+        activity_id = activity.get("activityId")
+        if activity_id and activity_id not in unique:
+            unique[activity_id] = activity
+
+    frame_dir = os.path.join(get_processed_dir(user_id), FRAME_DIRNAME)
+    with closing(open_activity_index(user_id)) as conn:
+        # Only a frame that matched the index before this write can be brought current by appending
+        frame_current = read_source_token(frame_dir) == content_token(conn)
+        known = indexed_hashes(conn, unique.keys())
+        changed = [a for a_id, a in unique.items() if known.get(str(a_id)) != content_hash(a)]
+
+        if storage == "pack":
+            append_to_pack(conn, garmin_dir, changed)
+            for activity in changed:
+                loose = os.path.join(garmin_dir, f"activity_{activity['activityId']}.json")
+                if os.path.exists(loose):
+                    os.remove(loose)
+        else:
+            for activity in changed:
+                filename = os.path.join(garmin_dir, f"activity_{activity['activityId']}.json")
+                atomic_write_json(filename, activity)
+                index_activity_file(conn, filename, activity)
+        token = content_token(conn)
+        if frame_current:
+            append_to_frame(frame_dir, changed, source_token=token)
+        else:
+            # Out of step with the index: rebuild it here rather than on a read
+            _rebuild_frame(conn, frame_dir)
+    if changed:
+        bump_data_version(user_id)
+    return len(changed)
+
+def pack_garmin_activities(user_id):
+    """Moves all of a user's activities into one compacted pack file. Returns the activity count."""
+    garmin_dir = user_store(user_id).ensure().garmin_dir
+    with closing(open_activity_index(user_id)) as conn:
+        count = compact_pack(conn, garmin_dir)
+        # Same activities under new index rows: keep the stored frame current
+        _rebuild_frame(conn, os.path.join(get_processed_dir(user_id), FRAME_DIRNAME))
+        return count
+
+def load_sync_state(user_id):
+    """Garmin sync cursor: newest synced activity time and any in-progress bulk sync."""
+    filename = user_store(user_id).profile_path("sync_state.json")
+    if os.path.exists(filename):
+        with open(filename, "r") as f:
+            return json.load(f)
+    return {}
+
+def save_sync_state(user_id, state):
+    atomic_write_json(user_store(user_id).ensure().profile_path("sync_state.json"), state)
 
 def save_user_profile(user_id, profile_data):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "user.yaml")
+    filename = user_store(user_id).ensure().profile_path("user.yaml")
     with open(filename, "w") as f:
         yaml.dump(profile_data, f)
 
 def load_user_profile(user_id):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "user.yaml")
+    filename = user_store(user_id).profile_path("user.yaml")
     if os.path.exists(filename):
         with open(filename, "r") as f:
             return yaml.safe_load(f)
@@ -72,57 +311,122 @@ def load_user_profile(user_id):
 # --- Coach Plan & Chat Storage ---
 
 def save_coach_plan(user_id, plan_text):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "current_plan.md")
+    filename = user_store(user_id).ensure().profile_path("current_plan.md")
     with open(filename, "w") as f:
         f.write(plan_text)
 
 def load_coach_plan(user_id):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "current_plan.md")
+    filename = user_store(user_id).profile_path("current_plan.md")
     if os.path.exists(filename):
         with open(filename, "r") as f:
             return f.read()
     return "No plan generated yet. Use the 'Analyze' button or Chat with the Coach to create one."
 
+def _chat_log_path(user_id, for_write=False):
+    """Path of the athlete's chat log, migrating a legacy chat_history.json on first use."""
+    store = user_store(user_id)
+    if for_write:
+        store.ensure()
+    path = store.profile_path(CHAT_LOG_FILENAME)
+    legacy = store.profile_path("chat_history.json")
+    if os.path.exists(legacy):
+        with CHAT_HISTORY_LOCK:
+            if os.path.exists(legacy):
+                if not os.path.exists(path):
+                    with open(legacy, "r") as f:
+                        write_chat_messages(path, json.load(f))
+                os.remove(legacy)
+    return path
+
 def save_chat_history(user_id, messages):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "chat_history.json")
-    with open(filename, "w") as f:
-        json.dump(messages, f, indent=4)
+    """Replaces the whole chat history (e.g. clearing it); message ids are kept when present."""
+    path = _chat_log_path(user_id, for_write=True)
+    with CHAT_HISTORY_LOCK:
+        write_chat_messages(path, messages)
 
-def load_chat_history(user_id):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    filename = os.path.join(profile_dir, "chat_history.json")
-    if os.path.exists(filename):
-        with open(filename, "r") as f:
-            return json.load(f)
-    return []
+def load_chat_history(user_id, limit=None, before=None, include_ids=False):
+    """
+    Chat messages oldest first. limit returns only the newest N messages and before (a message id)
+    pages back from it. With include_ids each message also carries its "id" for deletion.
+    """
+    messages = read_chat_messages(_chat_log_path(user_id), limit=limit, before=before)
+    if include_ids:
+        return [{"id": m["id"], "role": m["role"], "content": m["content"]} for m in messages]
+    return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+def append_chat_message(user_id, message):
+    """Appends one {"role", "content"} message to the chat log and returns its id."""
+    path = _chat_log_path(user_id, for_write=True)
+    with CHAT_HISTORY_LOCK:
+        return append_chat_log_message(path, message)
+
+def delete_chat_message(user_id, message_id):
+    """Records a deletion; the log is compacted once deletions outweigh the live messages."""
+    path = _chat_log_path(user_id, for_write=True)
+    with CHAT_HISTORY_LOCK:
+        delete_chat_log_message(path, message_id)
+        if chat_log_needs_compaction(path):
+            compact_chat_log(path)
 
 def create_user(user_id):
     if not user_id: return False
-    ensure_user_dirs(user_id)
-    if not os.path.exists(os.path.join(USERS_DIR, user_id, "profile", "user.yaml")):
+    store = user_store(user_id).ensure()
+    if not os.path.exists(store.profile_path("user.yaml")):
         save_user_profile(user_id, {"name": user_id, "goals": "", "injuries": ""})
     return True
 
 # --- Custom Prompt Storage ---
 
+def _model_prompt_path(store, model_name):
+    safe_name = model_name.replace(":", "_").replace("/", "_")
+    return os.path.join(store.prompts_dir, f"{safe_name}.txt")
+
 def save_model_prompt(user_id, model_name, prompt_text):
     """Save a custom system prompt for a specific model."""
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    prompts_dir = os.path.join(profile_dir, "prompts")
-    os.makedirs(prompts_dir, exist_ok=True)
-    safe_name = model_name.replace(":", "_").replace("/", "_")
-    with open(os.path.join(prompts_dir, f"{safe_name}.txt"), "w") as f:
+    with open(_model_prompt_path(user_store(user_id).ensure(), model_name), "w") as f:
         f.write(prompt_text)
 
 def load_model_prompt(user_id, model_name):
     """Load custom system prompt for a model. Returns None if no custom prompt."""
-    _, profile_dir, _ = ensure_user_dirs(user_id)
-    safe_name = model_name.replace(":", "_").replace("/", "_")
-    filename = os.path.join(profile_dir, "prompts", f"{safe_name}.txt")
+    filename = _model_prompt_path(user_store(user_id), model_name)
     if os.path.exists(filename):
         with open(filename, "r") as f:
             return f.read()
     return None
+
+def _stat_stamp(path):
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return (path, None, None)
+
+def activity_data_stamps(user_id):
+    """Stamps that change whenever activities are added or replaced, or streams are written (stats only)."""
+    garmin_dir = user_store(user_id).garmin_dir
+    # Activity files are replaced by rename, which bumps the directory mtime
+    return (
+        _stat_stamp(garmin_dir),
+        _stat_stamp(os.path.join(garmin_dir, PACK_FILENAME)),
+        _stat_stamp(os.path.join(get_streams_dir(user_id), STREAMS_VERSION_FILENAME)),
+    )
+
+def prompt_input_stamps(user_id, model_name):
+    """
+    (path, mtime, size) stamps of everything the system prompt is built from:
+    profile, plan, model prompt, journals, activity storage and streams. Costs stats only, no parsing.
+    """
+    store = user_store(user_id)
+    paths = [
+        store.profile_path("user.yaml"),
+        store.profile_path("current_plan.md"),
+        _model_prompt_path(store, model_name),
+    ]
+    stamps = [_stat_stamp(path) for path in paths] + list(activity_data_stamps(user_id))
+    if os.path.isdir(store.journal_dir):
+        with os.scandir(store.journal_dir) as it:
+            stamps.extend(sorted(
+                (entry.path, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in it if entry.name.endswith(".json")
+            ))
+    return tuple(stamps)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+# Durable file writes shared by every store.
+# atomic_write_bytes replaces a file through a temp file + fsync + rename, so
+# readers see either the old or the new content, never a half-written file.
+# append_lines appends newline-terminated records with a single fsync, first
+# terminating a partial last line left by an interrupted append so it cannot
+# swallow the first new record.
+
+def atomic_write_bytes(path, data):
+    """Atomically replaces path with data (bytes or any buffer)."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def append_lines(path, lines):
+    """Appends encoded lines (each ending in b"\\n"); returns the file offset where the first one starts."""
+    with open(path, "ab") as f:
+        offset = f.tell()
+        if offset > 0:
+            with open(path, "rb") as tail:
+                tail.seek(offset - 1)
+                if tail.read(1) != b"\n":
+                    f.write(b"\n")
+                    offset += 1
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
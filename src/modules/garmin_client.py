@@ -1,14 +1,22 @@
 import os
-import json
+import time
 import shutil
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta, datetime
 from garminconnect import Garmin
-from modules.data_manager import ensure_user_dirs
+try:
+    import fcntl
+except ImportError:
+    # Windows: sync locks fall back to msvcrt byte-range locks
+    fcntl = None
+    import msvcrt
+from modules.data_manager import user_store, save_garmin_activities, load_sync_state, save_sync_state
 
 def get_token_dir(user_id):
-    _, profile_dir, _ = ensure_user_dirs(user_id)
     # Using a specific directory for garth
-    return os.path.join(profile_dir, "garmin_tokens")
+    return user_store(user_id).token_dir
 
 def is_garmin_authenticated(user_id):
     token_dir = get_token_dir(user_id)
@@ -25,11 +33,175 @@ def is_garmin_authenticated(user_id):
             return False
     return True
 
-def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=None, days=7):
+CHUNK_DAYS = 30
+CHUNK_RETRIES = 3
+BACKOFF_BASE_SECONDS = 2.0
+RATE_LIMIT_BACKOFF_SECONDS = 30.0
+
+# profile/<file> locked while a sync for that user runs
+SYNC_LOCK_FILENAME = "sync.lock"
+SYNC_IN_PROGRESS_MESSAGE = "A sync is already running for this athlete. Try again shortly."
+
+def date_chunks(start_date_obj, end_date_obj, chunk_days=CHUNK_DAYS):
+    """Splits [start, end] into inclusive (start, end) windows of at most chunk_days + 1 days."""
+    chunks = []
+    current_start = start_date_obj
+    while current_start <= end_date_obj:
+        current_end = min(current_start + timedelta(days=chunk_days), end_date_obj)
+        chunks.append((current_start, current_end))
+        current_start = current_end + timedelta(days=1)
+    return chunks
+
+def is_rate_limited(error):
+    return "429" in str(error) or "Too Many Requests" in str(error) or "TooManyRequests" in type(error).__name__
+
+def is_retryable(error):
+    # "Expecting value" is an empty/HTML body from a busy API, not an auth failure
+    return "Expecting value" in str(error) or is_rate_limited(error)
+
+class SyncBackoff:
+    """
+    Backoff state shared by all chunk workers of one sync.
+    A rate-limit response from any worker pauses every worker until it expires.
+    """
+
+    def __init__(self, base_seconds=BACKOFF_BASE_SECONDS, rate_limit_seconds=RATE_LIMIT_BACKOFF_SECONDS):
+        self.base_seconds = base_seconds
+        self.rate_limit_seconds = rate_limit_seconds
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def allow_retry(self):
+        """Whether another retry may be spent (unlimited here; see sync_scheduler.BackoffBudget)."""
+        return True
+
+    def wait(self):
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def failed(self, error, attempt):
+        """Records a retryable failure and sleeps before the next attempt."""
+        if is_rate_limited(error):
+            delay = self.rate_limit_seconds * (2 ** attempt)
+            with self._lock:
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self.wait()
+        else:
+            time.sleep(self.base_seconds * (2 ** attempt))
+
+class ChunkFetchError(Exception):
+    def __init__(self, chunk_start, error):
+        super().__init__(str(error))
+        self.chunk_start = chunk_start
+        self.error = error
+
+def fetch_chunk(client, chunk_start, chunk_end, backoff, retries=CHUNK_RETRIES):
+    """Fetches one date window, retrying timeouts and rate limits with backoff."""
+    attempt = 0
+    while True:
+        backoff.wait()
+        try:
+            print(f"  Fetching chunk: {chunk_start} to {chunk_end}")
+            return client.get_activities_by_date(chunk_start.isoformat(), chunk_end.isoformat()) or []
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e) or not backoff.allow_retry():
+                raise ChunkFetchError(chunk_start, e)
+            print(f"  Chunk {chunk_start} failed ({e}), retry {attempt + 1}/{retries}")
+            backoff.failed(e, attempt)
+            attempt += 1
+
+def fetch_activities(client, start_date_obj, end_date_obj, workers=1, backoff=None, retries=CHUNK_RETRIES,
+                     on_chunk=None):
+    """
+    Fetches all activities between two dates in 30-day chunks.
+    Chunks run on a pool of `workers` threads sharing the authenticated client;
+    results are merged in chronological chunk order. on_chunk(start, end, activities)
+    is called for each chunk in that same order, so it can checkpoint progress.
+    Raises ChunkFetchError if a chunk still fails after its retries.
+    """
+    backoff = backoff or SyncBackoff()
+    chunks = date_chunks(start_date_obj, end_date_obj)
+    all_activities = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks) or 1))) as pool:
+        futures = [pool.submit(fetch_chunk, client, start, end, backoff, retries) for start, end in chunks]
+        try:
+            for (start, end), future in zip(chunks, futures):
+                chunk = future.result()
+                if on_chunk:
+                    on_chunk(start, end, chunk)
+                all_activities.extend(chunk)
+        except ChunkFetchError:
+            for future in futures:
+                future.cancel()
+            raise
+    return all_activities
+
+class SyncInProgress(Exception):
+    pass
+
+def _try_lock(f):
+    """Non-blocking exclusive lock on an open file; False if it is already held."""
+    if fcntl is None:
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def _unlock(f):
+    if fcntl is None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def user_sync_lock(user_id):
+    """
+    Exclusive, non-blocking lock on the user's sync (a flock on profile/sync.lock, or an
+    msvcrt lock on Windows), held across threads and processes.
+    Raises SyncInProgress if another sync holds it.
+    """
+    path = user_store(user_id).ensure().profile_path(SYNC_LOCK_FILENAME)
+    with open(path, "a") as f:
+        if not _try_lock(f):
+            raise SyncInProgress(user_id)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=None, days=7, workers=1,
+                           backoff=None, client_factory=None):
     """
     Syncs activities from Garmin Connect in 30-day chunks to prevent API timeouts.
     Uses stored tokens if available, otherwise requires email/password.
+    workers > 1 fetches chunks in parallel (useful for bulk syncs).
+
+    Without start_date_obj only the delta since the newest synced activity is fetched
+    (or the last `days` days on first sync). A bulk sync from start_date_obj checkpoints
+    each completed chunk and resumes from the last one if it was interrupted.
+
+    Only one sync per user runs at a time. backoff lets several syncs share one SyncBackoff,
+    and client_factory replaces garminconnect.Garmin (e.g. with a fake backend).
     """
+    try:
+        with user_sync_lock(user_id):
+            return _sync_garmin_activities(
+                user_id, email, password, start_date_obj, days, workers, backoff, client_factory or Garmin
+            )
+    except SyncInProgress:
+        return SYNC_IN_PROGRESS_MESSAGE
+
+def _sync_garmin_activities(user_id, email, password, start_date_obj, days, workers, backoff, client_factory):
     token_dir = get_token_dir(user_id)
     client = None
     resume_error = None
@@ -39,7 +211,7 @@ def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=No
         if is_garmin_authenticated(user_id):
             try:
                 print(f"Attempting to resume Garmin session for {user_id}")
-                client = Garmin()
+                client = client_factory()
                 client.login(tokenstore=token_dir)
                 print("Session resumed and verified.")
             except Exception as e:
@@ -63,7 +235,7 @@ def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=No
             if email and password:
                 print(f"Logging in with fresh credentials for {user_id}")
                 try:
-                    client = Garmin(email, password)
+                    client = client_factory(email, password)
                     client.login()
 
                     # Clean existing tokens before saving new ones
@@ -96,38 +268,66 @@ def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=No
 
         # 3. Determine date range
         today = date.today()
-        if start_date_obj is None:
-            start_date_obj = today - timedelta(days=days)
+        sync_state = load_sync_state(user_id)
 
         # Ensure it's a date object
         if isinstance(start_date_obj, datetime):
             start_date_obj = start_date_obj.date()
 
-        # 4. Fetch activities in 30-day chunks
-        all_activities = []
-        current_start = start_date_obj
+        is_bulk = start_date_obj is not None
+        if not is_bulk:
+            # Delta sync from the high-water mark
+            newest = sync_state.get("newest_activity")
+            if newest:
+                start_date_obj = datetime.strptime(newest[:10], "%Y-%m-%d").date()
+            else:
+                start_date_obj = today - timedelta(days=days)
+        fetch_start = start_date_obj
+
+        if is_bulk:
+            bulk = sync_state.get("bulk") or {}
+            if bulk.get("start") == start_date_obj.isoformat() and bulk.get("completed_through"):
+                fetch_start = datetime.strptime(bulk["completed_through"], "%Y-%m-%d").date() + timedelta(days=1)
+                print(f"Resuming bulk sync from {fetch_start}")
+            else:
+                sync_state["bulk"] = {"start": start_date_obj.isoformat(), "completed_through": None}
 
-        print(f"Syncing from {start_date_obj} to {today}...")
+        # 4. Fetch activities in 30-day chunks, persisting each one as it completes
+        print(f"Syncing from {fetch_start} to {today}...")
 
-        while current_start <= today:
-            current_end = min(current_start + timedelta(days=30), today)
-            print(f"  Fetching chunk: {current_start} to {current_end}")
+        saved_count = 0
+        seen_ids = set()
 
-            try:
-                chunk = client.get_activities_by_date(
-                    current_start.isoformat(),
-                    current_end.isoformat()
-                )
-                if chunk:
-                    all_activities.extend(chunk)
-            except Exception as e:
-                err_msg = str(e)
-                # If we get a JSON error here, it's likely an API timeout, not an auth failure
-                if "Expecting value" in err_msg:
-                    return f"Garmin API timeout on chunk {current_start}. The date range might be too large or the service is busy. Try a smaller range."
-                return f"Sync failed at {current_start}: {err_msg}"
+        def save_chunk(chunk_start, chunk_end, chunk):
+            nonlocal saved_count
+            new_activities = []
+            for activity in chunk:
+                activity_id = activity.get("activityId")
+                if activity_id and activity_id not in seen_ids:
+                    seen_ids.add(activity_id)
+                    new_activities.append(activity)
+            saved_count += save_garmin_activities(user_id, new_activities)
 
-            current_start = current_end + timedelta(days=1)
+            newest = max((a.get("startTimeLocal") or "" for a in new_activities), default="")
+            if newest > sync_state.get("newest_activity", ""):
+                sync_state["newest_activity"] = newest
+            if is_bulk:
+                sync_state["bulk"]["completed_through"] = chunk_end.isoformat()
+            save_sync_state(user_id, sync_state)
+
+        try:
+            fetch_activities(client, fetch_start, today, workers=workers, backoff=backoff, on_chunk=save_chunk)
+        except ChunkFetchError as e:
+            err_msg = str(e)
+            resume_hint = " Completed chunks were saved; run the sync again to resume." if is_bulk else ""
+            # If we get a JSON error here, it's likely an API timeout, not an auth failure
+            if "Expecting value" in err_msg:
+                return f"Garmin API timeout on chunk {e.chunk_start}. The date range might be too large or the service is busy. Try a smaller range.{resume_hint}"
+            return f"Sync failed at {e.chunk_start}: {err_msg}{resume_hint}"
+
+        if is_bulk:
+            sync_state.pop("bulk", None)
+            save_sync_state(user_id, sync_state)
 
         # 5. Persist refreshed tokens after successful sync
         try:
@@ -135,25 +335,12 @@ def sync_garmin_activities(user_id, email=None, password=None, start_date_obj=No
         except Exception:
             pass  # Non-fatal; just means next restart may need re-login
 
-        if not all_activities:
-            return f"No running activities found since {start_date_obj.isoformat()}."
+        if not seen_ids:
+            return f"No running activities found since {fetch_start.isoformat()}."
 
-        _, _, garmin_dir = ensure_user_dirs(user_id)
-
-        saved_count = 0
-        seen_ids = set()
-        for activity in all_activities:
-            activity_id = activity.get("activityId")
-            if not activity_id or activity_id in seen_ids:
-                continue
-
-            seen_ids.add(activity_id)
-            filename = os.path.join(garmin_dir, f"activity_{activity_id}.json")
-            with open(filename, "w") as f:
-                json.dump(activity, f, indent=4)
-            saved_count += 1
-
-        return f"Successfully synced {saved_count} activities since {start_date_obj.isoformat()}."
+        unchanged = len(seen_ids) - saved_count
+        unchanged_note = f" {unchanged} already up to date." if unchanged else ""
+        return f"Successfully synced {saved_count} activities since {fetch_start.isoformat()}.{unchanged_note}"
 
     except Exception as e:
         print(f"Unexpected Garmin Sync Error: {str(e)}")
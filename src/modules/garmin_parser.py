@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from modules.data_manager import (
+    user_store, get_streams_dir, save_garmin_activities, atomic_write_json, find_activities_by_start_gmt,
+)
+from modules.stream_store import write_streams
+
+# FIT file import.
+# Files dropped into users/<id>/inbox/ are hashed, and files whose hash was
+# already imported are archived without parsing. New files are parsed in a
+# process pool (fitparse is pure Python and CPU bound). Each one becomes:
+#   - an activity summary shaped like a Garmin Connect activity dict, saved
+#     through save_garmin_activities so the index and frame pick it up;
+#   - its per-second records, stored as stream tiers (see stream_store).
+# A file whose startTimeGMT matches an activity already in the index (a run
+# synced from Garmin Connect, or another export of it) only adds its streams to
+# that activity: the existing summary and activityId are kept, so the run is
+# not counted twice.
+# Parsed files move to raw/fit/<sha256>.fit. A file that fails to parse stays
+# in the inbox and is retried on the next scan.
+INGESTED_FILENAME = "fit_ingested.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# record message field -> stream name, first present field wins
+RECORD_FIELDS = {
+    "heart_rate": ("heart_rate",),
+    "speed": ("enhanced_speed", "speed"),
+    "cadence": ("cadence",),
+    "altitude": ("enhanced_altitude", "altitude"),
+    "distance": ("distance",),
+    "power": ("power",),
+}
+
+# FIT sport -> Garmin Connect activity typeKey
+SPORT_TYPE_KEYS = {
+    "running": "running",
+    "trail_running": "trail_running",
+    "cycling": "cycling",
+    "walking": "walking",
+    "hiking": "hiking",
+    "swimming": "lap_swimming",
+    "training": "strength_training",
+}
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def activity_id_for_hash(digest):
+    """Stable integer id for an imported file (60 bits of its hash)."""
+    return int(digest[:15], 16)
+
+def _first(values, names):
+    for name in names:
+        if values.get(name) is not None:
+            return values[name]
+    return None
+
+def _epoch(timestamp):
+    return timestamp.replace(tzinfo=timezone.utc).timestamp()
+
+def summarize_fit(session, records, local_offset_seconds=0, name=None):
+    """
+    Garmin-style activity dict from a FIT session message (a dict of its fields)
+    and the extracted record arrays. FIT timestamps are UTC.
+    """
+    start_epoch = None
+    if session.get("start_time"):
+        start_epoch = _epoch(session["start_time"])
+    elif len(records["timestamp"]):
+        start_epoch = float(records["timestamp"][0])
+    summary = {
+        "activityName": name,
+        "activityType": {"typeKey": SPORT_TYPE_KEYS.get(session.get("sport"), session.get("sport") or "other")},
+        "distance": session.get("total_distance") or 0,
+        "duration": session.get("total_timer_time") or session.get("total_elapsed_time") or 0,
+        "averageHR": session.get("avg_heart_rate"),
+        "maxHR": session.get("max_heart_rate"),
+        "averageSpeed": _first(session, ("enhanced_avg_speed", "avg_speed")) or 0,
+        "elevationGain": session.get("total_ascent"),
+        "calories": session.get("total_calories"),
+        "aerobicTrainingEffect": session.get("total_training_effect"),
+    }
+    cadence = session.get("avg_running_cadence") or session.get("avg_cadence")
+    if cadence and summary["activityType"]["typeKey"] in ("running", "trail_running"):
+        # FIT stores running cadence per leg
+        summary["averageRunningCadenceInStepsPerMinute"] = cadence * 2 + (session.get("avg_fractional_cadence") or 0) * 2
+    if start_epoch is not None:
+        gmt = datetime.fromtimestamp(start_epoch, timezone.utc)
+        local = datetime.fromtimestamp(start_epoch + local_offset_seconds, timezone.utc)
+        summary["startTimeGMT"] = gmt.strftime("%Y-%m-%d %H:%M:%S")
+        summary["startTimeLocal"] = local.strftime("%Y-%m-%d %H:%M:%S")
+    return summary
+
+def parse_fit_file(path):
+    """
+    Parses one FIT file (runs in a worker process).
+    Returns (summary, records) where records maps "timestamp" (int64 epoch seconds)
+    and each RECORD_FIELDS stream (float32, NaN where missing) to a numpy array.
+    """
+    from fitparse import FitFile
+
+    fit = FitFile(path)
+    timestamps = []
+    columns = {stream: [] for stream in RECORD_FIELDS}
+    session = {}
+    local_offset = 0
+    for message in fit.get_messages(["record", "session", "activity"]):
+        values = message.get_values()
+        if message.name == "record":
+            if values.get("timestamp") is None:
+                continue
+            timestamps.append(int(_epoch(values["timestamp"])))
+            for stream, names in RECORD_FIELDS.items():
+                value = _first(values, names)
+                columns[stream].append(np.nan if value is None else value)
+        elif message.name == "session" and not session:
+            session = values
+        elif message.name == "activity" and values.get("local_timestamp") and values.get("timestamp"):
+            local_offset = _epoch(values["local_timestamp"]) - _epoch(values["timestamp"])
+
+    records = {"timestamp": np.array(timestamps, dtype="int64")}
+    records.update({stream: np.array(values, dtype="float32") for stream, values in columns.items()})
+    name = os.path.splitext(os.path.basename(path))[0]
+    return summarize_fit(session, records, local_offset, name=name), records
+
+def get_inbox_dir(user_id):
+    """The folder FIT files are dropped into (created so it can be opened right away)."""
+    return user_store(user_id).ensure().inbox_dir
+
+def _ingested_path(user_id):
+    return user_store(user_id).processed_path(INGESTED_FILENAME)
+
+def load_ingested(user_id):
+    """sha256 -> {"activity_id", "file", "ingested_at"} for every imported FIT file."""
+    path = _ingested_path(user_id)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def ingest_inbox(user_id, workers=None, parse=parse_fit_file):
+    """
+    Imports every new .fit file in the user's inbox.
+    Returns {"ingested": [new activity ids], "matched": [existing activity ids given streams],
+    "duplicates": [file names], "failed": {file name: error}}.
+    """
+    store = user_store(user_id).ensure()
+    inbox_dir = store.inbox_dir
+    archive_dir = store.fit_archive_dir
+    os.makedirs(archive_dir, exist_ok=True)
+    ingested = load_ingested(user_id)
+    report = {"ingested": [], "matched": [], "duplicates": [], "failed": {}}
+
+    pending = {}
+    for path in sorted(set(glob.glob(os.path.join(inbox_dir, "*.fit")) + glob.glob(os.path.join(inbox_dir, "*.FIT")))):
+        digest = file_hash(path)
+        if digest in ingested or digest in pending.values():
+            # Same bytes as an imported file: archive without parsing again
+            os.replace(path, os.path.join(archive_dir, f"{digest}.fit"))
+            report["duplicates"].append(os.path.basename(path))
+        else:
+            pending[path] = digest
+    if not pending:
+        return report
+
+    paths = list(pending)
+    parsed = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse, path) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                parsed[path] = future.result()
+            except Exception as e:
+                report["failed"][os.path.basename(path)] = str(e)
+
+    start_times = {summary["startTimeGMT"] for summary, _ in parsed.values() if summary.get("startTimeGMT")}
+    known = {start: int(a_id) for start, a_id in find_activities_by_start_gmt(user_id, start_times).items()}
+    summaries = []
+    for path, (summary, records) in parsed.items():
+        digest = pending[path]
+        start = summary.get("startTimeGMT")
+        if start in known:
+            # Already synced (or imported from another file): keep that activity
+            activity_id = known[start]
+            report["matched"].append(activity_id)
+        else:
+            activity_id = summary["activityId"] = activity_id_for_hash(digest)
+            summaries.append(summary)
+            if start:
+                known[start] = activity_id
+        write_streams(get_streams_dir(user_id), activity_id, records)
+        ingested[digest] = {
+            "activity_id": activity_id,
+            "file": os.path.basename(path),
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    save_garmin_activities(user_id, summaries)
+    atomic_write_json(_ingested_path(user_id), ingested)
+    for path, digest in pending.items():
+        if digest in ingested:
+            os.replace(path, os.path.join(archive_dir, f"{digest}.fit"))
+    report["ingested"] = [s["activityId"] for s in summaries]
+    return report
+
+if __name__ == "__main__":
+    # python -m modules.garmin_parser <user_id> [workers]
+    print(ingest_inbox(sys.argv[1], workers=int(sys.argv[2]) if len(sys.argv) > 2 else None))
@@ -2,14 +2,71 @@ import os
 import requests
 import json
 import time
-from modules.data_manager import load_journal_entries, load_user_profile, load_garmin_activities, load_model_prompt
+import pandas as pd
+from modules.activity_frame import normalize_activities
+from modules.training_load import load_training_load, format_training_load
+from modules.stream_store import format_laps_for_ai
+from modules.ollama_client import get_ollama_client
+from modules.model_cache import ModelCache
+from modules.response_cache import ResponseCache, response_cache_key
+from modules.data_manager import (
+    load_journal_entries, load_user_profile, iter_activities, load_training_rollups, load_model_prompt,
+    prompt_input_stamps, user_store, get_streams_dir,
+)
+
+# Map shorthand to Hugging Face paths
+MLX_MODELS = {
+    "mlx-deepseek-8b": "mlx-community/DeepSeek-R1-Distill-Qwen-7B-4bit",
+    "mlx-phi4": "mlx-community/phi-4-4bit"
+}
+# Resident weight budget for loaded MLX models; least recently used models are dropped beyond it
+MLX_CACHE_MAX_BYTES = 16 * 1024 ** 3
+
+def _load_mlx(repo_id):
+    from mlx_lm import load
+    return load(repo_id)
 
-# Global cache for MLX model to avoid reloading on every request
-MLX_CACHE = {
-    "model": None,
-    "tokenizer": None,
-    "path": None
+def _mlx_model_size(loaded):
+    """Bytes held by the model's weights (0 when they cannot be inspected)."""
+    model, _ = loaded
+    try:
+        from mlx.utils import tree_flatten
+        return sum(param.nbytes for _, param in tree_flatten(model.parameters()))
+    except Exception:
+        return 0
+
+# Loaded (model, tokenizer) pairs per repo id, so switching models does not reload weights from disk
+MLX_CACHE = ModelCache(_load_mlx, MLX_CACHE_MAX_BYTES, size_of=_mlx_model_size)
+
+# Recent activities that get their per-km splits in the training log (needs FIT streams)
+MAX_ACTIVITIES_WITH_SPLITS = 3
+
+# Assembled system prompts per (user, model), reused while the inputs' mtimes and the date are unchanged
+PROMPT_CACHE = {}
+
+# Context window (tokens) per model-name prefix; the data block is packed to fit what is left
+# after the coaching instructions and the reserves below. Longest matching prefix wins.
+MODEL_CONTEXT_WINDOWS = {
+    "gemini": 32768,
+    "mlx-": 8192,
+    "deepseek-r1": 8192,
+    "qwen2.5": 8192,
+    "phi4-mini": 8192,
+    "phi4": 16384,
 }
+DEFAULT_CONTEXT_WINDOW = 4096
+# Room kept free for the generated answer and for chat history + the athlete's message
+RESPONSE_TOKEN_RESERVE = 2048
+CHAT_TOKEN_RESERVE = 1024
+
+# Prompts decoded together by generate_mlx_batch; each batch is padded to its longest prompt
+MLX_BATCH_SIZE = 4
+MLX_MAX_TOKENS = 2048
+
+# Saved "Analyze" assessments per athlete (processed/assessment_cache.json)
+ASSESSMENT_CACHE_FILENAME = "assessment_cache.json"
+ASSESSMENT_CACHE_TTL_SECONDS = 12 * 3600
+ASSESSMENT_CACHE_MAX_ENTRIES = 50
 
 def format_pace(speed_m_s):
     """Converts speed in m/s to pace in min/km."""
@@ -20,43 +77,128 @@ def format_pace(speed_m_s):
     seconds = int((pace_decimal - minutes) * 60)
     return f"{minutes}:{seconds:02d}"
 
+def _as_frame(activities):
+    """Accepts raw activity dicts or an activity frame (see activity_frame.SCHEMA)."""
+    if isinstance(activities, pd.DataFrame):
+        return activities
+    return normalize_activities(activities)
+
+def _number_text(values, missing="N/A", whole_as_int=False):
+    """Floats as Python prints them, optionally 140.0 -> "140"; `missing` for NaN."""
+    text = values.astype(str)
+    if whole_as_int:
+        whole = values.notna() & (values % 1 == 0)
+        text = text.where(~whole, values.fillna(0).astype("int64").astype(str))
+    return text.where(values.notna(), missing)
+
+def _pace_text(speeds):
+    """Vectorized format_pace."""
+    speeds = speeds.fillna(0)
+    moving = speeds > 0
+    pace = 16.6666666667 / speeds.where(moving, 1)
+    minutes = pace.astype("int64")
+    seconds = ((pace - minutes) * 60).astype("int64")
+    text = minutes.astype(str) + ":" + seconds.astype(str).str.zfill(2)
+    return text.where(moving, "0:00")
+
+def _optional_part(text, present):
+    return (" | " + text).where(present, "")
+
 def format_garmin_for_ai(activities):
-    """Summarizes Garmin activities for the LLM prompt with more detail."""
-    if not activities:
+    """Summarizes Garmin activities (dicts or an activity frame, newest first) for the LLM prompt with more detail."""
+    if activities is None or len(activities) == 0:
         return "No recent activities recorded."
-    
-    summary = []
-    for act in activities[:10]:
-        dist = round(act.get('distance', 0) / 1000, 2)
-        dur = round(act.get('duration', 0) / 60, 1)
-        date = act.get('startTimeLocal', 'Unknown')[:10]
-        type_key = act.get('activityType', {}).get('typeKey', 'run')
-        avg_hr = act.get('averageHR', 'N/A')
-        avg_speed = act.get('averageSpeed', 0)
-        pace = format_pace(avg_speed)
-        te = act.get('aerobicTrainingEffect', 'N/A')
-        label = act.get('trainingEffectLabel', 'N/A')
-        elev = act.get('elevationGain')
-        cadence = act.get('averageRunningCadenceInStepsPerMinute')
 
+    frame = _as_frame(activities.head(10) if isinstance(activities, pd.DataFrame) else activities[:10])
+    dates = frame["start_time"].str[:10].where(frame["start_time"] != "", "Unknown")
+    types = frame["type"].fillna("run").str.capitalize()
+    elev = frame["elevation_m"].fillna(0)
+    cadence = frame["cadence_spm"].fillna(0)
+
+    lines = (
+        "- " + dates + ": " + types
+        + " | " + _number_text(frame["distance_km"].round(2)) + "km in "
+        + _number_text(frame["duration_min"].round(1)) + "min"
+        + " | " + _pace_text(frame["avg_speed"]) + " min/km"
+        + " | Avg HR: " + _number_text(frame["avg_hr"], whole_as_int=True)
+        + _optional_part("Elev: " + elev.round().astype("int64").astype(str) + "m", elev != 0)
+        + _optional_part("Cadence: " + cadence.round().astype("int64").astype(str) + " spm", cadence != 0)
+        + " | TE: " + _number_text(frame["aerobic_te"]) + " (" + frame["te_label"].fillna("N/A") + ")"
+    )
+    return "\n".join(lines)
+
+def add_splits(lines, frame, streams_dir):
+    """Puts a splits line under each of the first MAX_ACTIVITIES_WITH_SPLITS activities that have streams."""
+    if len(frame) == 0:
+        return lines
+    out, added = [], 0
+    for line, activity_id in zip(lines, frame["activity_id"]):
+        out.append(line)
+        splits = format_laps_for_ai(streams_dir, activity_id) if added < MAX_ACTIVITIES_WITH_SPLITS else None
+        if splits:
+            out.append(splits)
+            added += 1
+    return out
+
+def format_journals_for_ai(journals):
+    """One compact line per journal entry (newest first) instead of a raw list repr."""
+    if not journals:
+        return "No journal entries."
+    lines = []
+    for entry in journals:
         parts = [
-            f"- {date}: {type_key.capitalize()}",
-            f"{dist}km in {dur}min",
-            f"{pace} min/km",
-            f"Avg HR: {avg_hr}",
-            f"Elev: {round(elev)}m" if elev else None,
-            f"Cadence: {round(cadence)} spm" if cadence else None,
-            f"TE: {te} ({label})",
+            f"- {entry.get('date', 'Unknown')}: RPE {entry.get('rpe', 'N/A')}",
+            f"Mood {entry.get('mood', 'N/A')}",
+            f"Soreness {entry.get('soreness', 'N/A')}",
+            entry.get('notes') or None,
         ]
-        summary.append(" | ".join(p for p in parts if p))
-    
-    return "\n".join(summary)
+        lines.append(" | ".join(str(p) for p in parts if p))
+    return "\n".join(lines)
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) - good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def get_context_window(model_name):
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model_name.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+def fit_lines(lines, budget_tokens):
+    """Keeps leading lines (newest first) while they fit the budget. Returns (kept_lines, tokens_used)."""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > budget_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept, used
+
+def fit_text(text, budget_tokens):
+    """Truncates text to the budget, marking the cut."""
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    return text[:max(0, budget_tokens * 4 - 16)].rstrip() + "\n...(truncated)"
+
+def pack_data_sections(plan, activity_lines, journal_lines, budget_tokens):
+    """
+    Sizes the ACTIVE PLAN, TRAINING LOG and SUBJECTIVE LOG sections to a token budget.
+    The training log and journals are trimmed from the oldest entry; budget one section
+    leaves unused rolls over to the next. The plan only gets whatever remains.
+    """
+    log_lines, used = fit_lines(activity_lines, budget_tokens * 2 // 5)
+    remaining = budget_tokens - used
+    kept_journals, used = fit_lines(journal_lines, remaining // 2)
+    remaining -= used
+    return fit_text(plan, remaining), log_lines, kept_journals
 
 DEFAULT_COACH_PROMPT = """You are Coach Conejito, an expert endurance and trail running coach.
 
 RESPONSE FORMAT — use this structure:
 1. **Flags**: Any injury or overtraining warnings. Check if soreness is rising on consecutive days, RPE >7 for 3+ days, HR elevated at same pace, or mood declining. If none, say "No flags."
-2. **Review**: 2-3 sentences on recent training load trends and goal alignment.
+2. **Review**: 2-3 sentences on recent training load trends and goal alignment. Use the pre-computed ACWR, CTL/ATL/TSB, monotony and strain as given instead of recalculating them.
 3. **Prescription**: Next 2-3 days with distance, pace, HR zone, terrain. Use bullet list.
 4. **Prehab**: One mobility or strength recommendation based on current injury status.
 
@@ -67,170 +209,234 @@ TRAINING RULES:
 
 STYLE: Be direct and professional. No filler. Distances in km, paces in min/km, HR in bpm. If an injury concern is serious, prescribe rest and professional assessment before any running."""
 
-def compute_training_stats(activities):
-    """Pre-compute weekly/monthly/yearly aggregates for the LLM prompt."""
-    from datetime import datetime
-    from collections import defaultdict
+def _rollup_frame(key, frame):
+    if frame.empty:
+        return {"key": key, "distance_km": 0, "duration_min": 0, "elevation_m": 0, "sessions": 0, "longest_km": 0}
+    return {
+        "key": key,
+        "distance_km": float(frame["distance_km"].sum()),
+        "duration_min": float(frame["duration_min"].sum()),
+        "elevation_m": float(frame["elevation_m"].fillna(0).sum()),
+        "sessions": len(frame),
+        "longest_km": float(frame["distance_km"].max()),
+    }
+
+def rollup_activities(activities, today):
+    """In-memory equivalent of data_manager.load_training_rollups for activity dicts or an activity frame."""
+    frame = _as_frame(activities)
+
+    dated = frame[frame["date"].notna()]
+    iso = dated["date"].dt.isocalendar()
+    week_keys = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    recent_weeks = sorted(week_keys.unique())[-4:]
 
-    if not activities:
+    this_month = today.strftime('%Y-%m')
+    this_year = str(today.year)
+    return {
+        "weeks": [_rollup_frame(wk, dated[week_keys == wk]) for wk in recent_weeks],
+        "month": _rollup_frame(this_month, frame[frame["start_time"].str[:7] == this_month]),
+        "year": _rollup_frame(this_year, frame[frame["start_time"].str[:4] == this_year]),
+    }
+
+def format_training_stats(rollups, today):
+    """Renders weekly/monthly/yearly rollup rows for the LLM prompt."""
+    weeks = rollups["weeks"]
+    if not weeks:
         return "No training data available."
 
-    today = datetime.now().date()
-
-    weeks = defaultdict(list)
-    for act in activities:
-        date_str = act.get('startTimeLocal', '')[:10]
-        if not date_str:
-            continue
-        act_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        week_key = act_date.strftime('%G-W%V')
-        weeks[week_key].append(act)
-
-    sorted_weeks = sorted(weeks.keys())
     lines = ["Weekly breakdown (last 4 weeks):"]
-
-    for wk in sorted_weeks[-4:]:
-        acts = weeks[wk]
-        dist = sum(a.get('distance', 0) / 1000 for a in acts)
-        dur = sum(a.get('duration', 0) / 60 for a in acts)
-        elev = sum((a.get('elevationGain') or 0) for a in acts)
-        n = len(acts)
-        longest = max((a.get('distance', 0) / 1000 for a in acts), default=0)
+    for wk in weeks:
         lines.append(
-            f"  {wk}: {round(dist,1)}km | {n} sessions | {round(dur)}min | "
-            f"Elev: {round(elev)}m | Longest: {round(longest,1)}km"
+            f"  {wk['key']}: {round(wk['distance_km'],1)}km | {wk['sessions']} sessions | "
+            f"{round(wk['duration_min'])}min | Elev: {round(wk['elevation_m'])}m | "
+            f"Longest: {round(wk['longest_km'],1)}km"
         )
 
-    if len(sorted_weeks) >= 2:
-        curr = sum(a.get('distance', 0) / 1000 for a in weeks[sorted_weeks[-1]])
-        prev = sum(a.get('distance', 0) / 1000 for a in weeks[sorted_weeks[-2]])
+    if len(weeks) >= 2:
+        curr = weeks[-1]['distance_km']
+        prev = weeks[-2]['distance_km']
         if prev > 0:
             pct = ((curr - prev) / prev) * 100
             lines.append(f"Week-over-week volume change: {'+' if pct >= 0 else ''}{round(pct)}%")
 
     this_month = today.strftime('%Y-%m')
-    month_dist = sum(a.get('distance', 0) / 1000 for a in activities
-                     if a.get('startTimeLocal', '')[:7] == this_month)
+    month_dist = rollups["month"]["distance_km"] if rollups["month"] else 0
     lines.append(f"This month ({this_month}): {round(month_dist, 1)}km")
 
     this_year = str(today.year)
-    year_dist = sum(a.get('distance', 0) / 1000 for a in activities
-                    if a.get('startTimeLocal', '')[:4] == this_year)
+    year_dist = rollups["year"]["distance_km"] if rollups["year"] else 0
     lines.append(f"This year ({this_year}): {round(year_dist, 1)}km")
 
     return "\n".join(lines)
 
+def compute_training_stats(activities):
+    """Pre-compute weekly/monthly/yearly aggregates for the LLM prompt (activity dicts or an activity frame)."""
+    from datetime import datetime
+
+    if activities is None or len(activities) == 0:
+        return "No training data available."
+
+    today = datetime.now().date()
+    return format_training_stats(rollup_activities(activities, today), today)
+
 def get_system_prompt(user_id, model_name="phi4-mini:3.8b"):
+    from datetime import date as dt_date
+
+    today_date = dt_date.today()
+    cache_key = (today_date, prompt_input_stamps(user_id, model_name))
+    cached = PROMPT_CACHE.get((user_id, model_name))
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    prompt = build_system_prompt(user_id, model_name, today_date)
+    PROMPT_CACHE[(user_id, model_name)] = (cache_key, prompt)
+    return prompt
+
+def build_system_prompt(user_id, model_name, today_date):
     from modules.data_manager import load_coach_plan
-    from datetime import date as dt_date, timedelta
+    from datetime import timedelta
 
     profile = load_user_profile(user_id)
-    journals = load_journal_entries(user_id)
-    activities = load_garmin_activities(user_id)
+    journals = load_journal_entries(user_id, limit=7)
     current_plan = load_coach_plan(user_id)
 
-    today_date = dt_date.today()
     tomorrow_date = today_date + timedelta(days=1)
 
     today_str = today_date.strftime("%A, %Y-%m-%d")
     tomorrow_str = tomorrow_date.strftime("%A, %Y-%m-%d")
 
-    recent_journals = journals[:7]
-    garmin_summary = format_garmin_for_ai(activities)
-    training_stats = compute_training_stats(activities)
+    recent_journals = format_journals_for_ai(journals).split("\n")
+    # Read through the index: only these rows, not the whole history
+    recent_activities = normalize_activities(list(iter_activities(user_id, limit=10)))
+    garmin_summary = add_splits(
+        format_garmin_for_ai(recent_activities).split("\n"), recent_activities, get_streams_dir(user_id)
+    )
+    training_stats = "\n".join([
+        format_training_stats(load_training_rollups(user_id, today_date), today_date),
+        format_training_load(load_training_load(user_id, today_date)),
+    ])
 
     custom_prompt = load_model_prompt(user_id, model_name)
     coaching_instructions = custom_prompt if custom_prompt else DEFAULT_COACH_PROMPT
 
-    data_block = f"""
-TODAY: {today_str}
-TOMORROW: {tomorrow_str}
-Use ONLY these dates. Ignore conflicting dates in chat history.
-
+    # Least volatile sections first and the dates last, so consecutive prompts share the longest
+    # possible prefix and backends with a prompt/KV cache only re-process the tail.
+    def render(plan, training_log, subjective_log):
+        return f"""
 ATHLETE:
 - Name: {profile.get('name', 'Athlete')}
 - Goal: {profile.get('goals', 'Unknown')}
 - Injuries: {profile.get('injuries', 'None')}
 
 ACTIVE PLAN:
-{current_plan}
+{plan}
 
 TRAINING LOG (recent sessions):
-{garmin_summary}
+{training_log}
 
 TRAINING LOAD (pre-computed):
 {training_stats}
 
 SUBJECTIVE LOG (journals):
-{recent_journals}"""
+{subjective_log}
+
+TODAY: {today_str}
+TOMORROW: {tomorrow_str}
+Use ONLY these dates. Ignore conflicting dates in chat history."""
+
+    fixed_tokens = estimate_tokens(coaching_instructions) + estimate_tokens(render("", "", ""))
+    budget = get_context_window(model_name) - RESPONSE_TOKEN_RESERVE - CHAT_TOKEN_RESERVE - fixed_tokens
+    plan, log_lines, journal_lines = pack_data_sections(current_plan, garmin_summary, recent_journals, max(budget, 0))
+    data_block = render(plan, "\n".join(log_lines), "\n".join(journal_lines))
 
     return f"{coaching_instructions}\n{data_block}"
 
+ASSESSMENT_REQUEST = "Please provide a brief, actionable assessment of my current state and a recommendation for the next 2 days."
+
+def build_full_prompt(user_id, model_name, chat_mode=False, user_message=None, history=None):
+    """Single-string prompt for completion-style backends (MLX, Gemini)."""
+    system_prompt = get_system_prompt(user_id, model_name)
+
+    if chat_mode:
+        messages_context = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in history])
+        return f"{system_prompt}\n\n--- CHAT HISTORY ---\n{messages_context}\n\nAthlete: {user_message}\nCoach Conejito:"
+    return f"{system_prompt}\n\n{ASSESSMENT_REQUEST}"
+
+def build_chat_messages(user_id, model_name, chat_mode=False, user_message=None, history=None):
+    """
+    Structured messages for chat-style backends (Ollama /api/chat).
+    The system prompt is byte-identical between turns and earlier turns keep their exact role/content,
+    so each request extends the previous one and the server can reuse its cached prefix.
+    """
+    messages = [{"role": "system", "content": get_system_prompt(user_id, model_name)}]
+    if chat_mode:
+        messages += [{"role": m["role"], "content": m["content"]} for m in history or []]
+        messages.append({"role": "user", "content": user_message})
+    else:
+        messages.append({"role": "user", "content": ASSESSMENT_REQUEST})
+    return messages
+
+def mlx_repo_id(model_name):
+    return MLX_MODELS.get(model_name, model_name[4:]) # fallback to user string if not in map
+
+def load_mlx_model(model_name):
+    """Returns (model, tokenizer) for an mlx-* model name, reusing MLX_CACHE."""
+    return MLX_CACHE.get(mlx_repo_id(model_name))
+
+def preload_mlx_model(model_name):
+    """Starts loading an mlx-* model in the background; returns a Future, or None for other backends."""
+    if not model_name.startswith("mlx-"):
+        return None
+    return MLX_CACHE.preload(mlx_repo_id(model_name))
+
 def get_ai_coach_response(api_key, user_id, model_name="deepseek-r1:8b", chat_mode=False, user_message=None, history=None):
     """
     Generates a coaching response. Supports Gemini (Cloud), Ollama (Local), and MLX (macOS Native).
     Returns (response_text, duration_seconds).
     """
-    system_prompt = get_system_prompt(user_id, model_name)
-    
-    if chat_mode:
-        messages_context = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in history])
-        full_prompt = f"{system_prompt}\n\n--- CHAT HISTORY ---\n{messages_context}\n\nAthlete: {user_message}\nCoach Conejito:"
-    else:
-        full_prompt = f"{system_prompt}\n\nPlease provide a brief, actionable assessment of my current state and a recommendation for the next 2 days."
+    response, duration, _ = _generate_response(api_key, user_id, model_name, chat_mode, user_message, history)
+    return response, duration
+
+def _generate_response(api_key, user_id, model_name, chat_mode=False, user_message=None, history=None):
+    """Like get_ai_coach_response, plus an ok flag that is False when the text is an error message."""
+    full_prompt = build_full_prompt(user_id, model_name, chat_mode, user_message, history)
 
     start_time = time.time()
 
     # --- MLX (macOS Native) ---
     if model_name.startswith("mlx-"):
         try:
-            from mlx_lm import load, generate
-            
-            # Map shorthand to Hugging Face paths
-            mlx_map = {
-                "mlx-deepseek-8b": "mlx-community/DeepSeek-R1-Distill-Qwen-7B-4bit",
-                "mlx-phi4": "mlx-community/phi-4-4bit"
-            }
-            repo_id = mlx_map.get(model_name, model_name[4:]) # fallback to user string if not in map
-
-            if MLX_CACHE["path"] != repo_id:
-                # Reload model if path changed
-                MLX_CACHE["model"], MLX_CACHE["tokenizer"] = load(repo_id)
-                MLX_CACHE["path"] = repo_id
+            from mlx_lm import generate
 
+            model, tokenizer = load_mlx_model(model_name)
             response = generate(
-                MLX_CACHE["model"], 
-                MLX_CACHE["tokenizer"], 
-                prompt=full_prompt, 
-                max_tokens=2048,
+                model,
+                tokenizer,
+                prompt=full_prompt,
+                max_tokens=MLX_MAX_TOKENS,
                 verbose=False
             )
             duration = time.time() - start_time
-            return response, duration
+            return response, duration, True
         except Exception as e:
-            return f"Error with MLX: {str(e)}", 0
+            return f"Error with MLX: {str(e)}", 0, False
 
     # --- OLLAMA (Local) ---
     if not model_name.startswith("gemini"):
         try:
-            url = "http://localhost:11434/api/generate"
-            payload = {
-                "model": model_name,
-                "prompt": full_prompt,
-                "stream": False
-            }
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
+            messages = build_chat_messages(user_id, model_name, chat_mode, user_message, history)
+            data = get_ollama_client().chat(model_name, messages)
             duration = time.time() - start_time
-            return response.json().get("response", "No response from Ollama."), duration
+            content = data.get("message", {}).get("content")
+            return content or "No response from Ollama.", duration, bool(content)
         except requests.exceptions.ConnectionError:
-            return "Error: Could not connect to Ollama. Make sure it is running.", 0
+            return "Error: Could not connect to Ollama. Make sure it is running.", 0, False
         except Exception as e:
-            return f"Error with Ollama: {str(e)}", 0
+            return f"Error with Ollama: {str(e)}", 0, False
 
     # --- GEMINI (Cloud) ---
     if not api_key:
-        return "Please provide a valid Gemini API Key in the settings.", 0
+        return "Please provide a valid Gemini API Key in the settings.", 0, False
 
     try:
         import google.generativeai as genai
@@ -238,6 +444,268 @@ def get_ai_coach_response(api_key, user_id, model_name="deepseek-r1:8b", chat_mo
         model = genai.GenerativeModel(model_name)
         response = model.generate_content(full_prompt)
         duration = time.time() - start_time
-        return response.text, duration
+        return response.text, duration, True
+    except Exception as e:
+        return f"Error contacting Coach Conejito: {str(e)}", 0, False
+
+def get_assessment_cache(user_id):
+    # A path only: peeking must not create the athlete's directories (put() creates them)
+    path = user_store(user_id).processed_path(ASSESSMENT_CACHE_FILENAME)
+    return ResponseCache(path, ASSESSMENT_CACHE_TTL_SECONDS, ASSESSMENT_CACHE_MAX_ENTRIES)
+
+def _assessment_cache_key(user_id, model_name):
+    """The athlete's assessment cache and the fingerprint of today's prompt inputs for model_name."""
+    from datetime import date as dt_date
+
+    full_prompt = build_full_prompt(user_id, model_name)
+    return get_assessment_cache(user_id), response_cache_key(model_name, dt_date.today(), full_prompt)
+
+def coach_assessment_key(user_id, model_name="deepseek-r1:8b"):
+    """Fingerprint of today's assessment inputs for model_name; any new data or another day changes it."""
+    return _assessment_cache_key(user_id, model_name)[1]
+
+def peek_coach_assessment(user_id, model_name="deepseek-r1:8b"):
+    """The cached assessment as (response_text, duration_seconds, True), or None; never generates."""
+    cache, key = _assessment_cache_key(user_id, model_name)
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    return entry["response"], entry["duration"], True
+
+def get_coach_assessment(api_key, user_id, model_name="deepseek-r1:8b", use_cache=True):
+    """
+    The non-chat "brief, actionable assessment", reused while the prompt inputs, model and date are unchanged.
+    Returns (response_text, duration_seconds, cached). Errors are never cached.
+    """
+    response, duration, cached, _ = prepare_coach_assessment(api_key, user_id, model_name, use_cache)
+    return response, duration, cached
+
+def prepare_coach_assessment(api_key, user_id, model_name="deepseek-r1:8b", use_cache=True):
+    """Like get_coach_assessment, plus an ok flag that is False when the text is an error message."""
+    cache, key = _assessment_cache_key(user_id, model_name)
+
+    if use_cache:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["response"], entry["duration"], True, True
+
+    response, duration, ok = _generate_response(api_key, user_id, model_name)
+    if ok:
+        cache.put(key, response, duration=duration, model=model_name)
+    return response, duration, False, ok
+
+def plan_batches(lengths, batch_size=MLX_BATCH_SIZE):
+    """
+    Groups prompt indices into batches of at most batch_size, neighbours in length,
+    so each batch wastes little padding. Longest first, so a batch too big for memory fails early.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+class BatchStats:
+    """Size and throughput of one generate_mlx_batch batch."""
+
+    def __init__(self, indices, prompt_tokens, padded_tokens, generated_tokens, seconds):
+        # Positions of the batch's prompts in the generate_mlx_batch call
+        self.indices = indices
+        self.size = len(indices)
+        self.prompt_tokens = prompt_tokens
+        # Pad positions added to bring every prompt up to the longest one
+        self.padded_tokens = padded_tokens
+        self.generated_tokens = generated_tokens
+        self.seconds = seconds
+
+    @property
+    def tokens_per_sec(self):
+        return self.generated_tokens / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "size": self.size,
+            "prompt_tokens": self.prompt_tokens,
+            "padded_tokens": self.padded_tokens,
+            "generated_tokens": self.generated_tokens,
+            "seconds": round(self.seconds, 2),
+            "tokens_per_sec": round(self.tokens_per_sec, 1),
+        }
+
+    def summary(self):
+        return (
+            f"{self.size} prompts · {self.prompt_tokens} prompt tokens (+{self.padded_tokens} padding) · "
+            f"{self.generated_tokens} tokens in {self.seconds:.2f}s · {self.tokens_per_sec:.1f} tok/s"
+        )
+
+def _mlx_generate_batch(model, tokenizer, prompt_tokens, max_tokens):
+    """Decodes token-id prompts together; returns their texts. Falls back to one by one on older mlx-lm."""
+    try:
+        from mlx_lm import batch_generate
+    except ImportError:
+        from mlx_lm import generate
+        return [generate(model, tokenizer, prompt=tokens, max_tokens=max_tokens, verbose=False) for tokens in prompt_tokens]
+    return batch_generate(model, tokenizer, prompt_tokens, max_tokens=max_tokens, verbose=False).texts
+
+def generate_mlx_batch(model_name, prompts, batch_size=MLX_BATCH_SIZE, max_tokens=MLX_MAX_TOKENS,
+                       generate_batch=_mlx_generate_batch):
+    """
+    Generates answers to several full prompts (e.g. from different athletes) with one mlx-* model from MLX_CACHE,
+    batch_size prompts per decode. Returns (texts in prompt order, [BatchStats per batch]).
+    generate_batch(model, tokenizer, prompt_tokens, max_tokens) -> texts can be replaced by a stub.
+    """
+    model, tokenizer = load_mlx_model(model_name)
+    encoded = [tokenizer.encode(prompt) for prompt in prompts]
+    texts = [None] * len(prompts)
+    batches = []
+    for indices in plan_batches([len(tokens) for tokens in encoded], batch_size):
+        batch_tokens = [encoded[i] for i in indices]
+        start_time = time.time()
+        outputs = generate_batch(model, tokenizer, batch_tokens, max_tokens)
+        seconds = time.time() - start_time
+        for i, text in zip(indices, outputs):
+            texts[i] = text
+        lengths = [len(tokens) for tokens in batch_tokens]
+        batches.append(BatchStats(
+            indices=indices,
+            prompt_tokens=sum(lengths),
+            padded_tokens=max(lengths) * len(lengths) - sum(lengths),
+            generated_tokens=sum(len(tokenizer.encode(text)) for text in outputs),
+            seconds=seconds,
+        ))
+    return texts, batches
+
+def get_coach_assessments_mlx(user_ids, model_name, batch_size=MLX_BATCH_SIZE, generate_batch=_mlx_generate_batch):
+    """
+    get_coach_assessment for several athletes on an mlx-* model, generating the uncached ones in batches.
+    Returns ({user_id: (response_text, duration_seconds, cached, ok)}, [BatchStats]); duration is the batch's.
+    A failed batch is returned as error text for its athletes and not cached.
+    """
+    results = {}
+    pending = {}
+    for user_id in user_ids:
+        cache, key = _assessment_cache_key(user_id, model_name)
+        entry = cache.get(key)
+        if entry is not None:
+            results[user_id] = (entry["response"], entry["duration"], True, True)
+        else:
+            pending[user_id] = (cache, key, build_full_prompt(user_id, model_name))
+    if not pending:
+        return results, []
+
+    users = list(pending)
+    try:
+        texts, batches = generate_mlx_batch(
+            model_name, [pending[u][2] for u in users], batch_size=batch_size, generate_batch=generate_batch
+        )
+    except Exception as e:
+        results.update({user_id: (f"Error with MLX: {str(e)}", 0, False, False) for user_id in users})
+        return results, []
+    for batch in batches:
+        for i in batch.indices:
+            cache, key, _ = pending[users[i]]
+            cache.put(key, texts[i], duration=batch.seconds, model=model_name)
+            results[users[i]] = (texts[i], batch.seconds, False, True)
+    return results, batches
+
+class StreamStats:
+    """Timing for a streamed response, filled in by stream_ai_coach_response as chunks arrive."""
+
+    def __init__(self):
+        self.start_time = None
+        self.first_token_time = None
+        self.end_time = None
+        self.tokens = 0
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_time is None:
+            return 0.0
+        return self.first_token_time - self.start_time
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def tokens_per_sec(self):
+        # Decode rate, measured from the first token so prefill time is not counted
+        if self.first_token_time is None or not self.tokens:
+            return 0.0
+        decode_time = (self.end_time or time.time()) - self.first_token_time
+        return self.tokens / decode_time if decode_time > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"Generated in {self.duration:.2f}s · first token {self.time_to_first_token:.2f}s · "
+            f"{self.tokens_per_sec:.1f} tok/s"
+        )
+
+def _stream_mlx(model_name, full_prompt, stats):
+    from mlx_lm import stream_generate
+
+    model, tokenizer = load_mlx_model(model_name)
+    for response in stream_generate(model, tokenizer, prompt=full_prompt, max_tokens=MLX_MAX_TOKENS):
+        # Newer mlx-lm yields GenerationResponse objects, older versions plain strings
+        stats.tokens += 1
+        yield getattr(response, "text", response)
+
+def _stream_ollama(model_name, messages, stats):
+    for data in get_ollama_client().stream_chat(model_name, messages):
+        if data.get("done"):
+            # Ollama reports the exact generated token count on the final line
+            stats.tokens = data.get("eval_count", stats.tokens)
+            break
+        stats.tokens += 1
+        yield data.get("message", {}).get("content", "")
+
+def _stream_gemini(api_key, model_name, full_prompt, stats):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+    for chunk in model.generate_content(full_prompt, stream=True):
+        text = chunk.text
+        stats.tokens += estimate_tokens(text)
+        yield text
+
+def stream_ai_coach_response(api_key, user_id, model_name="deepseek-r1:8b", chat_mode=False, user_message=None,
+                             history=None, stats=None):
+    """
+    Streaming variant of get_ai_coach_response: yields response text chunks as the backend produces them.
+    Pass a StreamStats to collect time-to-first-token and tokens/sec. Errors are yielded as text.
+    """
+    stats = stats if stats is not None else StreamStats()
+    if model_name.startswith("gemini") or model_name.startswith("mlx-"):
+        full_prompt = build_full_prompt(user_id, model_name, chat_mode, user_message, history)
+    else:
+        messages = build_chat_messages(user_id, model_name, chat_mode, user_message, history)
+    stats.start_time = time.time()
+
+    if model_name.startswith("mlx-"):
+        chunks, backend = _stream_mlx(model_name, full_prompt, stats), "MLX"
+    elif not model_name.startswith("gemini"):
+        chunks, backend = _stream_ollama(model_name, messages, stats), "Ollama"
+    elif not api_key:
+        stats.end_time = time.time()
+        yield "Please provide a valid Gemini API Key in the settings."
+        return
+    else:
+        chunks, backend = _stream_gemini(api_key, model_name, full_prompt, stats), "Gemini"
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if stats.first_token_time is None:
+                stats.first_token_time = time.time()
+            yield chunk
+    except requests.exceptions.ConnectionError:
+        yield "Error: Could not connect to Ollama. Make sure it is running."
     except Exception as e:
-        return f"Error contacting Coach Conejito: {str(e)}", 0
\ No newline at end of file
+        if backend == "Gemini":
+            yield f"Error contacting Coach Conejito: {str(e)}"
+        else:
+            yield f"Error with {backend}: {str(e)}"
+    finally:
+        stats.end_time = time.time()
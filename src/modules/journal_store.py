@@ -0,0 +1,98 @@
+import os
+import json
+import threading
+
+# Journal entries are journal/<YYYY-MM-DD>.json, so the sorted file names are
+# already a date index: latest(n) and range(start, end) pick names first and
+# only open the files they return. Parsed entries stay cached per repository
+# (one per journal directory, shared by every Streamlit rerun in the process)
+# and are re-read only when a file's mtime/size changes; save() writes through
+# the cache. The name listing is reused until the directory's mtime changes.
+
+def _entry_date(filename):
+    return filename[:-len(".json")]
+
+class JournalRepository:
+    """Date-indexed access to one journal directory."""
+
+    def __init__(self, journal_dir):
+        self.journal_dir = journal_dir
+        self._lock = threading.Lock()
+        self._listing = None  # (directory mtime_ns, dates sorted newest first)
+        self._entries = {}  # date -> ((mtime_ns, size), entry)
+
+    def dates(self):
+        """ISO dates with an entry, newest first."""
+        try:
+            stamp = os.stat(self.journal_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if self._listing and self._listing[0] == stamp:
+                return self._listing[1]
+        dates = sorted(
+            (_entry_date(name) for name in os.listdir(self.journal_dir) if name.endswith(".json")),
+            reverse=True,
+        )
+        with self._lock:
+            self._listing = (stamp, dates)
+        return dates
+
+    def _path(self, entry_date):
+        return os.path.join(self.journal_dir, f"{entry_date}.json")
+
+    def get(self, entry_date):
+        """The entry for an ISO date string, or None."""
+        path = self._path(entry_date)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._entries.get(entry_date)
+        if cached and cached[0] == stamp:
+            return dict(cached[1])
+        with open(path, "r") as f:
+            entry = json.load(f)
+        with self._lock:
+            self._entries[entry_date] = (stamp, entry)
+        return dict(entry)
+
+    def _load(self, dates):
+        entries = (self.get(entry_date) for entry_date in dates)
+        return [entry for entry in entries if entry is not None]
+
+    def latest(self, n=None):
+        """The newest n entries (all when n is None), newest first."""
+        dates = self.dates()
+        return self._load(dates if n is None else dates[:n])
+
+    def range(self, start, end):
+        """Entries dated start..end inclusive (dates or ISO strings), newest first."""
+        start, end = str(start), str(end)
+        return self._load([d for d in self.dates() if start <= d <= end])
+
+    def save(self, entry_date, data):
+        """Writes the entry for entry_date (a date) and refreshes the cache."""
+        entry_date = entry_date.isoformat()
+        path = self._path(entry_date)
+        text = json.dumps(data, indent=4)
+        with open(path, "w") as f:
+            f.write(text)
+        stat = os.stat(path)
+        with self._lock:
+            # Cache what a reader would parse back, not the caller's object
+            self._entries[entry_date] = ((stat.st_mtime_ns, stat.st_size), json.loads(text))
+            # The directory mtime may not move within its timestamp resolution
+            self._listing = None
+
+_REPOSITORIES = {}
+_REPOSITORIES_LOCK = threading.Lock()
+
+def get_journal_repository(journal_dir):
+    """The shared repository for a journal directory."""
+    with _REPOSITORIES_LOCK:
+        if journal_dir not in _REPOSITORIES:
+            _REPOSITORIES[journal_dir] = JournalRepository(journal_dir)
+        return _REPOSITORIES[journal_dir]
@@ -0,0 +1,98 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+# In-process LRU cache for loaded models, bounded by resident size.
+# The loader and the size function are injected so MLX weights, or fakes in
+# tests, can be cached the same way. Loads of the same key are serialized,
+# so a background preload and a chat request never load one model twice.
+
+class ModelCache:
+    """Holds loaded models up to max_bytes, evicting the least recently used first."""
+
+    def __init__(self, loader, max_bytes, size_of=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.size_of = size_of or (lambda value: 0)
+        self._entries = OrderedDict()  # key -> (value, size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._pending = {}
+        self._executor = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_seconds = {}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Returns the cached model for key, loading it (and evicting others) on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0]
+            self._misses += 1
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # A concurrent preload may have finished while we waited
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            started = time.perf_counter()
+            value = self.loader(key)
+            elapsed = time.perf_counter() - started
+            size = self.size_of(value)
+
+            with self._lock:
+                self._entries[key] = (value, size)
+                self._load_seconds[key] = elapsed
+                self._evict()
+            return value
+
+    def _evict(self):
+        # Never evicts the entry just inserted, so one oversized model still fits
+        total = sum(size for _, size in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            total -= size
+            self._evictions += 1
+
+    def preload(self, key):
+        """Loads key on a background thread; returns a Future resolving to the model."""
+        with self._lock:
+            if key in self._entries:
+                done = Future()
+                done.set_result(self._entries[key][0])
+                return done
+            if key in self._pending and not self._pending[key].done():
+                return self._pending[key]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-preload")
+            future = self._executor.submit(self.get, key)
+            self._pending[key] = future
+            return future
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": list(self._entries),
+                "resident_bytes": sum(size for _, size in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "load_seconds": dict(self._load_seconds),
+            }
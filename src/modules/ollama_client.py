@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import threading
+import requests
+
+# HTTP client for a local (or remote) Ollama server.
+# One pooled requests.Session is shared by every chat turn so the TCP
+# connection is reused, and keep_alive asks Ollama to keep the model loaded
+# between turns instead of unloading it after its default idle timeout.
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+CONNECT_TIMEOUT_SECONDS = 3.05
+# Upper bound on waiting for the next byte: covers model load + prefill before the first token
+READ_TIMEOUT_SECONDS = 300.0
+DEFAULT_KEEP_ALIVE = "30m"
+
+def resolve_host(host=None):
+    """Ollama base URL from the argument, OLLAMA_HOST (same variable the ollama CLI reads) or the default."""
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+class OllamaClient:
+    """Pooled Ollama API client with timeouts, keep_alive and connection/latency metrics."""
+
+    def __init__(self, host=None, connect_timeout=CONNECT_TIMEOUT_SECONDS, read_timeout=READ_TIMEOUT_SECONDS,
+                 keep_alive=None, session=None):
+        self.host = resolve_host(host)
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive or os.environ.get("OLLAMA_KEEP_ALIVE") or DEFAULT_KEEP_ALIVE
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._connections_at_start = self._connections_opened()
+        self._latency_total = 0.0
+        self._last_latency = 0.0
+
+    def url(self, path):
+        return f"{self.host}/{path.lstrip('/')}"
+
+    def _connections_opened(self):
+        # urllib3 counts the sockets each pool has created; anything beyond that was a reused connection
+        adapter = self.session.get_adapter(self.host)
+        poolmanager = getattr(adapter, "poolmanager", None)
+        if poolmanager is None:
+            return 0
+        pools = poolmanager.pools
+        return sum(getattr(pools[key], "num_connections", 0) for key in pools.keys())
+
+    def _record(self, started, failed=False):
+        latency = time.time() - started
+        with self._lock:
+            self._requests += 1
+            self._errors += int(failed)
+            self._latency_total += latency
+            self._last_latency = latency
+
+    def post(self, path, payload, stream=False):
+        """POSTs JSON with the client's timeouts; latency is measured up to the response headers."""
+        started = time.time()
+        try:
+            response = self.session.post(self.url(path), json=payload, stream=stream, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception:
+            self._record(started, failed=True)
+            raise
+        self._record(started)
+        return response
+
+    def generate(self, model, prompt, **options):
+        """Non-streaming /api/generate; returns the decoded JSON body."""
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive, **options}
+        response = self.post("/api/generate", payload)
+        return response.json()
+
+    def stream_generate(self, model, prompt, **options):
+        """Streaming /api/generate; yields each decoded NDJSON line, ending with the "done" line."""
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive, **options}
+        yield from self._stream("/api/generate", payload)
+
+    def chat(self, model, messages, **options):
+        """Non-streaming /api/chat over [{"role", "content"}] messages; returns the decoded JSON body."""
+        payload = {"model": model, "messages": messages, "stream": False, "keep_alive": self.keep_alive, **options}
+        response = self.post("/api/chat", payload)
+        return response.json()
+
+    def stream_chat(self, model, messages, **options):
+        """Streaming /api/chat; yields each decoded NDJSON line, ending with the "done" line."""
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": self.keep_alive, **options}
+        yield from self._stream("/api/chat", payload)
+
+    def _stream(self, path, payload):
+        with self.post(path, payload, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                yield data
+                if data.get("done"):
+                    break
+
+    def metrics(self):
+        with self._lock:
+            requests_made = self._requests
+            metrics = {
+                "requests": requests_made,
+                "errors": self._errors,
+                "avg_latency": self._latency_total / requests_made if requests_made else 0.0,
+                "last_latency": self._last_latency,
+            }
+        opened = self._connections_opened() - self._connections_at_start
+        metrics["connections_opened"] = opened
+        metrics["connections_reused"] = max(requests_made - opened, 0)
+        return metrics
+
+    def close(self):
+        self.session.close()
+
+_DEFAULT_CLIENT = None
+_DEFAULT_CLIENT_LOCK = threading.Lock()
+
+def get_ollama_client():
+    """Process-wide client shared by every chat turn, created on first use."""
+    global _DEFAULT_CLIENT
+    with _DEFAULT_CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None:
+            _DEFAULT_CLIENT = OllamaClient()
+        return _DEFAULT_CLIENT
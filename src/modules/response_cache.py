@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from modules.data_manager import atomic_write_json
+
+# Persisted LLM responses, keyed by a hash of everything that went into the prompt.
+# The assembled prompt already contains the profile, plan, activities, journals and
+# the date, so an unchanged key means the model would be asked the exact same thing.
+# Reads never write: a hit's recency is kept in memory per file and only saved
+# with the next put(), which is when it matters for eviction.
+
+# Per cache file, shared by every ResponseCache instance in the process
+_PATH_LOCKS = {}
+_LAST_USED = {}  # path -> {key: last read time}
+_REGISTRY_LOCK = threading.Lock()
+
+def _path_lock(path):
+    with _REGISTRY_LOCK:
+        if path not in _PATH_LOCKS:
+            _PATH_LOCKS[path] = threading.Lock()
+            _LAST_USED[path] = {}
+        return _PATH_LOCKS[path]
+
+def response_cache_key(model_name, today, prompt):
+    digest = hashlib.sha256()
+    for part in (model_name, today.isoformat(), prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ResponseCache:
+    """JSON-file cache with a TTL and a cap on entries (least recently used evicted first)."""
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = _path_lock(path)
+        self._last_used = _LAST_USED[path]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # A damaged cache is just a cold cache
+            return {}
+
+    def _expired(self, entry, now):
+        return now - entry["created_at"] > self.ttl_seconds
+
+    def get(self, key, now=None):
+        """Returns the cached entry for key, or None if missing or expired."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None or self._expired(entry, now):
+                return None
+            self._last_used[key] = now
+            entry["last_used"] = now
+            return entry
+
+    def put(self, key, response, now=None, **fields):
+        """Stores response under key, dropping expired entries and the least recently used beyond max_entries."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = {k: e for k, e in self._load().items() if not self._expired(e, now)}
+            for k, used in self._last_used.items():
+                if k in entries:
+                    entries[k]["last_used"] = max(entries[k]["last_used"], used)
+            self._last_used.clear()
+            entries[key] = {"response": response, "created_at": now, "last_used": now, **fields}
+            if len(entries) > self.max_entries:
+                keep = sorted(entries, key=lambda k: entries[k]["last_used"])[-self.max_entries:]
+                entries = {k: entries[k] for k in keep}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write_json(self.path, entries)
+            return entries[key]
@@ -0,0 +1,200 @@
+import io
+import os
+import time
+import numpy as np
+from modules.file_io import atomic_write_bytes
+
+# Per-activity time series (HR, speed, cadence, altitude, distance, power).
+# Each activity gets processed/streams/activity_<id>/ with one .npy file per tier:
+#   1s.npy, 10s.npy, 60s.npy  records as a structured array (timestamp + float32
+#                             streams), the coarser tiers averaged into buckets
+#   laps.npy                  one row per LAP_METERS of distance
+# Tiers are computed once when the records are stored; reads memory-map the .npy
+# file, so a chart or prompt only touches the pages of the tier it asks for.
+# Every write_streams call also rewrites streams/version, so caches of the
+# system prompt (which includes splits) can stamp one file instead of the tree.
+STREAMS_DIRNAME = "streams"
+STREAMS_VERSION_FILENAME = "version"
+STREAM_FIELDS = ("heart_rate", "speed", "cadence", "altitude", "distance", "power")
+SAMPLE_DTYPE = np.dtype([("timestamp", "<i8")] + [(field, "<f4") for field in STREAM_FIELDS])
+LAP_DTYPE = np.dtype([
+    ("lap", "<i4"),
+    ("start", "<i8"),
+    ("duration_s", "<f4"),
+    ("distance_m", "<f4"),
+    ("avg_hr", "<f4"),
+    ("max_hr", "<f4"),
+    ("avg_speed", "<f4"),
+    ("avg_cadence", "<f4"),
+    ("elevation_gain", "<f4"),
+])
+# tier name -> bucket width in seconds, finest first
+TIERS = {"1s": 1, "10s": 10, "60s": 60}
+LAP_METERS = 1000
+# Splits beyond this are left out of the prompt
+MAX_PROMPT_LAPS = 30
+
+def to_samples(records):
+    """Dict of equal-length arrays (timestamp + any STREAM_FIELDS) -> SAMPLE_DTYPE array sorted by time."""
+    order = np.argsort(np.asarray(records["timestamp"]), kind="stable")
+    samples = np.empty(len(order), dtype=SAMPLE_DTYPE)
+    samples["timestamp"] = np.asarray(records["timestamp"])[order]
+    for field in STREAM_FIELDS:
+        values = records.get(field)
+        samples[field] = np.nan if values is None else np.asarray(values, dtype="float32")[order]
+    return samples
+
+def _bucket_means(samples, starts):
+    """NaN-ignoring mean of every stream over the runs beginning at `starts`."""
+    means = {}
+    for field in STREAM_FIELDS:
+        values = samples[field].astype("float64")
+        valid = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        counts = np.add.reduceat(valid.astype("int64"), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[field] = sums / counts
+    return means
+
+def downsample(samples, seconds):
+    """Averages samples into `seconds`-wide buckets aligned to the first timestamp."""
+    if len(samples) == 0 or seconds <= 1:
+        return np.array(samples, dtype=SAMPLE_DTYPE)
+    buckets = (samples["timestamp"] - samples["timestamp"][0]) // seconds
+    starts = np.r_[0, np.flatnonzero(np.diff(buckets)) + 1]
+    out = np.empty(len(starts), dtype=SAMPLE_DTYPE)
+    out["timestamp"] = samples["timestamp"][0] + buckets[starts] * seconds
+    for field, means in _bucket_means(samples, starts).items():
+        out[field] = means
+    return out
+
+def _forward_fill(values):
+    valid = ~np.isnan(values)
+    index = np.maximum.accumulate(np.where(valid, np.arange(len(values)), 0))
+    filled = values[index]
+    filled[~valid & (np.cumsum(valid) == 0)] = np.nan
+    return filled
+
+def compute_laps(samples, lap_meters=LAP_METERS):
+    """Distance-based splits (the last one partial); empty when there is no distance stream."""
+    distance = _forward_fill(samples["distance"].astype("float64")) if len(samples) else np.array([])
+    if not len(distance) or np.isnan(distance).all():
+        return np.empty(0, dtype=LAP_DTYPE)
+    distance = np.nan_to_num(distance, nan=0.0)
+    lap_ids = (distance // lap_meters).astype("int64")
+    starts = np.r_[0, np.flatnonzero(np.diff(lap_ids)) + 1]
+    timestamps = samples["timestamp"]
+    # A lap runs until the next one starts; the last until the final sample
+    end_times = np.r_[timestamps[starts[1:]], timestamps[-1]]
+    end_distance = np.r_[distance[starts[1:]], distance[-1]]
+
+    altitude = samples["altitude"].astype("float64")
+    climbs = np.nan_to_num(np.clip(np.diff(altitude, prepend=altitude[:1]), 0, None), nan=0.0)
+    heart_rate = samples["heart_rate"].astype("float64")
+    means = _bucket_means(samples, starts)
+
+    laps = np.empty(len(starts), dtype=LAP_DTYPE)
+    laps["lap"] = np.arange(1, len(starts) + 1)
+    laps["start"] = timestamps[starts]
+    laps["duration_s"] = end_times - timestamps[starts]
+    laps["distance_m"] = end_distance - distance[starts]
+    laps["avg_hr"] = means["heart_rate"]
+    with np.errstate(invalid="ignore"):
+        laps["max_hr"] = np.fmax.reduceat(heart_rate, starts)
+    laps["avg_speed"] = means["speed"]
+    laps["avg_cadence"] = means["cadence"]
+    laps["elevation_gain"] = np.add.reduceat(climbs, starts)
+    return laps
+
+def _activity_dir(streams_dir, activity_id):
+    return os.path.join(streams_dir, f"activity_{activity_id}")
+
+def _save_array(directory, name, array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    atomic_write_bytes(os.path.join(directory, f"{name}.npy"), buffer.getbuffer())
+
+def write_streams(streams_dir, activity_id, records):
+    """Stores every tier and the laps for one activity; returns its directory."""
+    directory = _activity_dir(streams_dir, activity_id)
+    os.makedirs(directory, exist_ok=True)
+    samples = to_samples(records)
+    for tier, seconds in TIERS.items():
+        _save_array(directory, tier, downsample(samples, seconds))
+    _save_array(directory, "laps", compute_laps(samples))
+    atomic_write_bytes(os.path.join(streams_dir, STREAMS_VERSION_FILENAME), str(time.time_ns()).encode("ascii"))
+    return directory
+
+def has_streams(streams_dir, activity_id):
+    return os.path.exists(os.path.join(_activity_dir(streams_dir, activity_id), "1s.npy"))
+
+def read_tier(streams_dir, activity_id, tier):
+    """Memory-mapped, read-only tier ("1s", "10s", "60s" or "laps"); None if the activity has no streams."""
+    path = os.path.join(_activity_dir(streams_dir, activity_id), f"{tier}.npy")
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+def choose_tier(duration_s, max_points):
+    """Finest tier that draws at most max_points points for an activity this long."""
+    for tier, seconds in TIERS.items():
+        if duration_s / seconds <= max_points:
+            return tier
+    return list(TIERS)[-1]
+
+def chart_series(samples):
+    """(minutes from start, heart rate, pace in min/km) for plotting a tier; pace is NaN when stopped."""
+    minutes = (samples["timestamp"] - samples["timestamp"][0]) / 60 if len(samples) else np.array([])
+    speed = samples["speed"].astype("float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pace = np.where(speed > 0, 1000 / speed / 60, np.nan)
+    return minutes, samples["heart_rate"], pace
+
+def aerobic_decoupling(samples):
+    """
+    Percent drop in efficiency (speed per heartbeat) from the first half of the
+    activity to the second; None without HR and speed data.
+    """
+    usable = samples[~np.isnan(samples["heart_rate"]) & ~np.isnan(samples["speed"]) & (samples["heart_rate"] > 0)]
+    if len(usable) < 2:
+        return None
+    half = len(usable) // 2
+    first = usable["speed"][:half].mean() / usable["heart_rate"][:half].mean()
+    second = usable["speed"][half:].mean() / usable["heart_rate"][half:].mean()
+    if first <= 0:
+        return None
+    return float((first - second) / first * 100)
+
+def _pace(speed):
+    if np.isnan(speed) or speed <= 0:
+        return "-"
+    seconds = int(round(1000 / speed))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def lap_rows(laps):
+    """Laps as table rows for the UI."""
+    return [
+        {
+            "Lap": int(lap["lap"]),
+            "Distance (km)": round(float(lap["distance_m"]) / 1000, 2),
+            "Pace (min/km)": _pace(lap["avg_speed"]),
+            "Avg HR": None if np.isnan(lap["avg_hr"]) else round(float(lap["avg_hr"])),
+            "Elev Gain (m)": round(float(lap["elevation_gain"])),
+        }
+        for lap in laps
+    ]
+
+def format_laps_for_ai(streams_dir, activity_id):
+    """One prompt line with the splits and aerobic decoupling of an activity, or None without streams."""
+    laps = read_tier(streams_dir, activity_id, "laps")
+    if laps is None or not len(laps):
+        return None
+    splits = []
+    for lap in laps[:MAX_PROMPT_LAPS]:
+        hr = "" if np.isnan(lap["avg_hr"]) else f" {round(float(lap['avg_hr']))}bpm"
+        splits.append(f"{lap['lap']}: {_pace(lap['avg_speed'])}{hr}")
+    line = "  Splits (/km): " + ", ".join(splits)
+    decoupling = aerobic_decoupling(read_tier(streams_dir, activity_id, "10s"))
+    if decoupling is not None:
+        line += f" | Decoupling: {'+' if decoupling >= 0 else ''}{decoupling:.1f}%"
+    return line
@@ -0,0 +1,129 @@
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from modules.cli_args import positive_int, non_negative_int
+from modules.data_manager import list_users, save_sync_report
+from modules.garmin_client import (
+    SyncBackoff, is_garmin_authenticated, sync_garmin_activities, SYNC_IN_PROGRESS_MESSAGE,
+)
+
+# Headless sync of every authenticated athlete, for coaches running many users.
+# One run syncs at most MAX_CONCURRENT_USERS athletes at a time, each after a
+# random start delay of up to JITTER_SECONDS so the Garmin API does not see a
+# burst. All syncs of a run share one BackoffBudget: a rate limit seen by one
+# athlete pauses them all, and once RETRY_BUDGET retries are spent the rest of
+# the run fails fast instead of hammering the API. A user whose sync is already
+# running (the per-user lock in garmin_client) is skipped. The summary is saved
+# to data/sync_report.json.
+#
+#   python -m modules.sync_scheduler --once
+#   python -m modules.sync_scheduler --interval 3600
+MAX_CONCURRENT_USERS = 3
+JITTER_SECONDS = 30.0
+RETRY_BUDGET = 20
+SYNC_INTERVAL_SECONDS = 6 * 3600
+
+class BackoffBudget(SyncBackoff):
+    """SyncBackoff shared by every sync of a scheduled run, with a cap on total retries."""
+
+    def __init__(self, retries=RETRY_BUDGET, **kwargs):
+        super().__init__(**kwargs)
+        self.retries_left = retries
+        self.retries_used = 0
+
+    def allow_retry(self):
+        with self._lock:
+            if self.retries_left <= 0:
+                return False
+            self.retries_left -= 1
+            self.retries_used += 1
+            return True
+
+    @property
+    def exhausted(self):
+        with self._lock:
+            return self.retries_left <= 0
+
+def authenticated_users():
+    return [user_id for user_id in sorted(list_users()) if is_garmin_authenticated(user_id)]
+
+def _status(message):
+    if message == SYNC_IN_PROGRESS_MESSAGE:
+        return "skipped"
+    if message.startswith("Successfully synced") or message.startswith("No running activities"):
+        return "ok"
+    return "failed"
+
+def sync_user(user_id, budget, jitter=JITTER_SECONDS, client_factory=None, sleep=time.sleep, rng=random):
+    """Syncs one athlete after a random delay; returns its report entry."""
+    sleep(rng.uniform(0, jitter))
+    if budget.exhausted:
+        return {"status": "skipped", "message": "Retry budget exhausted earlier in this run.", "seconds": 0.0}
+    started = time.monotonic()
+    try:
+        message = sync_garmin_activities(user_id, backoff=budget, client_factory=client_factory)
+    except Exception as e:
+        message = f"Unexpected Error: {e}"
+    return {"status": _status(message), "message": message, "seconds": round(time.monotonic() - started, 2)}
+
+def run_sync(users=None, max_workers=MAX_CONCURRENT_USERS, jitter=JITTER_SECONDS, retry_budget=RETRY_BUDGET,
+             client_factory=None, sleep=time.sleep, rng=random):
+    """
+    Syncs the given users (default: every authenticated one) once and saves the report.
+    client_factory replaces garminconnect.Garmin, e.g. with a fake backend in tests.
+    """
+    users = authenticated_users() if users is None else list(users)
+    budget = BackoffBudget(retries=retry_budget)
+    started_at = datetime.now()
+    results = {}
+    if users:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(users)))) as pool:
+            futures = {
+                user_id: pool.submit(sync_user, user_id, budget, jitter, client_factory, sleep, rng)
+                for user_id in users
+            }
+            results = {user_id: future.result() for user_id, future in futures.items()}
+
+    statuses = [result["status"] for result in results.values()]
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "ok": statuses.count("ok"),
+        "failed": statuses.count("failed"),
+        "skipped": statuses.count("skipped"),
+        "retries_used": budget.retries_used,
+        "users": results,
+    }
+    save_sync_report(report)
+    return report
+
+def run_forever(interval=SYNC_INTERVAL_SECONDS, sleep=time.sleep, **kwargs):
+    """Runs run_sync every `interval` seconds until interrupted."""
+    while True:
+        report = run_sync(sleep=sleep, **kwargs)
+        print(f"[{report['finished_at']}] synced {report['ok']} ok, {report['failed']} failed, {report['skipped']} skipped")
+        sleep(interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync every authenticated athlete from Garmin Connect.")
+    parser.add_argument("--once", action="store_true", help="run a single sync and exit")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_SECONDS, help="seconds between runs")
+    parser.add_argument("--workers", type=positive_int, default=MAX_CONCURRENT_USERS, help="athletes synced at once")
+    parser.add_argument("--jitter", type=float, default=JITTER_SECONDS, help="max random start delay per athlete")
+    parser.add_argument("--retry-budget", type=non_negative_int, default=RETRY_BUDGET, help="retries shared by one run")
+    args = parser.parse_args(argv)
+    options = {"max_workers": args.workers, "jitter": args.jitter, "retry_budget": args.retry_budget}
+    if args.once:
+        report = run_sync(**options)
+        print(report)
+        return 0 if report["failed"] == 0 else 1
+    try:
+        run_forever(args.interval, **options)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
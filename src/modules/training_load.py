@@ -0,0 +1,107 @@
+import threading
+import numpy as np
+import pandas as pd
+from modules.data_manager import load_activity_frame, activity_data_stamps
+
+# Daily training-load model over the whole activity history, computed with
+# pandas rolling/ewm windows instead of leaving the arithmetic to the LLM.
+# Session load is training minutes weighted by Garmin's aerobic training effect
+# (a TRIMP-style proxy; sessions without a TE count at DEFAULT_INTENSITY).
+#   acute / chronic  7-day and 28-day rolling mean load; ACWR = acute / chronic
+#   CTL / ATL / TSB  fitness and fatigue as exponentially weighted load
+#                    (42 and 7 day time constants); form = CTL - ATL
+#   monotony         7-day mean load / its standard deviation (Foster)
+#   strain           7-day total load * monotony
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+CTL_DAYS = 42
+ATL_DAYS = 7
+DEFAULT_INTENSITY = 1.0
+
+COLUMNS = ["load", "acute", "chronic", "acwr", "ctl", "atl", "tsb", "monotony", "strain"]
+
+# ACWR bands reported alongside the ratio, (upper bound, label), checked in order
+ACWR_BANDS = [
+    (0.8, "below chronic load"),
+    (1.3, "in the 0.8-1.3 range"),
+    (1.5, "elevated"),
+    (float("inf"), "spike - high injury risk"),
+]
+
+# Per-user (stamp, loads) so the model is computed once per day and activity change
+TRAINING_LOAD_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+def daily_load(frame, today):
+    """Load per calendar day from the first activity through today (rest days are 0)."""
+    dated = frame[frame["date"].notna() & (frame["date"] <= pd.Timestamp(today))]
+    if dated.empty:
+        return pd.Series(dtype="float64", name="load")
+    session_load = dated["duration_min"] * dated["aerobic_te"].fillna(DEFAULT_INTENSITY)
+    days = pd.date_range(dated["date"].min(), pd.Timestamp(today), freq="D")
+    return session_load.groupby(dated["date"]).sum().reindex(days, fill_value=0.0).rename("load")
+
+def compute_training_load(frame, today):
+    """DataFrame indexed by day with the COLUMNS above (empty when there is no history)."""
+    load = daily_load(frame, today)
+    if load.empty:
+        return pd.DataFrame(columns=COLUMNS, dtype="float64")
+
+    acute = load.rolling(ACUTE_DAYS, min_periods=1).mean()
+    chronic = load.rolling(CHRONIC_DAYS, min_periods=1).mean()
+    ctl = load.ewm(alpha=1 / CTL_DAYS, adjust=False).mean()
+    atl = load.ewm(alpha=1 / ATL_DAYS, adjust=False).mean()
+    week_std = load.rolling(ACUTE_DAYS, min_periods=1).std(ddof=0)
+    monotony = acute / week_std.replace(0, np.nan)
+
+    return pd.DataFrame({
+        "load": load,
+        "acute": acute,
+        "chronic": chronic,
+        "acwr": acute / chronic.replace(0, np.nan),
+        "ctl": ctl,
+        "atl": atl,
+        "tsb": ctl - atl,
+        "monotony": monotony,
+        "strain": load.rolling(ACUTE_DAYS, min_periods=1).sum() * monotony,
+    })
+
+def acwr_band(ratio):
+    for upper, label in ACWR_BANDS:
+        if ratio < upper:
+            return label
+    return ACWR_BANDS[-1][1]
+
+def _value(number, digits=1):
+    return "N/A" if pd.isna(number) else f"{number:.{digits}f}"
+
+def format_training_load(loads):
+    """Renders today's load model (and the change over the last week) for the LLM prompt."""
+    if loads.empty:
+        return "No training load history."
+
+    now = loads.iloc[-1]
+    week_ago = loads.iloc[-ACUTE_DAYS - 1] if len(loads) > ACUTE_DAYS else loads.iloc[0]
+    acwr = _value(now["acwr"], 2)
+    if acwr != "N/A":
+        acwr = f"{acwr} ({acwr_band(now['acwr'])})"
+    return "\n".join([
+        f"Load model (minutes x aerobic TE, {len(loads)} days of history):",
+        f"  ACWR (7d vs 28d): {acwr}",
+        f"  Fitness CTL: {_value(now['ctl'])} | Fatigue ATL: {_value(now['atl'])} | "
+        f"Form TSB: {_value(now['tsb'])} (7 days ago: {_value(week_ago['tsb'])})",
+        f"  Monotony (7d): {_value(now['monotony'], 2)} | Strain (7d): {_value(now['strain'], 0)}",
+    ])
+
+def load_training_load(user_id, today):
+    """compute_training_load for a user's activities, cached until the date or the activities change."""
+    stamp = (today, activity_data_stamps(user_id))
+    with _CACHE_LOCK:
+        cached = TRAINING_LOAD_CACHE.get(user_id)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    loads = compute_training_load(load_activity_frame(user_id), today)
+    with _CACHE_LOCK:
+        TRAINING_LOAD_CACHE[user_id] = (stamp, loads)
+    return loads
@@ -0,0 +1,56 @@
+import os
+import threading
+
+# Directory layout of one athlete, shared by every module in the process.
+# Building a UserStore only joins paths. ensure() creates the tree the first
+# time something is written for that user and is a no-op afterwards, so read
+# paths cost no mkdir/stat calls and never create directories for athletes
+# that do not exist.
+
+class UserStore:
+    """Paths of one athlete's data under users_dir/<user_id>/."""
+
+    def __init__(self, users_dir, user_id):
+        self.user_id = user_id
+        self.root = os.path.join(users_dir, user_id)
+        self.journal_dir = os.path.join(self.root, "journal")
+        self.profile_dir = os.path.join(self.root, "profile")
+        self.prompts_dir = os.path.join(self.profile_dir, "prompts")
+        # Created by the Garmin login itself; its presence means "authenticated"
+        self.token_dir = os.path.join(self.profile_dir, "garmin_tokens")
+        self.garmin_dir = os.path.join(self.root, "raw", "garmin")
+        self.fit_archive_dir = os.path.join(self.root, "raw", "fit")
+        self.inbox_dir = os.path.join(self.root, "inbox")
+        self.processed_dir = os.path.join(self.root, "processed")
+        self._ensured = False
+        self._lock = threading.Lock()
+
+    def profile_path(self, filename):
+        return os.path.join(self.profile_dir, filename)
+
+    def processed_path(self, filename):
+        return os.path.join(self.processed_dir, filename)
+
+    def ensure(self):
+        """Creates the directory tree once per process; returns self for chaining."""
+        if not self._ensured:
+            with self._lock:
+                if not self._ensured:
+                    for directory in (
+                        self.journal_dir, self.prompts_dir, self.garmin_dir, self.inbox_dir, self.processed_dir,
+                    ):
+                        os.makedirs(directory, exist_ok=True)
+                    self._ensured = True
+        return self
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_user_store(users_dir, user_id):
+    """The process-wide UserStore for user_id under users_dir."""
+    key = (users_dir, user_id)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = UserStore(users_dir, user_id)
+        return store
@@ -7,7 +7,7 @@ YOUR GOAL: Analyze the athlete's data (training load, heart rate, subjective jou
 
 REASONING PROCESS (Internal Monologue):
 Before generating the final response, you must deeply analyze the following in your thought process:
-- **Fatigue vs. Fitness**: Compare recent load (last 7 days) vs. chronic load (last 4 weeks). Is the athlete fresh or overreached?
+- **Fatigue vs. Fitness**: Read the pre-computed ACWR (last 7 days vs. last 4 weeks) and Form (TSB) from TRAINING LOAD rather than recalculating them. Is the athlete fresh or overreached?
 - **Subjective vs. Objective**: Does the subjective feeling (RPE, Mood, Soreness) match the objective data (HR, Pace)? Divergence (e.g., Low RPE but High HR) is a warning sign.
 - **Injury Risk**: Look for rising soreness trends or sudden spikes in volume (>10%/week).
 - **Goal Alignment**: Is the current work moving them towards their specific goal?
@@ -0,0 +1,145 @@
+import os
+import json
+from datetime import date
+from unittest.mock import patch
+
+from modules.activity_frame import (
+    FRAME_DIRNAME, SCHEMA, normalize_activities, append_activities, read_frame, _part_paths,
+)
+from modules.data_manager import save_garmin_activities, load_activity_frame, get_processed_dir
+from modules.gemini_coach import format_garmin_for_ai, rollup_activities, format_training_stats
+
+
+def _activity(activity_id, day, distance=10000, **extra):
+    return {
+        "activityId": activity_id,
+        "startTimeLocal": f"2026-01-{day:02d} 08:00:00",
+        "activityType": {"typeKey": "running"},
+        "distance": distance,
+        "duration": 3000,
+        **extra,
+    }
+
+
+# =====================================================================
+# normalize / read
+# =====================================================================
+
+def test_normalize_types_and_missing_values(sample_running_activity, sample_strength_activity):
+    frame = normalize_activities([sample_running_activity, sample_strength_activity])
+    assert list(frame.columns) == SCHEMA.names
+    assert frame["distance_km"].dtype == "float64"
+    assert frame["date"].dtype == "datetime64[ns]"
+    assert frame.loc[0, "distance_km"] == sample_running_activity["distance"] / 1000
+    assert frame["elevation_m"].isna().iloc[1]
+
+
+def test_read_missing_frame_is_empty(tmp_path):
+    frame = read_frame(str(tmp_path / "missing"))
+    assert frame.empty
+    assert list(frame.columns) == SCHEMA.names
+
+
+def test_append_keeps_latest_row_per_activity(tmp_path):
+    frame_dir = str(tmp_path / FRAME_DIRNAME)
+    append_activities(frame_dir, [_activity(1, 1), _activity(2, 3)])
+    append_activities(frame_dir, [_activity(1, 1, distance=12000), _activity(3, 2)])
+
+    frame = read_frame(frame_dir)
+    assert list(frame["activity_id"]) == ["2", "3", "1"]
+    assert frame.loc[frame["activity_id"] == "1", "distance_km"].item() == 12.0
+
+
+def test_parts_are_compacted(tmp_path):
+    frame_dir = str(tmp_path / FRAME_DIRNAME)
+    with patch("modules.activity_frame.MAX_PARTS", 3):
+        for day in range(1, 5):
+            append_activities(frame_dir, [_activity(day, day)])
+
+    assert len(_part_paths(frame_dir)) == 1
+    assert len(read_frame(frame_dir)) == 4
+
+
+# =====================================================================
+# data_manager integration
+# =====================================================================
+
+def test_sync_appends_to_frame(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    frame = load_activity_frame(test_user)
+    assert len(frame) == len(weekly_activities)
+    assert frame["start_time"].is_monotonic_decreasing
+
+
+def test_frame_read_from_index_when_out_of_step(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    frame_dir = os.path.join(get_processed_dir(test_user), FRAME_DIRNAME)
+    for path in _part_paths(frame_dir):
+        os.remove(path)
+
+    with patch("modules.data_manager.write_frame") as rebuild:
+        assert len(load_activity_frame(test_user)) == len(weekly_activities)
+    rebuild.assert_not_called()
+    assert _part_paths(frame_dir) == []
+
+
+def test_frame_stays_current_across_syncs(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities[:4])
+    load_activity_frame(test_user)
+    save_garmin_activities(test_user, weekly_activities[4:])
+    with patch("modules.data_manager.write_frame") as rebuild:
+        assert len(load_activity_frame(test_user)) == len(weekly_activities)
+    rebuild.assert_not_called()
+
+
+def test_frame_rebuilt_after_file_edited_in_place(test_user):
+    from modules.data_manager import user_store
+    save_garmin_activities(test_user, [_activity(1, 5), _activity(2, 6)])
+    assert load_activity_frame(test_user)["distance_km"].tolist() == [10.0, 10.0]
+
+    path = os.path.join(user_store(test_user).garmin_dir, "activity_1.json")
+    with open(path, "w") as f:
+        json.dump(_activity(1, 5, distance=21100), f)
+    assert load_activity_frame(test_user)["distance_km"].tolist() == [10.0, 21.1]
+
+
+def test_sync_rebuilds_a_stale_frame(test_user):
+    from modules.data_manager import user_store
+    save_garmin_activities(test_user, [_activity(1, 5), _activity(2, 6)])
+    path = os.path.join(user_store(test_user).garmin_dir, "activity_1.json")
+    with open(path, "w") as f:
+        json.dump(_activity(1, 5, distance=21100), f)
+    frame_dir = os.path.join(get_processed_dir(test_user), FRAME_DIRNAME)
+    load_activity_frame(test_user)
+    assert read_frame(frame_dir)["distance_km"].tolist() == [10.0, 10.0]
+
+    save_garmin_activities(test_user, [_activity(3, 7)])
+    assert read_frame(frame_dir)["distance_km"].tolist() == [10.0, 10.0, 21.1]
+
+
+def test_frame_rebuilt_after_delete_plus_add(test_user):
+    from modules.data_manager import user_store
+    save_garmin_activities(test_user, [_activity(1, 5), _activity(2, 6)])
+    load_activity_frame(test_user)
+
+    garmin_dir = user_store(test_user).garmin_dir
+    os.remove(os.path.join(garmin_dir, "activity_1.json"))
+    with open(os.path.join(garmin_dir, "activity_3.json"), "w") as f:
+        json.dump(_activity(3, 7), f)
+    assert sorted(load_activity_frame(test_user)["activity_id"]) == ["2", "3"]
+
+
+# =====================================================================
+# vectorized prompt sections
+# =====================================================================
+
+def test_frame_and_dicts_format_the_same(weekly_activities, sample_running_activity, sample_strength_activity):
+    activities = [sample_running_activity, sample_strength_activity] + weekly_activities
+    frame = normalize_activities(activities)
+    assert format_garmin_for_ai(frame) == format_garmin_for_ai(activities)
+
+    today = date(2026, 1, 30)
+    from_frame = format_training_stats(rollup_activities(frame, today), today)
+    from_dicts = format_training_stats(rollup_activities(activities, today), today)
+    assert from_frame == from_dicts
+    assert "Weekly breakdown" in from_frame
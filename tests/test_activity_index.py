@@ -0,0 +1,314 @@
+import os
+import json
+import sqlite3
+from datetime import date
+from unittest.mock import patch
+
+from modules.activity_index import (
+    connect, refresh_index, index_activity_file, load_indexed_activities, load_rollups, SCHEMA_VERSION,
+)
+from modules.data_manager import ensure_user_dirs, load_garmin_activities, save_garmin_activities
+
+
+def _write_activity(garmin_dir, activity):
+    path = os.path.join(garmin_dir, f"activity_{activity['activityId']}.json")
+    with open(path, "w") as f:
+        json.dump(activity, f)
+    return path
+
+
+# =====================================================================
+# refresh_index
+# =====================================================================
+
+def test_refresh_indexes_new_files(tmp_path):
+    garmin_dir = str(tmp_path)
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    _write_activity(garmin_dir, {"activityId": 2, "startTimeLocal": "2026-01-12 08:00:00"})
+    conn = connect(str(tmp_path / "index.sqlite"))
+
+    assert refresh_index(conn, garmin_dir) == 2
+    assert [a["activityId"] for a in load_indexed_activities(conn)] == [2, 1]
+
+
+def test_refresh_skips_unchanged_files(tmp_path):
+    garmin_dir = str(tmp_path)
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    with patch("modules.activity_index.json.load") as mock_load:
+        assert refresh_index(conn, garmin_dir) == 0
+    mock_load.assert_not_called()
+
+
+def test_refresh_reparses_changed_file(tmp_path):
+    garmin_dir = str(tmp_path)
+    path = _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00", "distance": 5000})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00", "distance": 12000})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert refresh_index(conn, garmin_dir) == 1
+    assert load_indexed_activities(conn)[0]["distance"] == 12000
+
+
+def test_refresh_drops_deleted_files(tmp_path):
+    garmin_dir = str(tmp_path)
+    path = _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    os.remove(path)
+    assert refresh_index(conn, garmin_dir) == 1
+    assert load_indexed_activities(conn) == []
+
+
+def _age(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1_000_000_000))
+
+
+def test_refresh_skips_scan_of_unchanged_dir(tmp_path):
+    garmin_dir = str(tmp_path / "garmin")
+    os.makedirs(garmin_dir)
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    _age(garmin_dir)
+    conn = connect(str(tmp_path / "index.sqlite"))
+    assert refresh_index(conn, garmin_dir) == 1
+
+    with patch("modules.activity_index.os.scandir") as mock_scandir:
+        assert refresh_index(conn, garmin_dir) == 0
+    mock_scandir.assert_not_called()
+
+    _write_activity(garmin_dir, {"activityId": 2, "startTimeLocal": "2026-01-12 08:00:00"})
+    _age(garmin_dir, seconds=5)
+    assert refresh_index(conn, garmin_dir) == 1
+    assert [a["activityId"] for a in load_indexed_activities(conn)] == [2, 1]
+
+
+def test_refresh_rescans_a_recently_changed_dir(tmp_path):
+    garmin_dir = str(tmp_path / "garmin")
+    os.makedirs(garmin_dir)
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    # The directory changed within the settle window, so its stamp is not trusted yet
+    with patch("modules.activity_index.os.scandir", wraps=os.scandir) as mock_scandir:
+        refresh_index(conn, garmin_dir)
+    mock_scandir.assert_called_once()
+
+
+def test_index_activity_file_is_not_reparsed(tmp_path):
+    garmin_dir = str(tmp_path)
+    activity = {"activityId": 7, "startTimeLocal": "2026-01-10 08:00:00"}
+    path = _write_activity(garmin_dir, activity)
+    conn = connect(str(tmp_path / "index.sqlite"))
+
+    index_activity_file(conn, path, activity)
+    assert refresh_index(conn, garmin_dir) == 0
+    assert load_indexed_activities(conn) == [activity]
+
+
+def test_connect_rebuilds_outdated_schema(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE activities (filename TEXT PRIMARY KEY, data TEXT)")
+    old.commit()
+    old.close()
+
+    conn = connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    _write_activity(str(tmp_path), {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"})
+    assert refresh_index(conn, str(tmp_path)) == 1
+
+
+# =====================================================================
+# rollups
+# =====================================================================
+
+def test_rollups_aggregate_week_month_year(tmp_path, weekly_activities):
+    garmin_dir = str(tmp_path)
+    for act in weekly_activities:
+        _write_activity(garmin_dir, act)
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    weeks = load_rollups(conn, "week")
+    assert [w["key"] for w in weeks] == ["2026-W02", "2026-W03", "2026-W04", "2026-W05"]
+    assert weeks[-1] == {
+        "key": "2026-W05", "distance_km": 28.0, "duration_min": 140.0,
+        "elevation_m": 240, "sessions": 2, "longest_km": 20.0,
+    }
+    assert [w["key"] for w in load_rollups(conn, "week", latest=2)] == ["2026-W04", "2026-W05"]
+    assert load_rollups(conn, "month", keys=["2026-01"])[0]["distance_km"] == 89.0
+    assert load_rollups(conn, "year", keys=["2026"])[0]["sessions"] == 8
+
+
+def test_rollups_follow_moved_and_deleted_activities(tmp_path):
+    garmin_dir = str(tmp_path)
+    path = _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "2026-01-06 08:00:00", "distance": 5000})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    # Re-dating the activity must empty the old week and fill the new one
+    moved = {"activityId": 1, "startTimeLocal": "2026-02-10 08:00:00", "distance": 5000}
+    _write_activity(garmin_dir, moved)
+    index_activity_file(conn, path, moved)
+    assert [w["key"] for w in load_rollups(conn, "week")] == ["2026-W07"]
+    assert [m["key"] for m in load_rollups(conn, "month")] == ["2026-02"]
+
+    os.remove(path)
+    refresh_index(conn, garmin_dir)
+    assert load_rollups(conn, "week") == []
+    assert load_rollups(conn, "year") == []
+
+
+def test_rollups_ignore_activities_without_date(tmp_path):
+    garmin_dir = str(tmp_path)
+    _write_activity(garmin_dir, {"activityId": 1, "startTimeLocal": "", "distance": 5000})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+    assert load_rollups(conn, "week") == []
+
+
+# =====================================================================
+# data_manager integration
+# =====================================================================
+
+def test_save_garmin_activities_writes_files_and_index(test_user):
+    activities = [
+        {"activityId": 10, "startTimeLocal": "2026-01-10 08:00:00"},
+        {"activityId": 11, "startTimeLocal": "2026-01-11 08:00:00"},
+        {"activityId": 10, "startTimeLocal": "2026-01-10 08:00:00"},
+        {"startTimeLocal": "2026-01-12 08:00:00"},
+    ]
+    assert save_garmin_activities(test_user, activities) == 2
+
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    assert sorted(os.listdir(garmin_dir)) == ["activity_10.json", "activity_11.json"]
+    assert [a["activityId"] for a in load_garmin_activities(test_user)] == [11, 10]
+
+
+def test_load_garmin_activities_index_lives_outside_raw_dir(test_user):
+    save_garmin_activities(test_user, [{"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"}])
+    load_garmin_activities(test_user)
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    assert os.listdir(garmin_dir) == ["activity_1.json"]
+
+
+# =====================================================================
+# skip-unchanged writes, atomic writes and pack storage
+# =====================================================================
+
+def test_save_skips_unchanged_activities(test_user):
+    activity = {"activityId": 5, "startTimeLocal": "2026-01-10 08:00:00", "distance": 5000}
+    assert save_garmin_activities(test_user, [activity]) == 1
+
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    path = os.path.join(garmin_dir, "activity_5.json")
+    with patch("modules.data_manager.atomic_write_json") as mock_write:
+        # Same content in a different key order is still unchanged
+        assert save_garmin_activities(test_user, [dict(reversed(list(activity.items())))]) == 0
+    mock_write.assert_not_called()
+
+    assert save_garmin_activities(test_user, [dict(activity, distance=6000)]) == 1
+    with open(path) as f:
+        assert json.load(f)["distance"] == 6000
+
+
+def test_atomic_write_leaves_no_partial_file(test_user):
+    from modules.data_manager import atomic_write_json
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    path = os.path.join(garmin_dir, "activity_1.json")
+    atomic_write_json(path, {"activityId": 1})
+
+    try:
+        atomic_write_json(path, {"activityId": 1, "bad": object()})
+    except TypeError:
+        pass
+    with open(path) as f:
+        assert json.load(f) == {"activityId": 1}
+    assert os.listdir(garmin_dir) == ["activity_1.json"]
+
+
+def test_pack_storage_replaces_loose_files(test_user):
+    from modules.activity_index import PACK_FILENAME
+    save_garmin_activities(test_user, [{"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"}])
+    save_garmin_activities(test_user, [
+        {"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00", "distance": 3000},
+        {"activityId": 2, "startTimeLocal": "2026-01-11 08:00:00"},
+    ], storage="pack")
+
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    assert os.listdir(garmin_dir) == [PACK_FILENAME]
+    activities = load_garmin_activities(test_user)
+    assert [a["activityId"] for a in activities] == [2, 1]
+    assert activities[1]["distance"] == 3000
+
+
+def test_pack_appends_are_read_incrementally(tmp_path):
+    from modules.activity_index import append_to_pack, PACK_FILENAME
+    garmin_dir = str(tmp_path)
+    conn = connect(str(tmp_path / "index.sqlite"))
+    append_to_pack(conn, garmin_dir, [{"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00"}])
+
+    # Another writer appends a newer version plus a new activity, then dies mid-line
+    with open(os.path.join(garmin_dir, PACK_FILENAME), "a") as f:
+        f.write(json.dumps({"activityId": 1, "startTimeLocal": "2026-01-10 08:00:00", "distance": 1}) + "\n")
+        f.write(json.dumps({"activityId": 2, "startTimeLocal": "2026-01-12 08:00:00"}) + "\n")
+        f.write('{"activityId": 3, "startTi')
+
+    assert refresh_index(conn, garmin_dir) == 2
+    activities = load_indexed_activities(conn)
+    assert [a["activityId"] for a in activities] == [2, 1]
+    assert activities[1]["distance"] == 1
+
+    # The next append terminates the partial line instead of corrupting itself
+    append_to_pack(conn, garmin_dir, [{"activityId": 4, "startTimeLocal": "2026-01-13 08:00:00"}])
+    fresh = connect(str(tmp_path / "fresh.sqlite"))
+    refresh_index(fresh, garmin_dir)
+    assert [a["activityId"] for a in load_indexed_activities(fresh)] == [4, 2, 1]
+
+
+def test_pack_garmin_activities_compacts(test_user, weekly_activities):
+    from modules.activity_index import PACK_FILENAME
+    from modules.data_manager import pack_garmin_activities, load_training_rollups
+    save_garmin_activities(test_user, weekly_activities)
+    before = load_training_rollups(test_user, date(2026, 1, 30))
+
+    assert pack_garmin_activities(test_user) == 8
+    _, _, garmin_dir = ensure_user_dirs(test_user)
+    assert os.listdir(garmin_dir) == [PACK_FILENAME]
+    with open(os.path.join(garmin_dir, PACK_FILENAME)) as f:
+        assert len(f.readlines()) == 8
+    assert len(load_garmin_activities(test_user)) == 8
+    assert load_training_rollups(test_user, date(2026, 1, 30)) == before
+
+
+# =====================================================================
+# filtered / paged queries
+# =====================================================================
+
+def test_filter_and_page_activities(tmp_path, weekly_activities):
+    from modules.activity_index import iter_indexed_activities, count_indexed_activities, indexed_activity_types
+    garmin_dir = str(tmp_path)
+    for act in weekly_activities:
+        _write_activity(garmin_dir, act)
+    _write_activity(garmin_dir, {"activityId": 9, "startTimeLocal": "2026-01-21 18:00:00",
+                                 "activityType": {"typeKey": "cycling"}})
+    conn = connect(str(tmp_path / "index.sqlite"))
+    refresh_index(conn, garmin_dir)
+
+    assert indexed_activity_types(conn) == ["running", "cycling"]
+    assert count_indexed_activities(conn, type_key="running") == 8
+    assert count_indexed_activities(conn, since="2026-01-13", until="2026-01-23") == 5
+
+    page = [a["activityId"] for a in iter_indexed_activities(conn, type_key="running", limit=3, offset=3)]
+    assert page == [5, 4, 3]
+    week_three = iter_indexed_activities(conn, since="2026-01-19", until="2026-01-26", type_key="running")
+    assert [a["activityId"] for a in week_three] == [6, 5]
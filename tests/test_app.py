@@ -100,3 +100,87 @@ def test_command_center_default(tmp_path):
     assert not at.exception
     subheaders = [sh.value for sh in at.subheader]
     assert any("Coach Chat" in s for s in subheaders)
+
+
+def test_chat_reply_is_generated_in_background(tmp_path):
+    from modules.coach_jobs import COACH_JOBS
+
+    def fake_generate(api_key, user_id, model_name, chat_mode, user_message, history, stats):
+        yield f"Answer to: {user_message}"
+
+    p1, p2 = _make_patches(tmp_path)
+    with p1, p2, patch.object(COACH_JOBS, "generate", fake_generate):
+        at = AppTest.from_file("src/app.py", default_timeout=30)
+        at.run()
+        at.chat_input[0].set_value("How are my legs?").run()
+        assert not at.exception
+        # The fake answers instantly, so the reply may already be in on the first rerun
+        if at.session_state.pending_job:
+            assert COACH_JOBS.get(at.session_state.pending_job).wait(timeout=5)
+            at.run()
+        assert not at.exception
+        assert at.session_state.pending_job is None
+        last = at.session_state.messages[-1]
+        assert (last["role"], last["content"]) == ("assistant", "Answer to: How are my legs?")
+        assert any("Answer to: How are my legs?" in md.value for md in at.markdown)
+
+
+def test_chat_input_is_disabled_while_reply_is_pending(tmp_path):
+    import threading
+    from modules.coach_jobs import COACH_JOBS
+    release = threading.Event()
+
+    def slow_generate(api_key, user_id, model_name, chat_mode, user_message, history, stats):
+        release.wait(timeout=5)
+        yield "Done."
+
+    p1, p2 = _make_patches(tmp_path)
+    with p1, p2, patch.object(COACH_JOBS, "generate", slow_generate):
+        at = AppTest.from_file("src/app.py", default_timeout=30)
+        at.run()
+        at.chat_input[0].set_value("First question").run()
+        assert at.session_state.pending_job
+        assert at.chat_input[0].disabled
+        job = COACH_JOBS.get(at.session_state.pending_job)
+        release.set()
+        assert job.wait(timeout=5)
+        at.run()
+        assert at.session_state.pending_job is None
+        assert not at.chat_input[0].disabled
+
+
+def test_assessment_is_dropped_when_data_changes(tmp_path, sample_journal_entry):
+    from datetime import date
+    from unittest.mock import MagicMock
+    from modules.data_manager import save_journal_entry
+    reply = MagicMock()
+    reply.json.return_value = {"message": {"role": "assistant", "content": "Take a rest day."}}
+
+    p1, p2 = _make_patches(tmp_path)
+    with p1, p2, patch("modules.ollama_client.requests.Session.post", return_value=reply):
+        at = AppTest.from_file("src/app.py", default_timeout=30)
+        at.run()
+        next(b for b in at.button if "Analyze" in b.label).click().run()
+        assert any("Take a rest day." in md.value for md in at.markdown)
+
+        at.run()
+        assert any("Take a rest day." in md.value for md in at.markdown)
+
+        save_journal_entry("default", date(2026, 1, 28), sample_journal_entry)
+        at.run()
+        assert not at.exception
+        assert at.session_state.assessment is None
+        assert not any("Take a rest day." in md.value for md in at.markdown)
+
+
+def test_activities_tab_renders_one_page(tmp_path, weekly_activities):
+    from modules.data_manager import save_garmin_activities
+    p1, p2 = _make_patches(tmp_path)
+    with p1, p2:
+        save_garmin_activities("default", weekly_activities)
+        at = AppTest.from_file("src/app.py", default_timeout=30)
+        at.run()
+    assert not at.exception
+    assert len(at.dataframe) == 1
+    assert len(at.dataframe[0].value) == 8
+    assert any("8 activities · page 1 of 1" in c.value for c in at.caption)
@@ -0,0 +1,57 @@
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from modules import charts
+from modules.data_manager import save_garmin_activities, save_journal_entry, get_data_version
+
+
+@pytest.fixture(autouse=True)
+def _clear_chart_cache():
+    charts.weekly_rollups.clear()
+    charts.hr_pace_points.clear()
+    charts.weekly_volume_chart.clear()
+    yield
+
+
+def test_data_version_bumped_by_sync_and_journal(test_user, weekly_activities):
+    assert get_data_version(test_user) == "0"
+    save_garmin_activities(test_user, weekly_activities)
+    after_sync = get_data_version(test_user)
+    assert after_sync != "0"
+
+    # Nothing new: same version
+    save_garmin_activities(test_user, weekly_activities)
+    assert get_data_version(test_user) == after_sync
+
+    save_journal_entry(test_user, date(2026, 1, 30), {"date": "2026-01-30", "rpe": 5})
+    assert get_data_version(test_user) != after_sync
+
+
+def test_chart_data_cached_until_version_changes(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    with patch("modules.charts.load_rollups", wraps=charts.load_rollups) as load:
+        version = get_data_version(test_user)
+        first = charts.weekly_rollups(test_user, version)
+        charts.weekly_rollups(test_user, version)
+        assert load.call_count == 1
+        assert first["distance_km"].sum() == pytest.approx(sum(a["distance"] for a in weekly_activities) / 1000)
+
+        save_journal_entry(test_user, date(2026, 1, 30), {"date": "2026-01-30", "rpe": 5})
+        charts.weekly_rollups(test_user, get_data_version(test_user))
+        assert load.call_count == 2
+
+
+def test_hr_pace_points_only_runs_with_hr(test_user, weekly_activities, sample_strength_activity):
+    save_garmin_activities(test_user, weekly_activities + [sample_strength_activity])
+    points = charts.hr_pace_points(test_user, get_data_version(test_user))
+    runs = [a for a in weekly_activities if a.get("averageHR") and a.get("averageSpeed")]
+    assert len(points) == len(runs)
+    assert points["pace_min_km"].between(2, 15).all()
+
+
+def test_weekly_volume_chart_builds(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    spec = charts.weekly_volume_chart(test_user, get_data_version(test_user)).to_dict()
+    assert spec["mark"]["type"] == "bar"
@@ -0,0 +1,106 @@
+import os
+from unittest.mock import patch
+
+from modules.chat_log import (
+    append_message, delete_message, read_messages, write_messages, compact, log_counts, needs_compaction,
+)
+
+
+def _contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_append_read_and_tombstones(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    assert read_messages(path) == []
+
+    first = append_message(path, {"role": "user", "content": "Hi"})
+    append_message(path, {"role": "assistant", "content": "Hello!"})
+    delete_message(path, first)
+
+    messages = read_messages(path)
+    assert [(m["role"], m["content"]) for m in messages] == [("assistant", "Hello!")]
+    assert log_counts(path) == (2, 1)
+
+
+def test_partial_last_line_is_ignored_and_terminated(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    append_message(path, {"role": "user", "content": "Hi"})
+    with open(path, "a") as f:
+        f.write('{"op":"add","id":"x","role":"assis')
+
+    assert _contents(read_messages(path)) == ["Hi"]
+    append_message(path, {"role": "assistant", "content": "Hello!"})
+    assert _contents(read_messages(path)) == ["Hi", "Hello!"]
+
+
+def test_recent_page_reads_only_the_tail(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    write_messages(path, [{"role": "user", "content": f"message {n} " + "x" * 200} for n in range(500)])
+
+    with patch("modules.chat_log.READ_BLOCK_SIZE", 1024):
+        reads = []
+        real_open = open
+
+        def tracking_open(*args, **kwargs):
+            handle = real_open(*args, **kwargs)
+            real_read = handle.read
+            handle.read = lambda size=-1: reads.append(size) or real_read(size)
+            return handle
+
+        with patch("builtins.open", tracking_open):
+            page = read_messages(path, limit=3)
+    assert _contents(page) == [f"message {n} " + "x" * 200 for n in (497, 498, 499)]
+    assert sum(reads) < os.path.getsize(path) / 10
+
+
+def test_pagination_across_small_blocks(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    ids = [append_message(path, {"role": "user", "content": f"m{n}"}) for n in range(10)]
+    delete_message(path, ids[5])
+
+    with patch("modules.chat_log.READ_BLOCK_SIZE", 7):
+        assert _contents(read_messages(path)) == [f"m{n}" for n in range(10) if n != 5]
+        assert _contents(read_messages(path, limit=3, before=ids[7])) == ["m3", "m4", "m6"]
+
+
+def test_compact_keeps_only_live_messages(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    ids = [append_message(path, {"role": "user", "content": f"m{n}"}) for n in range(30)]
+    for message_id in ids[:25]:
+        delete_message(path, message_id)
+    before = read_messages(path)
+    assert needs_compaction(path)
+
+    assert compact(path) == 5
+    assert read_messages(path) == before
+    assert log_counts(path) == (5, 0)
+    assert not needs_compaction(path)
+    assert sorted(os.listdir(tmp_path)) == ["chat.jsonl", "chat.jsonl.counts"]
+
+
+def test_log_counts_parse_only_new_lines(tmp_path):
+    from modules import chat_log
+    path = str(tmp_path / "chat.jsonl")
+    ids = [append_message(path, {"role": "user", "content": f"m{n}"}) for n in range(10)]
+    assert log_counts(path) == (10, 0)
+    size = os.path.getsize(path)
+
+    delete_message(path, ids[0])
+    with patch("modules.chat_log._count_from", wraps=chat_log._count_from) as count_from:
+        assert log_counts(path) == (10, 1)
+        assert log_counts(path) == (10, 1)
+    # Only the tombstone was parsed, and nothing on the second call
+    count_from.assert_called_once_with(path, size)
+
+
+def test_log_counts_recount_a_replaced_log(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    for n in range(3):
+        append_message(path, {"role": "user", "content": f"m{n}"})
+    assert log_counts(path) == (3, 0)
+    # Replaced without going through write_messages (e.g. restored from a backup)
+    replacement = str(tmp_path / "other.jsonl")
+    append_message(replacement, {"role": "user", "content": "only"})
+    os.replace(replacement, path)
+    assert log_counts(path) == (1, 0)
@@ -0,0 +1,144 @@
+import threading
+import time as time_module
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from modules.data_manager import ensure_user_dirs, save_journal_entry, load_brief_report
+from modules.gemini_coach import peek_coach_assessment
+from modules.coach_briefs import run_briefs, prepare_brief, GENERATED, FRESH, NO_DATA, FAILED
+
+
+def _ollama_chat_response(content):
+    mock_resp = MagicMock()
+    mock_resp.json.return_value = {"message": {"role": "assistant", "content": content}}
+    return mock_resp
+
+
+def _athlete(user_id, journal_entry):
+    ensure_user_dirs(user_id)
+    save_journal_entry(user_id, date(2026, 1, 28), journal_entry)
+
+
+# =====================================================================
+# prepare_brief
+# =====================================================================
+
+def test_prepare_brief_generates_once_per_fingerprint(data_dirs, sample_journal_entry):
+    _athlete("ana", sample_journal_entry)
+    with patch("modules.ollama_client.requests.Session.post", return_value=_ollama_chat_response("Rest day.")) as mock_post:
+        assert prepare_brief("ana")["status"] == GENERATED
+        assert prepare_brief("ana")["status"] == FRESH
+        assert mock_post.call_count == 1
+        assert peek_coach_assessment("ana")[0] == "Rest day."
+
+        # New data changes the fingerprint: the brief is no longer shown and is regenerated
+        save_journal_entry("ana", date(2026, 1, 29), sample_journal_entry)
+        assert peek_coach_assessment("ana") is None
+        assert prepare_brief("ana")["status"] == GENERATED
+        assert mock_post.call_count == 2
+
+
+def test_prepare_brief_counts_generation_when_data_changes_mid_run(data_dirs, sample_journal_entry):
+    _athlete("ana", sample_journal_entry)
+
+    def answer_while_journal_changes(*args, **kwargs):
+        save_journal_entry("ana", date(2026, 1, 29), sample_journal_entry)
+        return _ollama_chat_response("Rest day.")
+
+    with patch("modules.ollama_client.requests.Session.post", side_effect=answer_while_journal_changes):
+        entry = prepare_brief("ana")
+    assert entry["status"] == GENERATED
+    assert "error" not in entry
+
+
+def test_prepare_brief_reports_backend_errors(data_dirs, sample_journal_entry):
+    import requests as req
+    _athlete("ana", sample_journal_entry)
+    with patch("modules.ollama_client.requests.Session.post", side_effect=req.exceptions.ConnectionError):
+        entry = prepare_brief("ana")
+    assert entry["status"] == FAILED
+    assert "Could not connect" in entry["error"]
+    assert peek_coach_assessment("ana") is None
+
+
+def test_prepare_brief_skips_athletes_without_data(data_dirs):
+    ensure_user_dirs("new")
+    with patch("modules.ollama_client.requests.Session.post") as mock_post:
+        assert prepare_brief("new")["status"] == NO_DATA
+    mock_post.assert_not_called()
+
+
+# =====================================================================
+# run_briefs
+# =====================================================================
+
+def test_run_briefs_covers_every_user_and_saves_report(data_dirs, sample_journal_entry):
+    _athlete("ana", sample_journal_entry)
+    _athlete("ben", sample_journal_entry)
+    ensure_user_dirs("cara")
+    with patch("modules.ollama_client.requests.Session.post", return_value=_ollama_chat_response("Easy run.")):
+        report = run_briefs()
+    assert report[GENERATED] == 2 and report[NO_DATA] == 1
+    assert set(report["users"]) == {"ana", "ben", "cara"}
+    assert load_brief_report()["model"] == "deepseek-r1:8b"
+
+
+def test_run_briefs_bounds_workers():
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def slow_prepare(user_id, model_name):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time_module.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return {"status": GENERATED, "seconds": 0.02}
+
+    with patch("modules.coach_briefs.save_brief_report"):
+        report = run_briefs(users=[f"a{i}" for i in range(8)], workers=3, queue_size=2, prepare=slow_prepare)
+        assert report[GENERATED] == 8
+        assert 1 < active[1] <= 3
+
+
+def test_run_briefs_records_worker_exceptions():
+    def broken_prepare(user_id, model_name):
+        raise RuntimeError("model crashed")
+
+    with patch("modules.coach_briefs.save_brief_report"):
+        report = run_briefs(users=["ana"], prepare=broken_prepare)
+    assert report["users"]["ana"] == {"status": FAILED, "seconds": 0.0, "error": "model crashed"}
+
+
+def test_run_briefs_rejects_cloud_models():
+    with pytest.raises(ValueError):
+        run_briefs(users=["ana"], model_name="gemini-2.0-flash")
+
+
+def test_run_briefs_batches_mlx_prompts(data_dirs, sample_journal_entry):
+    from modules.gemini_coach import MLX_CACHE
+    for user_id in ("ana", "ben", "cara"):
+        _athlete(user_id, sample_journal_entry)
+    ensure_user_dirs("dan")
+    calls = []
+
+    def stub_generate(model, tokenizer, prompt_tokens, max_tokens):
+        calls.append(len(prompt_tokens))
+        return ["Long run Sunday."] * len(prompt_tokens)
+
+    tokenizer = MagicMock()
+    tokenizer.encode.side_effect = lambda text: text.split()
+    with patch.object(MLX_CACHE, "get", return_value=("model", tokenizer)):
+        report = run_briefs(model_name="mlx-phi4", batch_size=2, generate_batch=stub_generate)
+        assert calls == [2, 1]
+        assert report[GENERATED] == 3 and report[NO_DATA] == 1
+        assert [batch["size"] for batch in report["batches"]] == [2, 1]
+        assert peek_coach_assessment("ben", "mlx-phi4")[0] == "Long run Sunday."
+
+        # Nothing new: no batch is decoded again
+        report = run_briefs(model_name="mlx-phi4", batch_size=2, generate_batch=stub_generate)
+        assert report[FRESH] == 3 and report["batches"] == []
+        assert calls == [2, 1]
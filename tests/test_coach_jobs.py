@@ -0,0 +1,69 @@
+import threading
+
+from modules.coach_jobs import CoachJobQueue, DONE, FAILED
+from modules.data_manager import load_chat_history, save_chat_history
+
+
+def _fake_generate(chunks, gate=None, calls=None):
+    def generate(api_key, user_id, model_name, chat_mode, user_message, history, stats):
+        if calls is not None:
+            calls.append(user_message)
+        if gate is not None:
+            gate.wait(timeout=5)
+        stats.tokens = len(chunks)
+        yield from chunks
+    return generate
+
+
+def test_job_streams_text_and_saves_reply(test_user):
+    save_chat_history(test_user, [{"role": "user", "content": "How are my legs?"}])
+    jobs = CoachJobQueue(generate=_fake_generate(["Easy ", "day."]))
+
+    job = jobs.get(jobs.submit(test_user, "", "phi4", "How are my legs?"))
+    assert job.wait(timeout=5)
+    assert job.status == DONE
+    assert job.text == "Easy day."
+    assert load_chat_history(test_user) == [
+        {"role": "user", "content": "How are my legs?"},
+        {"role": "assistant", "content": "Easy day."},
+    ]
+    assert jobs.active_jobs(test_user) == []
+
+
+def test_jobs_for_one_user_run_in_order(test_user):
+    gate = threading.Event()
+    calls = []
+    jobs = CoachJobQueue(generate=_fake_generate(["ok"], gate=gate, calls=calls))
+
+    first = jobs.get(jobs.submit(test_user, "", "phi4", "first"))
+    second = jobs.get(jobs.submit(test_user, "", "phi4", "second"))
+    assert [j.id for j in jobs.active_jobs(test_user)] == [first.id, second.id]
+
+    gate.set()
+    assert second.wait(timeout=5)
+    assert calls == ["first", "second"]
+    assert [m["content"] for m in load_chat_history(test_user)] == ["ok", "ok"]
+
+
+def test_failed_job_keeps_history_unchanged(test_user):
+    def broken(*args, **kwargs):
+        raise RuntimeError("model crashed")
+        yield
+
+    jobs = CoachJobQueue(generate=broken)
+    job = jobs.get(jobs.submit(test_user, "", "phi4", "Hi"))
+    assert job.wait(timeout=5)
+    assert job.status == FAILED
+    assert job.error == "model crashed"
+    assert load_chat_history(test_user) == []
+
+
+def test_finished_jobs_are_pruned(test_user):
+    jobs = CoachJobQueue(generate=_fake_generate(["ok"]), max_finished=2)
+    ids = []
+    for n in range(4):
+        ids.append(jobs.submit(test_user, "", "phi4", f"q{n}"))
+        jobs.get(ids[-1]).wait(timeout=5)
+    jobs.submit(test_user, "", "phi4", "last")
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[3]) is not None
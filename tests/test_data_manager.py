@@ -9,15 +9,22 @@ from modules.data_manager import (
     save_journal_entry,
     load_journal_entries,
     load_garmin_activities,
+    iter_activities,
+    query_activities,
+    count_activities,
+    save_garmin_activities,
     save_user_profile,
     load_user_profile,
     save_coach_plan,
     load_coach_plan,
     save_chat_history,
     load_chat_history,
+    append_chat_message,
+    delete_chat_message,
     create_user,
     save_model_prompt,
     load_model_prompt,
+    prompt_input_stamps,
 )
 
 
@@ -112,6 +119,31 @@ def test_load_garmin_activities_empty(test_user):
     assert load_garmin_activities(test_user) == []
 
 
+def _save_daily_activities(user_id, days):
+    save_garmin_activities(user_id, [
+        {"activityId": d, "startTimeLocal": f"2026-01-{d:02d} 08:00:00", "distance": d * 1000}
+        for d in days
+    ])
+
+
+def test_iter_activities_newest_first_with_limit(test_user):
+    _save_daily_activities(test_user, [3, 9, 5, 1])
+    activities = list(iter_activities(test_user, limit=2))
+    assert [a["activityId"] for a in activities] == [9, 5]
+
+
+def test_iter_activities_since(test_user):
+    _save_daily_activities(test_user, [3, 9, 5, 1])
+    activities = list(iter_activities(test_user, since=date(2026, 1, 5)))
+    assert [a["activityId"] for a in activities] == [9, 5]
+
+
+def test_iter_activities_fields(test_user):
+    _save_daily_activities(test_user, [3])
+    activities = list(iter_activities(test_user, fields=["startTimeLocal", "averageHR"]))
+    assert activities == [{"startTimeLocal": "2026-01-03 08:00:00"}]
+
+
 # --- user profile ---
 
 def test_save_and_load_user_profile(test_user, sample_profile):
@@ -143,6 +175,14 @@ def test_load_coach_plan_default(test_user):
     assert "No plan generated yet" in plan
 
 
+def test_query_activities_pages_with_inclusive_dates(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    assert count_activities(test_user, start_date=date(2026, 1, 20), end_date=date(2026, 1, 27)) == 3
+    page = query_activities(test_user, end_date=date(2026, 1, 27), type_key="running", page=1, page_size=2)
+    assert [a["activityId"] for a in page] == [5, 4]
+    assert query_activities(test_user, type_key="cycling") == []
+
+
 # --- chat history ---
 
 def test_save_and_load_chat_history(test_user):
@@ -159,6 +199,50 @@ def test_load_chat_history_empty(test_user):
     assert load_chat_history(test_user) == []
 
 
+def test_append_and_delete_chat_messages(test_user):
+    first = append_chat_message(test_user, {"role": "user", "content": "Hi"})
+    append_chat_message(test_user, {"role": "assistant", "content": "Hello!"})
+    delete_chat_message(test_user, first)
+
+    assert load_chat_history(test_user) == [{"role": "assistant", "content": "Hello!"}]
+    assert load_chat_history(test_user, include_ids=True)[0]["id"] != first
+
+
+def test_chat_history_pages_back_from_newest(test_user):
+    ids = [append_chat_message(test_user, {"role": "user", "content": f"m{n}"}) for n in range(5)]
+    page = load_chat_history(test_user, limit=2, include_ids=True)
+    assert [m["content"] for m in page] == ["m3", "m4"]
+    older = load_chat_history(test_user, limit=2, before=page[0]["id"])
+    assert [m["content"] for m in older] == ["m1", "m2"]
+    assert load_chat_history(test_user, before=ids[0]) == []
+
+
+def test_legacy_chat_history_json_is_migrated(test_user):
+    _, profile_dir, _ = ensure_user_dirs(test_user)
+    legacy = os.path.join(profile_dir, "chat_history.json")
+    with open(legacy, "w") as f:
+        json.dump([{"role": "user", "content": "Old question"}], f)
+
+    append_chat_message(test_user, {"role": "assistant", "content": "New answer"})
+    assert load_chat_history(test_user) == [
+        {"role": "user", "content": "Old question"},
+        {"role": "assistant", "content": "New answer"},
+    ]
+    assert not os.path.exists(legacy)
+
+
+def test_deletions_trigger_compaction(test_user):
+    from modules.chat_log import CHAT_LOG_FILENAME, COMPACT_MIN_TOMBSTONES
+    ids = [append_chat_message(test_user, {"role": "user", "content": f"m{n}"}) for n in range(COMPACT_MIN_TOMBSTONES + 2)]
+    for message_id in ids[:-2]:
+        delete_chat_message(test_user, message_id)
+
+    _, profile_dir, _ = ensure_user_dirs(test_user)
+    with open(os.path.join(profile_dir, CHAT_LOG_FILENAME)) as f:
+        assert len(f.readlines()) == 2
+    assert [m["content"] for m in load_chat_history(test_user)] == [f"m{COMPACT_MIN_TOMBSTONES}", f"m{COMPACT_MIN_TOMBSTONES + 1}"]
+
+
 # --- create_user ---
 
 def test_create_user_creates_dirs_and_profile(data_dirs):
@@ -202,3 +286,17 @@ def test_model_prompt_sanitizes_name(test_user):
 
 def test_load_model_prompt_returns_none_when_missing(test_user):
     assert load_model_prompt(test_user, "nonexistent-model") is None
+
+
+# --- prompt input stamps ---
+
+def test_prompt_input_stamps_track_inputs(test_user):
+    before = prompt_input_stamps(test_user, "phi4")
+    assert prompt_input_stamps(test_user, "phi4") == before
+
+    save_journal_entry(test_user, date(2026, 1, 28), {"date": "2026-01-28", "rpe": 5})
+    after_journal = prompt_input_stamps(test_user, "phi4")
+    assert after_journal != before
+
+    save_model_prompt(test_user, "phi4", "Custom.")
+    assert prompt_input_stamps(test_user, "phi4") != after_journal
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from modules.file_io import atomic_write_bytes, append_lines
+
+
+# =====================================================================
+# atomic_write_bytes
+# =====================================================================
+
+def test_atomic_write_replaces_content(tmp_path):
+    path = str(tmp_path / "data.bin")
+    atomic_write_bytes(path, b"old")
+    atomic_write_bytes(path, memoryview(b"new"))
+    assert open(path, "rb").read() == b"new"
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_atomic_write_failure_keeps_old_file(tmp_path):
+    path = str(tmp_path / "data.bin")
+    atomic_write_bytes(path, b"old")
+    with pytest.raises(TypeError):
+        atomic_write_bytes(path, "not bytes")
+    assert open(path, "rb").read() == b"old"
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+# =====================================================================
+# append_lines
+# =====================================================================
+
+def test_append_lines_returns_start_offset(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    assert append_lines(path, [b"a\n", b"bb\n"]) == 0
+    assert append_lines(path, [b"c\n"]) == 5
+    assert open(path, "rb").read() == b"a\nbb\nc\n"
+
+
+def test_append_lines_terminates_partial_line(tmp_path):
+    path = tmp_path / "log.jsonl"
+    path.write_bytes(b"a\n{\"trunc")
+    assert append_lines(str(path), [b"b\n"]) == 10
+    assert path.read_bytes() == b"a\n{\"trunc\nb\n"
@@ -1,9 +1,19 @@
 import os
+import sys
 import json
+import types
+import importlib.util
+import threading
+import time as time_module
 from unittest.mock import patch, MagicMock
 from datetime import date
 
-from modules.garmin_client import get_token_dir, is_garmin_authenticated, sync_garmin_activities
+import pytest
+
+from modules.garmin_client import (
+    get_token_dir, is_garmin_authenticated, sync_garmin_activities,
+    date_chunks, fetch_activities, SyncBackoff, ChunkFetchError,
+)
 from modules.data_manager import ensure_user_dirs
 
 
@@ -150,7 +160,9 @@ def test_sync_deduplicates(test_user):
     mock_garth = MagicMock()
     mock_client.garth = mock_garth
 
-    with patch("modules.garmin_client.Garmin", return_value=mock_client):
+    with patch("modules.garmin_client.Garmin", return_value=mock_client), \
+         patch("modules.garmin_client.date") as mock_date:
+        mock_date.today.return_value = date(2026, 1, 31)
         result = sync_garmin_activities(
             test_user, email="test@example.com", password="pass123",
             start_date_obj=date(2025, 12, 1), days=60,
@@ -160,3 +172,228 @@ def test_sync_deduplicates(test_user):
     _, _, garmin_dir = ensure_user_dirs(test_user)
     activity_files = [f for f in os.listdir(garmin_dir) if f.startswith("activity_")]
     assert len(activity_files) == 3
+
+
+# =====================================================================
+# parallel chunked fetch (fake Garmin client)
+# =====================================================================
+
+class FakeGarmin:
+    """Local stand-in for garminconnect.Garmin serving activities by date range."""
+
+    def __init__(self, activities, failures=None, delay=0.0):
+        self.activities = activities
+        # chunk start (ISO) -> list of exceptions to raise before succeeding
+        self.failures = {k: list(v) for k, v in (failures or {}).items()}
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.garth = MagicMock()
+
+    def login(self, tokenstore=None):
+        pass
+
+    def get_activities_by_date(self, start, end):
+        with self._lock:
+            self.calls.append(start)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            pending = self.failures.get(start)
+            error = pending.pop(0) if pending else None
+        try:
+            time_module.sleep(self.delay)
+            if error:
+                raise error
+            return [a for a in self.activities if start <= a["startTimeLocal"][:10] <= end]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _monthly_activities():
+    return [
+        {"activityId": 1000 + m, "startTimeLocal": f"2025-{m:02d}-15 08:00:00", "distance": 5000}
+        for m in range(1, 13)
+    ]
+
+
+def test_date_chunks_cover_range():
+    chunks = date_chunks(date(2025, 1, 1), date(2025, 3, 5))
+    assert chunks[0] == (date(2025, 1, 1), date(2025, 1, 31))
+    assert chunks[-1][1] == date(2025, 3, 5)
+    for (_, prev_end), (next_start, _) in zip(chunks, chunks[1:]):
+        assert (next_start - prev_end).days == 1
+
+
+def test_fetch_parallel_merges_in_chunk_order():
+    fake = FakeGarmin(_monthly_activities(), delay=0.02)
+    result = fetch_activities(fake, date(2025, 1, 1), date(2025, 12, 31), workers=4)
+    assert [a["activityId"] for a in result] == [1000 + m for m in range(1, 13)]
+    assert 1 < fake.max_active <= 4
+
+
+def test_fetch_serial_by_default():
+    fake = FakeGarmin(_monthly_activities(), delay=0.01)
+    fetch_activities(fake, date(2025, 1, 1), date(2025, 6, 30))
+    assert fake.max_active == 1
+
+
+def test_fetch_retries_timeout_chunk():
+    fake = FakeGarmin(_monthly_activities(), failures={
+        "2025-01-01": [ValueError("Expecting value: line 1 column 1 (char 0)")],
+    })
+    with patch("modules.garmin_client.time.sleep") as mock_sleep:
+        result = fetch_activities(fake, date(2025, 1, 1), date(2025, 3, 31), workers=2)
+    assert len(result) == 3
+    assert fake.calls.count("2025-01-01") == 2
+    mock_sleep.assert_called()
+
+
+def test_fetch_gives_up_after_retries():
+    timeout = ValueError("Expecting value: line 1 column 1 (char 0)")
+    fake = FakeGarmin(_monthly_activities(), failures={"2025-01-01": [timeout] * 10})
+    with patch("modules.garmin_client.time.sleep"):
+        with pytest.raises(ChunkFetchError) as exc_info:
+            fetch_activities(fake, date(2025, 1, 1), date(2025, 1, 31), retries=2)
+    assert exc_info.value.chunk_start == date(2025, 1, 1)
+    assert fake.calls.count("2025-01-01") == 3
+
+
+def test_fetch_does_not_retry_other_errors():
+    fake = FakeGarmin(_monthly_activities(), failures={"2025-01-01": [RuntimeError("500 Server Error")]})
+    with pytest.raises(ChunkFetchError):
+        fetch_activities(fake, date(2025, 1, 1), date(2025, 1, 31))
+    assert fake.calls == ["2025-01-01"]
+
+
+def test_rate_limit_pauses_all_workers():
+    backoff = SyncBackoff(base_seconds=0, rate_limit_seconds=0.2)
+    fake = FakeGarmin(_monthly_activities(), failures={
+        "2025-01-01": [Exception("429 Client Error: Too Many Requests")],
+    })
+    started = time_module.monotonic()
+    result = fetch_activities(fake, date(2025, 1, 1), date(2025, 2, 28), workers=1, backoff=backoff)
+    assert len(result) == 2
+    assert time_module.monotonic() - started >= 0.2
+
+
+def test_sync_parallel_with_fake_client(test_user):
+    fake = FakeGarmin(_monthly_activities())
+    with patch("modules.garmin_client.Garmin", return_value=fake), \
+         patch("modules.garmin_client.date") as mock_date:
+        mock_date.today.return_value = date(2025, 12, 31)
+        result = sync_garmin_activities(
+            test_user, email="test@example.com", password="pass123",
+            start_date_obj=date(2025, 1, 1), workers=4,
+        )
+    assert "Successfully synced 12 activities" in result
+
+
+def test_sync_reports_chunk_timeout(test_user):
+    timeout = ValueError("Expecting value: line 1 column 1 (char 0)")
+    fake = FakeGarmin(_monthly_activities(), failures={"2025-12-01": [timeout] * 10})
+    with patch("modules.garmin_client.Garmin", return_value=fake), \
+         patch("modules.garmin_client.date") as mock_date, \
+         patch("modules.garmin_client.time.sleep"):
+        mock_date.today.return_value = date(2025, 12, 31)
+        result = sync_garmin_activities(
+            test_user, email="test@example.com", password="pass123",
+            start_date_obj=date(2025, 12, 1),
+        )
+    assert "Garmin API timeout on chunk 2025-12-01" in result
+
+
+# =====================================================================
+# sync cursor: delta and resumable bulk syncs
+# =====================================================================
+
+def _sync_with_fake(user_id, fake, today, **kwargs):
+    with patch("modules.garmin_client.Garmin", return_value=fake), \
+         patch("modules.garmin_client.date") as mock_date, \
+         patch("modules.garmin_client.time.sleep"):
+        mock_date.today.return_value = today
+        return sync_garmin_activities(user_id, email="test@example.com", password="pass123", **kwargs)
+
+
+def test_delta_sync_starts_from_newest_activity(test_user):
+    from modules.data_manager import load_sync_state
+    fake = FakeGarmin(_monthly_activities())
+    result = _sync_with_fake(test_user, fake, date(2025, 3, 20))
+    assert "since 2025-03-13" in result
+    assert load_sync_state(test_user)["newest_activity"] == "2025-03-15 08:00:00"
+
+    fake.calls.clear()
+    result = _sync_with_fake(test_user, fake, date(2025, 6, 1))
+    # Only the gap since the high-water mark is requested
+    assert fake.calls == ["2025-03-15", "2025-04-15", "2025-05-16"]
+    # The activity on the high-water-mark day is refetched but not rewritten
+    assert "Successfully synced 2 activities since 2025-03-15. 1 already up to date." in result
+    assert load_sync_state(test_user)["newest_activity"] == "2025-05-15 08:00:00"
+
+
+def test_interrupted_bulk_sync_resumes_from_checkpoint(test_user):
+    from modules.data_manager import load_sync_state, load_garmin_activities
+    timeout = ValueError("Expecting value: line 1 column 1 (char 0)")
+    fake = FakeGarmin(_monthly_activities(), failures={"2025-03-04": [timeout] * 10})
+    result = _sync_with_fake(test_user, fake, date(2025, 6, 30), start_date_obj=date(2025, 1, 1))
+    assert "run the sync again to resume" in result
+    assert load_sync_state(test_user)["bulk"] == {"start": "2025-01-01", "completed_through": "2025-03-03"}
+    assert len(load_garmin_activities(test_user)) == 2
+
+    fake = FakeGarmin(_monthly_activities())
+    result = _sync_with_fake(test_user, fake, date(2025, 6, 30), start_date_obj=date(2025, 1, 1))
+    assert fake.calls[0] == "2025-03-04"
+    assert "Successfully synced 4 activities since 2025-03-04" in result
+    assert "bulk" not in load_sync_state(test_user)
+    assert len(load_garmin_activities(test_user)) == 6
+
+
+def test_new_bulk_start_does_not_resume(test_user):
+    from modules.data_manager import save_sync_state
+    save_sync_state(test_user, {"bulk": {"start": "2025-01-01", "completed_through": "2025-03-02"}})
+    fake = FakeGarmin(_monthly_activities())
+    _sync_with_fake(test_user, fake, date(2025, 3, 31), start_date_obj=date(2025, 2, 1))
+    assert fake.calls[0] == "2025-02-01"
+
+
+# =====================================================================
+# sync lock without fcntl (Windows)
+# =====================================================================
+
+class FakeMsvcrt(types.SimpleNamespace):
+    """msvcrt.locking stand-in: one lock per file, shared across handles."""
+    LK_NBLCK = 2
+    LK_UNLCK = 0
+
+    def __init__(self):
+        super().__init__(held=set())
+
+    def locking(self, fd, mode, nbytes):
+        inode = os.fstat(fd).st_ino
+        if mode == self.LK_UNLCK:
+            self.held.discard(inode)
+        elif inode in self.held:
+            raise OSError("locked")
+        else:
+            self.held.add(inode)
+
+
+def test_sync_lock_falls_back_to_msvcrt_without_fcntl(test_user):
+    msvcrt = FakeMsvcrt()
+    spec = importlib.util.spec_from_file_location(
+        "garmin_client_without_fcntl", sys.modules["modules.garmin_client"].__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, {"fcntl": None, "msvcrt": msvcrt}):
+        spec.loader.exec_module(module)
+
+    assert module.fcntl is None
+    with module.user_sync_lock(test_user):
+        with pytest.raises(module.SyncInProgress):
+            with module.user_sync_lock(test_user):
+                pass
+    assert msvcrt.held == set()
+    with module.user_sync_lock(test_user):
+        pass
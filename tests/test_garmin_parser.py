@@ -0,0 +1,212 @@
+import os
+import sys
+import types
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from modules.data_manager import load_garmin_activities, get_streams_dir, save_garmin_activities
+from modules.garmin_parser import (
+    ingest_inbox, get_inbox_dir, load_ingested, summarize_fit, parse_fit_file, file_hash, activity_id_for_hash,
+)
+from modules.gemini_coach import get_system_prompt
+from modules.stream_store import read_tier
+
+
+def fake_parse(path):
+    """Stands in for fitparse: the file body is '<start time>|<seconds>' (or 'bad')."""
+    with open(path) as f:
+        body = f.read()
+    if body == "bad":
+        raise ValueError("not a FIT file")
+    start, seconds = body.split("|")
+    start = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
+    records = {
+        "timestamp": np.arange(int(seconds), dtype="int64") + int(start.timestamp()),
+        "heart_rate": np.full(int(seconds), 140, dtype="float32"),
+        "speed": np.full(int(seconds), 3.0, dtype="float32"),
+        "distance": np.arange(int(seconds), dtype="float32") * 3,
+    }
+    session = {"start_time": start, "sport": "running", "total_distance": 5000.0, "total_timer_time": float(seconds)}
+    return summarize_fit(session, records, name=os.path.basename(path)), records
+
+
+def _drop(user_id, name, body):
+    path = os.path.join(get_inbox_dir(user_id), name)
+    with open(path, "w") as f:
+        f.write(body)
+    return path
+
+
+# =====================================================================
+# summarize_fit
+# =====================================================================
+
+def test_summary_matches_garmin_shape():
+    session = {
+        "start_time": datetime(2026, 1, 28, 7, 0, 0),
+        "sport": "running",
+        "total_distance": 10000.0,
+        "total_timer_time": 3000.0,
+        "avg_heart_rate": 150,
+        "enhanced_avg_speed": 3.33,
+        "avg_running_cadence": 85,
+        "total_training_effect": 3.1,
+    }
+    summary = summarize_fit(session, {"timestamp": np.array([], dtype="int64")}, local_offset_seconds=3600)
+    assert summary["startTimeGMT"] == "2026-01-28 07:00:00"
+    assert summary["startTimeLocal"] == "2026-01-28 08:00:00"
+    assert summary["activityType"] == {"typeKey": "running"}
+    assert summary["averageSpeed"] == 3.33
+    assert summary["averageRunningCadenceInStepsPerMinute"] == 170
+
+
+def _message(name, **values):
+    return types.SimpleNamespace(name=name, get_values=lambda: dict(values))
+
+
+def test_parse_fit_file_maps_messages():
+    messages = [
+        _message("record", timestamp=datetime(2026, 1, 28, 7, 0, 0), heart_rate=140,
+                 enhanced_speed=3.0, speed=2.9, cadence=85, altitude=100.0, distance=0.0),
+        _message("record", timestamp=None, heart_rate=150),
+        _message("record", timestamp=datetime(2026, 1, 28, 7, 0, 1), heart_rate=None,
+                 speed=3.1, cadence=86, enhanced_altitude=101.0, altitude=99.0, distance=3.1),
+        _message("session", start_time=datetime(2026, 1, 28, 7, 0, 0), sport="running",
+                 total_distance=5000.0, total_timer_time=1500.0, avg_heart_rate=145,
+                 avg_running_cadence=85, avg_fractional_cadence=0.5),
+        _message("session", start_time=datetime(2026, 1, 28, 8, 0, 0), sport="cycling"),
+        _message("activity", timestamp=datetime(2026, 1, 28, 7, 30, 0), local_timestamp=datetime(2026, 1, 28, 9, 30, 0)),
+    ]
+    opened = []
+
+    class FitFile:
+        def __init__(self, path):
+            opened.append(path)
+
+        def get_messages(self, names):
+            return [m for m in messages if m.name in names]
+
+    with patch.dict(sys.modules, {"fitparse": types.SimpleNamespace(FitFile=FitFile)}):
+        summary, records = parse_fit_file("/inbox/tempo.fit")
+
+    assert opened == ["/inbox/tempo.fit"]
+    epoch = int(datetime(2026, 1, 28, 7, 0, 0).replace(tzinfo=timezone.utc).timestamp())
+    assert records["timestamp"].tolist() == [epoch, epoch + 1]
+    assert records["timestamp"].dtype == np.int64
+    assert records["heart_rate"][0] == 140 and np.isnan(records["heart_rate"][1])
+    assert records["speed"].tolist() == pytest.approx([3.0, 3.1])
+    assert records["cadence"].tolist() == [85, 86]
+    assert records["altitude"].tolist() == [100.0, 101.0]
+    assert np.isnan(records["power"]).all()
+    assert all(records[stream].dtype == np.float32 for stream in records if stream != "timestamp")
+
+    assert summary["activityName"] == "tempo"
+    assert summary["activityType"] == {"typeKey": "running"}
+    assert summary["distance"] == 5000.0
+    assert summary["duration"] == 1500.0
+    assert summary["averageHR"] == 145
+    assert summary["averageRunningCadenceInStepsPerMinute"] == 171
+    assert summary["startTimeGMT"] == "2026-01-28 07:00:00"
+    assert summary["startTimeLocal"] == "2026-01-28 09:00:00"
+
+
+# =====================================================================
+# ingest_inbox
+# =====================================================================
+
+def test_ingest_parses_saves_and_archives(test_user):
+    path = _drop(test_user, "morning.fit", "2026-01-28 07:00:00|600")
+    digest = file_hash(path)
+
+    report = ingest_inbox(test_user, workers=2, parse=fake_parse)
+
+    activity_id = activity_id_for_hash(digest)
+    assert report == {"ingested": [activity_id], "matched": [], "duplicates": [], "failed": {}}
+    assert not os.path.exists(path)
+    assert [a["activityId"] for a in load_garmin_activities(test_user)] == [activity_id]
+    assert load_ingested(test_user)[digest]["file"] == "morning.fit"
+
+    streams = read_tier(get_streams_dir(test_user), activity_id, "1s")
+    assert streams["heart_rate"].dtype == np.float32
+    assert len(streams) == 600
+
+
+def test_ingest_skips_files_already_imported(test_user):
+    _drop(test_user, "a.fit", "2026-01-28 07:00:00|60")
+    ingest_inbox(test_user, workers=1, parse=fake_parse)
+
+    _drop(test_user, "a-copy.fit", "2026-01-28 07:00:00|60")
+    _drop(test_user, "a-copy2.fit", "2026-01-28 07:00:00|60")
+    report = ingest_inbox(test_user, workers=1, parse=fake_parse)
+
+    assert report["ingested"] == []
+    assert sorted(report["duplicates"]) == ["a-copy.fit", "a-copy2.fit"]
+    assert os.listdir(get_inbox_dir(test_user)) == []
+    assert len(load_garmin_activities(test_user)) == 1
+
+
+def test_failed_file_stays_in_inbox(test_user):
+    _drop(test_user, "good.fit", "2026-01-28 07:00:00|60")
+    _drop(test_user, "broken.fit", "bad")
+
+    report = ingest_inbox(test_user, workers=2, parse=fake_parse)
+
+    assert len(report["ingested"]) == 1
+    assert "not a FIT file" in report["failed"]["broken.fit"]
+    assert os.listdir(get_inbox_dir(test_user)) == ["broken.fit"]
+
+
+def test_ingest_attaches_streams_to_synced_activity(test_user):
+    save_garmin_activities(test_user, [{
+        "activityId": 987654321,
+        "activityName": "Morning Run",
+        "activityType": {"typeKey": "running"},
+        "startTimeGMT": "2026-01-28 07:00:00",
+        "startTimeLocal": "2026-01-28 08:00:00",
+        "distance": 5012.0,
+        "duration": 600.0,
+    }])
+    path = _drop(test_user, "export.fit", "2026-01-28 07:00:00|600")
+    digest = file_hash(path)
+
+    report = ingest_inbox(test_user, workers=1, parse=fake_parse)
+
+    assert report["ingested"] == []
+    assert report["matched"] == [987654321]
+    activities = load_garmin_activities(test_user)
+    assert [(a["activityId"], a["activityName"]) for a in activities] == [(987654321, "Morning Run")]
+    assert load_ingested(test_user)[digest]["activity_id"] == 987654321
+    assert len(read_tier(get_streams_dir(test_user), 987654321, "1s")) == 600
+
+
+def test_ingest_matches_two_exports_of_one_run(test_user):
+    _drop(test_user, "watch.fit", "2026-01-28 07:00:00|60")
+    _drop(test_user, "phone.fit", "2026-01-28 07:00:00|61")
+
+    report = ingest_inbox(test_user, workers=2, parse=fake_parse)
+
+    assert len(report["ingested"]) == 1
+    assert report["matched"] == report["ingested"]
+    assert len(load_garmin_activities(test_user)) == 1
+
+
+def test_matched_import_refreshes_cached_prompt(test_user):
+    save_garmin_activities(test_user, [{
+        "activityId": 987654321,
+        "activityType": {"typeKey": "running"},
+        "startTimeGMT": "2026-01-28 07:00:00",
+        "startTimeLocal": "2026-01-28 08:00:00",
+        "distance": 1800.0,
+        "duration": 600.0,
+    }])
+    before = get_system_prompt(test_user, "phi4")
+    _drop(test_user, "export.fit", "2026-01-28 07:00:00|600")
+
+    assert ingest_inbox(test_user, workers=1, parse=fake_parse)["matched"] == [987654321]
+
+    after = get_system_prompt(test_user, "phi4")
+    assert after != before
+    assert "Splits (/km): 1: 5:33 140bpm" in after
@@ -2,16 +2,24 @@ import sys
 import types
 import json
 import datetime as dt_module
+import pytest
 from unittest.mock import patch, MagicMock
 
 from modules.gemini_coach import (
     format_pace,
     format_garmin_for_ai,
     compute_training_stats,
+    format_training_stats,
     get_system_prompt,
     get_ai_coach_response,
     DEFAULT_COACH_PROMPT,
     MLX_CACHE,
+    PROMPT_CACHE,
+    format_journals_for_ai,
+    get_context_window,
+    pack_data_sections,
+    stream_ai_coach_response,
+    StreamStats,
 )
 
 
@@ -197,6 +205,33 @@ def test_compute_stats_skips_empty_date(frozen_now_jan30):
     assert "10.0km" in result
 
 
+# =====================================================================
+# format_training_stats
+# =====================================================================
+
+def test_format_stats_from_rollups_matches_in_memory(test_user, weekly_activities, frozen_now_jan30):
+    from modules.data_manager import save_garmin_activities, load_training_rollups
+    save_garmin_activities(test_user, weekly_activities)
+    today = dt_module.date(2026, 1, 30)
+    with _patch_frozen(frozen_now_jan30):
+        expected = compute_training_stats(weekly_activities)
+    assert format_training_stats(load_training_rollups(test_user, today), today) == expected
+
+
+def test_format_stats_no_weeks():
+    rollups = {"weeks": [], "month": None, "year": None}
+    assert format_training_stats(rollups, dt_module.date(2026, 1, 30)) == "No training data available."
+
+
+def test_format_stats_other_month_is_zero(test_user, weekly_activities):
+    from modules.data_manager import save_garmin_activities, load_training_rollups
+    save_garmin_activities(test_user, weekly_activities)
+    today = dt_module.date(2026, 3, 2)
+    result = format_training_stats(load_training_rollups(test_user, today), today)
+    assert "This month (2026-03): 0km" in result
+    assert "This year (2026): 89.0km" in result
+
+
 # =====================================================================
 # get_system_prompt
 # =====================================================================
@@ -229,21 +264,176 @@ def test_system_prompt_includes_today(test_user):
     assert "TODAY:" in prompt
 
 
+def test_system_prompt_dates_come_last(test_user):
+    import os
+    from datetime import date
+    from modules.gemini_coach import build_system_prompt
+    monday = build_system_prompt(test_user, "phi4", date(2026, 1, 12))
+    tuesday = build_system_prompt(test_user, "phi4", date(2026, 1, 13))
+    shared = os.path.commonprefix([monday, tuesday])
+    assert shared.endswith("TODAY: ")
+    assert "SUBJECTIVE LOG" in shared
+
+
+def test_chat_messages_extend_previous_turn(test_user):
+    from modules.gemini_coach import build_chat_messages
+    first = build_chat_messages(test_user, "phi4", chat_mode=True, user_message="How are my legs?", history=[])
+    second = build_chat_messages(
+        test_user, "phi4", chat_mode=True, user_message="And tomorrow?",
+        history=[{"role": "user", "content": "How are my legs?"}, {"role": "assistant", "content": "Fresh."}],
+    )
+    assert first[0]["role"] == "system"
+    assert second[:len(first)] == first
+    assert second[-1] == {"role": "user", "content": "And tomorrow?"}
+
+
 def test_system_prompt_includes_training_stats(test_user):
     prompt = get_system_prompt(test_user)
     assert "TRAINING LOAD" in prompt
 
 
+def test_system_prompt_includes_load_model(test_user, weekly_activities):
+    from datetime import date
+    from modules.data_manager import save_garmin_activities
+    from modules.gemini_coach import build_system_prompt
+    save_garmin_activities(test_user, weekly_activities)
+    prompt = build_system_prompt(test_user, "phi4", date(2026, 1, 30))
+    assert "ACWR (7d vs 28d):" in prompt
+    assert "Form TSB:" in prompt
+
+
+def test_system_prompt_adds_splits_for_activities_with_streams(test_user, weekly_activities):
+    import numpy as np
+    from datetime import date
+    from modules.data_manager import save_garmin_activities, get_streams_dir
+    from modules.gemini_coach import build_system_prompt
+    from modules.stream_store import write_streams
+    newest = max(weekly_activities, key=lambda a: a["startTimeLocal"])
+    write_streams(get_streams_dir(test_user), newest["activityId"], {
+        "timestamp": np.arange(1200), "heart_rate": np.full(1200, 150.0),
+        "speed": np.full(1200, 3.0), "distance": np.arange(1200) * 3.0,
+    })
+    save_garmin_activities(test_user, weekly_activities)
+    prompt = build_system_prompt(test_user, "phi4", date(2026, 1, 30))
+    log = prompt.split("TRAINING LOG (recent sessions):\n")[1]
+    assert log.split("\n")[1].startswith("  Splits (/km): 1: 5:33 150bpm")
+    assert prompt.count("Splits (/km)") == 1
+
+
+def test_writing_streams_invalidates_cached_prompt(test_user, weekly_activities):
+    import numpy as np
+    from modules.data_manager import save_garmin_activities, get_streams_dir
+    from modules.stream_store import write_streams
+    save_garmin_activities(test_user, weekly_activities)
+    newest = max(weekly_activities, key=lambda a: a["startTimeLocal"])
+    before = get_system_prompt(test_user, "phi4")
+    assert "Splits (/km)" not in before
+
+    write_streams(get_streams_dir(test_user), newest["activityId"], {
+        "timestamp": np.arange(1200), "heart_rate": np.full(1200, 150.0),
+        "speed": np.full(1200, 3.0), "distance": np.arange(1200) * 3.0,
+    })
+
+    assert "Splits (/km)" in get_system_prompt(test_user, "phi4")
+
+
+def test_system_prompt_lists_ten_most_recent_activities(test_user):
+    from modules.data_manager import save_garmin_activities
+    save_garmin_activities(test_user, [
+        {"activityId": d, "startTimeLocal": f"2026-01-{d:02d} 08:00:00",
+         "activityType": {"typeKey": "running"}, "distance": 5000, "duration": 1500}
+        for d in range(1, 13)
+    ])
+    prompt = get_system_prompt(test_user)
+    assert "- 2026-01-12:" in prompt
+    assert "- 2026-01-03:" in prompt
+    assert "- 2026-01-02:" not in prompt
+
+
+def test_system_prompt_formats_journals_compactly(test_user, sample_journal_entry):
+    from modules.data_manager import save_journal_entry
+    save_journal_entry(test_user, dt_module.date(2026, 1, 28), sample_journal_entry)
+    prompt = get_system_prompt(test_user)
+    assert "- 2026-01-28: RPE 6 | Mood good | Soreness 3 | Legs felt a bit heavy" in prompt
+    assert "{'date'" not in prompt
+
+
+# =====================================================================
+# prompt cache and token budget
+# =====================================================================
+
+def test_system_prompt_cached_until_inputs_change(test_user, sample_profile):
+    from modules.data_manager import save_user_profile
+    PROMPT_CACHE.clear()
+    first = get_system_prompt(test_user)
+    with patch("modules.gemini_coach.build_system_prompt") as mock_build:
+        assert get_system_prompt(test_user) == first
+    mock_build.assert_not_called()
+
+    save_user_profile(test_user, sample_profile)
+    assert sample_profile["goals"] in get_system_prompt(test_user)
+
+
+def test_system_prompt_cache_keyed_by_date_and_model(test_user):
+    PROMPT_CACHE.clear()
+    get_system_prompt(test_user, model_name="phi4")
+    with patch("modules.gemini_coach.build_system_prompt", return_value="rebuilt") as mock_build:
+        assert get_system_prompt(test_user, model_name="gemini-1.5-flash") == "rebuilt"
+        with patch("datetime.date") as mock_date:
+            mock_date.today.return_value = dt_module.date(2030, 1, 1)
+            assert get_system_prompt(test_user, model_name="phi4") == "rebuilt"
+    assert mock_build.call_count == 2
+
+
+def test_context_window_longest_prefix():
+    assert get_context_window("phi4-mini:3.8b") == 8192
+    assert get_context_window("phi4") == 16384
+    assert get_context_window("gemini-1.5-pro") == 32768
+    assert get_context_window("llama3") == 4096
+
+
+def test_format_journals_empty():
+    assert format_journals_for_ai([]) == "No journal entries."
+
+
+def test_pack_sections_fits_budget():
+    plan = "Plan line. " * 400
+    activity_lines = [f"- 2026-01-{d:02d}: Running | 10km in 50min" for d in range(10, 0, -1)]
+    journal_lines = [f"- 2026-01-{d:02d}: RPE 5 | Mood ok | Soreness 2" for d in range(7, 0, -1)]
+
+    packed_plan, log, journals = pack_data_sections(plan, activity_lines, journal_lines, 200)
+    # Newest entries survive, oldest are dropped
+    assert log == activity_lines[:len(log)] and 0 < len(log) < 10
+    assert journals == journal_lines[:len(journals)] and 0 < len(journals) < 7
+    assert packed_plan.endswith("...(truncated)")
+    total = sum(len(l) // 4 + 1 for l in log + journals) + len(packed_plan) // 4
+    assert total <= 200
+
+
+def test_pack_sections_keeps_everything_when_it_fits():
+    packed = pack_data_sections("Easy week.", ["- a", "- b"], ["- c"], 10000)
+    assert packed == ("Easy week.", ["- a", "- b"], ["- c"])
+
+
+def test_small_context_model_gets_shorter_prompt(test_user):
+    from modules.data_manager import save_coach_plan
+    save_coach_plan(test_user, "Long plan paragraph. " * 2000)
+    big = get_system_prompt(test_user, model_name="gemini-1.5-flash")
+    small = get_system_prompt(test_user, model_name="llama3")
+    assert len(small) < len(big)
+    assert "...(truncated)" in small
+
+
 # =====================================================================
 # get_ai_coach_response — Ollama
 # =====================================================================
 
 def test_ollama_success(test_user):
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {"response": "Rest today, run tomorrow."}
+    mock_resp.json.return_value = {"message": {"role": "assistant", "content": "Rest today, run tomorrow."}}
     mock_resp.raise_for_status = MagicMock()
 
-    with patch("modules.gemini_coach.requests.post", return_value=mock_resp):
+    with patch("modules.ollama_client.requests.Session.post", return_value=mock_resp):
         text, duration = get_ai_coach_response(
             api_key="", user_id=test_user, model_name="deepseek-r1:8b",
             chat_mode=False,
@@ -254,7 +444,7 @@ def test_ollama_success(test_user):
 
 def test_ollama_connection_error(test_user):
     import requests as req
-    with patch("modules.gemini_coach.requests.post", side_effect=req.exceptions.ConnectionError):
+    with patch("modules.ollama_client.requests.Session.post", side_effect=req.exceptions.ConnectionError):
         text, duration = get_ai_coach_response(
             api_key="", user_id=test_user, model_name="deepseek-r1:8b",
             chat_mode=False,
@@ -309,9 +499,7 @@ def test_mlx_success(test_user):
     mock_mlx_lm.generate = MagicMock(return_value="Do hill sprints tomorrow.")
 
     # Reset cache before test
-    MLX_CACHE["model"] = None
-    MLX_CACHE["tokenizer"] = None
-    MLX_CACHE["path"] = None
+    MLX_CACHE.clear()
 
     with patch.dict(sys.modules, {"mlx_lm": mock_mlx_lm}):
         text, duration = get_ai_coach_response(
@@ -321,9 +509,7 @@ def test_mlx_success(test_user):
     assert "hill sprints" in text
 
     # Cleanup
-    MLX_CACHE["model"] = None
-    MLX_CACHE["tokenizer"] = None
-    MLX_CACHE["path"] = None
+    MLX_CACHE.clear()
 
 
 # =====================================================================
@@ -332,29 +518,241 @@ def test_mlx_success(test_user):
 
 def test_chat_mode_prompt(test_user):
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {"response": "Chat reply."}
+    mock_resp.json.return_value = {"message": {"role": "assistant", "content": "Chat reply."}}
     mock_resp.raise_for_status = MagicMock()
 
-    with patch("modules.gemini_coach.requests.post", return_value=mock_resp) as mock_post:
+    with patch("modules.ollama_client.requests.Session.post", return_value=mock_resp) as mock_post:
         get_ai_coach_response(
             api_key="", user_id=test_user, model_name="deepseek-r1:8b",
             chat_mode=True, user_message="How are my legs?",
             history=[{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}],
         )
-    called_payload = mock_post.call_args[1]["json"]
-    assert "CHAT HISTORY" in called_payload["prompt"]
-    assert "How are my legs?" in called_payload["prompt"]
+    assert mock_post.call_args[0][0].endswith("/api/chat")
+    messages = mock_post.call_args[1]["json"]["messages"]
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    assert messages[1]["content"] == "Hi"
+    assert messages[-1]["content"] == "How are my legs?"
 
 
 def test_analyze_mode_prompt(test_user):
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {"response": "Analysis done."}
+    mock_resp.json.return_value = {"message": {"role": "assistant", "content": "Analysis done."}}
     mock_resp.raise_for_status = MagicMock()
 
-    with patch("modules.gemini_coach.requests.post", return_value=mock_resp) as mock_post:
+    with patch("modules.ollama_client.requests.Session.post", return_value=mock_resp) as mock_post:
         get_ai_coach_response(
             api_key="", user_id=test_user, model_name="deepseek-r1:8b",
             chat_mode=False,
         )
-    called_payload = mock_post.call_args[1]["json"]
-    assert "actionable assessment" in called_payload["prompt"]
+    messages = mock_post.call_args[1]["json"]["messages"]
+    assert "actionable assessment" in messages[-1]["content"]
+
+
+# =====================================================================
+# stream_ai_coach_response
+# =====================================================================
+
+
+def _ollama_stream_response(lines):
+    mock_resp = MagicMock()
+    mock_resp.__enter__.return_value = mock_resp
+    mock_resp.iter_lines.return_value = [json.dumps(l).encode() for l in lines]
+    return mock_resp
+
+
+def test_stream_ollama_yields_chunks_and_stats(test_user):
+    lines = [
+        {"message": {"role": "assistant", "content": "Easy "}, "done": False},
+        {"message": {"role": "assistant", "content": "run."}, "done": False},
+        {"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 3},
+    ]
+    stats = StreamStats()
+    with patch("modules.ollama_client.requests.Session.post", return_value=_ollama_stream_response(lines)) as mock_post:
+        chunks = list(stream_ai_coach_response("", test_user, model_name="deepseek-r1:8b", stats=stats))
+    assert chunks == ["Easy ", "run."]
+    assert mock_post.call_args[1]["json"]["stream"] is True
+    assert mock_post.call_args[1]["stream"] is True
+    assert stats.tokens == 3
+    assert stats.first_token_time is not None
+    assert 0 <= stats.time_to_first_token <= stats.duration
+    assert "tok/s" in stats.summary()
+
+
+def test_stream_ollama_connection_error(test_user):
+    import requests as req
+    with patch("modules.ollama_client.requests.Session.post", side_effect=req.exceptions.ConnectionError):
+        chunks = list(stream_ai_coach_response("", test_user, model_name="deepseek-r1:8b"))
+    assert chunks == ["Error: Could not connect to Ollama. Make sure it is running."]
+
+
+def test_stream_gemini(test_user):
+    mock_genai = MagicMock()
+    mock_genai.GenerativeModel.return_value.generate_content.return_value = [
+        MagicMock(text="Great "), MagicMock(text="job."),
+    ]
+    with patch.dict(sys.modules, {"google.generativeai": mock_genai}):
+        chunks = list(stream_ai_coach_response("key", test_user, model_name="gemini-1.5-flash"))
+    assert "".join(chunks) == "Great job."
+    mock_genai.GenerativeModel.return_value.generate_content.assert_called_once()
+    assert mock_genai.GenerativeModel.return_value.generate_content.call_args[1]["stream"] is True
+
+
+def test_stream_gemini_no_api_key(test_user):
+    chunks = list(stream_ai_coach_response("", test_user, model_name="gemini-1.5-flash"))
+    assert "Please provide a valid Gemini API Key" in chunks[0]
+
+
+def test_stream_mlx(test_user):
+    mock_mlx_lm = types.ModuleType("mlx_lm")
+    mock_mlx_lm.load = MagicMock(return_value=("mock_model", "mock_tokenizer"))
+    mock_mlx_lm.stream_generate = MagicMock(return_value=iter([
+        types.SimpleNamespace(text="Hill "), types.SimpleNamespace(text="sprints."),
+    ]))
+    MLX_CACHE.clear()
+
+    stats = StreamStats()
+    with patch.dict(sys.modules, {"mlx_lm": mock_mlx_lm}):
+        chunks = list(stream_ai_coach_response("", test_user, model_name="mlx-phi4", stats=stats))
+    assert "".join(chunks) == "Hill sprints."
+    assert stats.tokens == 2
+    MLX_CACHE.clear()
+
+
+def test_stream_stats_before_first_token():
+    stats = StreamStats()
+    assert stats.time_to_first_token == 0.0
+    assert stats.tokens_per_sec == 0.0
+    assert stats.duration == 0.0
+
+
+def test_mlx_model_switch_reuses_loaded_weights(test_user):
+    from modules.gemini_coach import load_mlx_model, preload_mlx_model
+    mock_mlx_lm = types.ModuleType("mlx_lm")
+    mock_mlx_lm.load = MagicMock(side_effect=lambda repo_id: (f"model:{repo_id}", "tokenizer"))
+    MLX_CACHE.clear()
+
+    with patch.dict(sys.modules, {"mlx_lm": mock_mlx_lm}):
+        preload_mlx_model("mlx-phi4").result(timeout=5)
+        for name in ["mlx-deepseek-8b", "mlx-phi4", "mlx-deepseek-8b"]:
+            load_mlx_model(name)
+    assert mock_mlx_lm.load.call_count == 2
+    assert load_mlx_model("mlx-phi4")[0] == "model:mlx-community/phi-4-4bit"
+    assert preload_mlx_model("deepseek-r1:8b") is None
+    MLX_CACHE.clear()
+
+
+# =====================================================================
+# get_coach_assessment
+# =====================================================================
+
+def _ollama_chat_response(content):
+    mock_resp = MagicMock()
+    mock_resp.json.return_value = {"message": {"role": "assistant", "content": content}}
+    return mock_resp
+
+
+def test_assessment_is_cached_until_data_changes(test_user, sample_journal_entry):
+    from datetime import date
+    from modules.gemini_coach import get_coach_assessment
+    from modules.data_manager import save_journal_entry
+
+    with patch("modules.ollama_client.requests.Session.post", return_value=_ollama_chat_response("Easy run.")) as mock_post:
+        text, _, cached = get_coach_assessment("", test_user, model_name="deepseek-r1:8b")
+        assert (text, cached) == ("Easy run.", False)
+        text, _, cached = get_coach_assessment("", test_user, model_name="deepseek-r1:8b")
+        assert (text, cached) == ("Easy run.", True)
+        assert mock_post.call_count == 1
+
+        # Another model or a new journal entry changes the prompt inputs
+        assert get_coach_assessment("", test_user, model_name="phi4")[2] is False
+        save_journal_entry(test_user, date(2026, 1, 28), sample_journal_entry)
+        assert get_coach_assessment("", test_user, model_name="deepseek-r1:8b")[2] is False
+        assert mock_post.call_count == 3
+
+        # Regenerating bypasses the cache
+        assert get_coach_assessment("", test_user, model_name="deepseek-r1:8b", use_cache=False)[2] is False
+        assert mock_post.call_count == 4
+
+
+def test_assessment_errors_are_not_cached(test_user):
+    import requests as req
+    from modules.gemini_coach import get_coach_assessment
+
+    with patch("modules.ollama_client.requests.Session.post", side_effect=req.exceptions.ConnectionError):
+        text, _, cached = get_coach_assessment("", test_user, model_name="deepseek-r1:8b")
+    assert "Could not connect" in text
+    assert cached is False
+
+    with patch("modules.ollama_client.requests.Session.post", return_value=_ollama_chat_response("Tempo.")):
+        text, _, cached = get_coach_assessment("", test_user, model_name="deepseek-r1:8b")
+    assert (text, cached) == ("Tempo.", False)
+
+
+# =====================================================================
+# MLX batch generation
+# =====================================================================
+
+def _word_tokenizer():
+    tokenizer = MagicMock()
+    tokenizer.encode.side_effect = lambda text: text.split()
+    return tokenizer
+
+
+def test_plan_batches_groups_similar_lengths():
+    from modules.gemini_coach import plan_batches
+    assert plan_batches([5, 100, 7, 90, 6], batch_size=2) == [[1, 3], [2, 4], [0]]
+    assert plan_batches([], batch_size=2) == []
+    with pytest.raises(ValueError):
+        plan_batches([5, 6], batch_size=0)
+
+
+def test_generate_mlx_batch_keeps_prompt_order_and_reports_throughput():
+    from modules.gemini_coach import generate_mlx_batch, MLX_CACHE
+    batches_seen = []
+
+    def stub_generate(model, tokenizer, prompt_tokens, max_tokens):
+        batches_seen.append([len(tokens) for tokens in prompt_tokens])
+        return [f"answer to {len(tokens)} words" for tokens in prompt_tokens]
+
+    prompts = ["a b", "a b c d e f", "a", "a b c d e"]
+    with patch.object(MLX_CACHE, "get", return_value=("model", _word_tokenizer())) as mock_get:
+        texts, batches = generate_mlx_batch("mlx-phi4", prompts, batch_size=2, generate_batch=stub_generate)
+
+    mock_get.assert_called_once_with("mlx-community/phi-4-4bit")
+    assert texts == ["answer to 2 words", "answer to 6 words", "answer to 1 words", "answer to 5 words"]
+    assert batches_seen == [[6, 5], [2, 1]]
+    assert [(b.size, b.prompt_tokens, b.padded_tokens) for b in batches] == [(2, 11, 1), (2, 3, 1)]
+    assert batches[0].generated_tokens == 8
+    assert batches[0].as_dict()["tokens_per_sec"] >= 0
+    assert "2 prompts" in batches[0].summary()
+
+
+def test_mlx_generate_batch_uses_batch_generate():
+    from modules.gemini_coach import _mlx_generate_batch
+    mock_mlx_lm = types.ModuleType("mlx_lm")
+    mock_mlx_lm.batch_generate = MagicMock(return_value=MagicMock(texts=["one", "two"]))
+    with patch.dict(sys.modules, {"mlx_lm": mock_mlx_lm}):
+        assert _mlx_generate_batch("model", "tokenizer", [[1, 2], [3]], 64) == ["one", "two"]
+    mock_mlx_lm.batch_generate.assert_called_once_with("model", "tokenizer", [[1, 2], [3]], max_tokens=64, verbose=False)
+
+
+def test_mlx_generate_batch_falls_back_without_batch_generate():
+    from modules.gemini_coach import _mlx_generate_batch
+    mock_mlx_lm = types.ModuleType("mlx_lm")
+    mock_mlx_lm.generate = MagicMock(side_effect=["one", "two"])
+    with patch.dict(sys.modules, {"mlx_lm": mock_mlx_lm}):
+        assert _mlx_generate_batch("model", "tokenizer", [[1, 2], [3]], 64) == ["one", "two"]
+    assert mock_mlx_lm.generate.call_count == 2
+
+
+def test_mlx_assessments_failed_batch_is_not_cached(test_user):
+    from modules.gemini_coach import get_coach_assessments_mlx, peek_coach_assessment, MLX_CACHE
+
+    def broken_generate(model, tokenizer, prompt_tokens, max_tokens):
+        raise RuntimeError("out of memory")
+
+    with patch.object(MLX_CACHE, "get", return_value=("model", _word_tokenizer())):
+        results, batches = get_coach_assessments_mlx([test_user], "mlx-phi4", generate_batch=broken_generate)
+    assert results[test_user] == ("Error with MLX: out of memory", 0, False, False)
+    assert batches == []
+    assert peek_coach_assessment(test_user, "mlx-phi4") is None
@@ -0,0 +1,69 @@
+import os
+import json
+from datetime import date
+from unittest.mock import patch
+
+from modules.journal_store import JournalRepository
+from modules.data_manager import save_journal_entry, load_journal_entries, load_journal_range
+
+
+def _repo_with_days(tmp_path, days):
+    repo = JournalRepository(str(tmp_path))
+    for day in days:
+        repo.save(date(2026, 1, day), {"date": f"2026-01-{day:02d}", "rpe": day % 10})
+    return repo
+
+
+def test_latest_reads_only_the_newest_files(tmp_path):
+    _repo_with_days(tmp_path, range(1, 31))
+    repo = JournalRepository(str(tmp_path))
+
+    with patch("modules.journal_store.json.load", wraps=json.load) as load:
+        entries = repo.latest(7)
+    assert [e["date"] for e in entries] == [f"2026-01-{d:02d}" for d in range(30, 23, -1)]
+    assert load.call_count == 7
+    assert len(repo.latest()) == 30
+
+
+def test_range_is_inclusive_and_newest_first(tmp_path):
+    repo = _repo_with_days(tmp_path, [3, 10, 11, 20])
+    assert [e["date"] for e in repo.range(date(2026, 1, 10), date(2026, 1, 20))] == [
+        "2026-01-20", "2026-01-11", "2026-01-10",
+    ]
+    assert repo.range("2026-02-01", "2026-02-28") == []
+
+
+def test_entries_cached_across_calls(tmp_path):
+    repo = _repo_with_days(tmp_path, [1, 2])
+    repo.latest()
+    with patch("modules.journal_store.json.load", wraps=json.load) as load:
+        repo.latest()
+        repo.range("2026-01-01", "2026-01-02")
+    assert load.call_count == 0
+
+
+def test_save_and_outside_edits_invalidate(tmp_path):
+    repo = _repo_with_days(tmp_path, [1])
+    repo.latest()
+
+    repo.save(date(2026, 1, 1), {"date": "2026-01-01", "rpe": 9})
+    assert repo.latest(1)[0]["rpe"] == 9
+
+    path = os.path.join(str(tmp_path), "2026-01-01.json")
+    with open(path, "w") as f:
+        json.dump({"date": "2026-01-01", "rpe": 3, "notes": "edited by hand"}, f)
+    assert repo.latest(1)[0]["notes"] == "edited by hand"
+
+
+def test_returned_entries_are_copies(tmp_path):
+    repo = _repo_with_days(tmp_path, [1])
+    repo.latest()[0]["rpe"] = 100
+    assert repo.latest()[0]["rpe"] == 1
+
+
+def test_data_manager_journal_queries(test_user):
+    save_journal_entry(test_user, date(2026, 1, 5), {"date": "2026-01-05", "rpe": 4})
+    save_journal_entry(test_user, date(2026, 1, 9), {"date": "2026-01-09", "rpe": 6})
+
+    assert [e["rpe"] for e in load_journal_entries(test_user, limit=1)] == [6]
+    assert [e["rpe"] for e in load_journal_range(test_user, date(2026, 1, 1), date(2026, 1, 6))] == [4]
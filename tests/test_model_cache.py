@@ -0,0 +1,124 @@
+import threading
+
+from modules.model_cache import ModelCache
+
+GB = 1024 ** 3
+
+
+class FakeLoader:
+    """Returns ("weights", key) and records every load; sizes come from a per-key table."""
+
+    def __init__(self, sizes, gate=None):
+        self.sizes = sizes
+        self.gate = gate
+        self.loads = []
+
+    def __call__(self, key):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.loads.append(key)
+        return ("weights", key)
+
+    def size_of(self, value):
+        return self.sizes[value[1]]
+
+
+def _cache(sizes, max_bytes=10 * GB, gate=None):
+    loader = FakeLoader(sizes, gate)
+    return ModelCache(loader, max_bytes, size_of=loader.size_of), loader
+
+
+# =====================================================================
+# get / LRU eviction
+# =====================================================================
+
+def test_get_loads_once_and_counts_hits():
+    cache, loader = _cache({"phi4": 8 * GB})
+    assert cache.get("phi4") == ("weights", "phi4")
+    assert cache.get("phi4") == ("weights", "phi4")
+    assert loader.loads == ["phi4"]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["resident_bytes"] == 8 * GB
+    assert "phi4" in stats["load_seconds"]
+
+
+def test_switching_between_models_that_fit_does_not_reload():
+    cache, loader = _cache({"deepseek": 4 * GB, "phi4": 5 * GB})
+    for key in ["deepseek", "phi4", "deepseek", "phi4"]:
+        cache.get(key)
+    assert loader.loads == ["deepseek", "phi4"]
+    assert cache.stats()["models"] == ["deepseek", "phi4"]
+
+
+def test_evicts_least_recently_used_by_size():
+    cache, loader = _cache({"a": 4 * GB, "b": 4 * GB, "c": 4 * GB})
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")  # b is now least recently used
+    cache.get("c")
+
+    assert "b" not in cache
+    assert cache.stats()["models"] == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_model_is_kept_alone():
+    cache, _ = _cache({"small": 2 * GB, "huge": 20 * GB})
+    cache.get("small")
+    cache.get("huge")
+    assert cache.stats()["models"] == ["huge"]
+
+
+def test_failed_load_is_not_cached():
+    calls = []
+
+    def flaky(key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise OSError("download interrupted")
+        return "weights"
+
+    cache = ModelCache(flaky, GB)
+    try:
+        cache.get("phi4")
+    except OSError:
+        pass
+    assert cache.get("phi4") == "weights"
+    assert calls == ["phi4", "phi4"]
+
+
+# =====================================================================
+# background preload
+# =====================================================================
+
+def test_preload_loads_in_background():
+    gate = threading.Event()
+    cache, loader = _cache({"phi4": GB}, gate=gate)
+    future = cache.preload("phi4")
+    assert "phi4" not in cache
+
+    gate.set()
+    assert future.result(timeout=5) == ("weights", "phi4")
+    assert "phi4" in cache
+    assert cache.preload("phi4").result() == ("weights", "phi4")
+    assert loader.loads == ["phi4"]
+
+
+def test_get_during_preload_waits_instead_of_loading_twice():
+    gate = threading.Event()
+    cache, loader = _cache({"phi4": GB}, gate=gate)
+    future = cache.preload("phi4")
+    assert cache.preload("phi4") is future
+
+    result = {}
+    reader = threading.Thread(target=lambda: result.setdefault("value", cache.get("phi4")))
+    reader.start()
+    gate.set()
+    reader.join(timeout=5)
+    future.result(timeout=5)
+
+    assert result["value"] == ("weights", "phi4")
+    assert loader.loads == ["phi4"]
@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+from modules.ollama_client import OllamaClient, resolve_host, DEFAULT_OLLAMA_HOST
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the server keeps the connection open between requests
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests_seen.append(payload)
+        if payload.get("stream"):
+            lines = [{"response": "Easy ", "done": False}, {"response": "day.", "done": False},
+                     {"response": "", "done": True, "eval_count": 2}]
+            body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        else:
+            body = json.dumps({"response": "Easy day.", "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama_server():
+    _FakeOllamaHandler.requests_seen = []
+    server = HTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+# =====================================================================
+# configuration
+# =====================================================================
+
+def test_resolve_host(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)
+    assert resolve_host() == DEFAULT_OLLAMA_HOST
+    assert resolve_host("http://gpu-box:11434/") == "http://gpu-box:11434"
+    monkeypatch.setenv("OLLAMA_HOST", "0.0.0.0:11500")
+    assert resolve_host() == "http://0.0.0.0:11500"
+
+
+def test_requests_send_timeouts_and_keep_alive():
+    client = OllamaClient(host="http://ollama:11434", connect_timeout=1, read_timeout=60, keep_alive="1h")
+    mock_resp = MagicMock()
+    mock_resp.json.return_value = {"response": "ok"}
+    with patch.object(client.session, "post", return_value=mock_resp) as mock_post:
+        assert client.generate("phi4", "Hi")["response"] == "ok"
+    args, kwargs = mock_post.call_args
+    assert args[0] == "http://ollama:11434/api/generate"
+    assert kwargs["timeout"] == (1, 60)
+    assert kwargs["json"]["keep_alive"] == "1h"
+    assert kwargs["json"]["stream"] is False
+
+
+def test_errors_are_counted_and_raised():
+    client = OllamaClient(host="http://ollama:11434")
+    with patch.object(client.session, "post", side_effect=requests.exceptions.ConnectionError):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.generate("phi4", "Hi")
+    metrics = client.metrics()
+    assert metrics["requests"] == 1
+    assert metrics["errors"] == 1
+
+
+# =====================================================================
+# pooled session against a local server
+# =====================================================================
+
+def test_connection_is_reused_across_turns(ollama_server):
+    client = OllamaClient(host=ollama_server)
+    for _ in range(3):
+        assert client.generate("phi4", "Hi")["response"] == "Easy day."
+    chunks = list(client.stream_generate("phi4", "Hi"))
+    assert [c["response"] for c in chunks] == ["Easy ", "day.", ""]
+    assert chunks[-1]["eval_count"] == 2
+
+    metrics = client.metrics()
+    assert metrics["requests"] == 4
+    assert metrics["errors"] == 0
+    assert metrics["connections_opened"] == 1
+    assert metrics["connections_reused"] == 3
+    assert metrics["avg_latency"] > 0
+    assert all(r["keep_alive"] == client.keep_alive for r in _FakeOllamaHandler.requests_seen)
+    client.close()
@@ -0,0 +1,74 @@
+import json
+import threading
+from datetime import date
+
+from modules.response_cache import ResponseCache, response_cache_key
+
+
+def test_key_depends_on_model_date_and_prompt():
+    base = response_cache_key("phi4", date(2026, 1, 12), "prompt")
+    assert base == response_cache_key("phi4", date(2026, 1, 12), "prompt")
+    assert base != response_cache_key("phi4-mini:3.8b", date(2026, 1, 12), "prompt")
+    assert base != response_cache_key("phi4", date(2026, 1, 13), "prompt")
+    assert base != response_cache_key("phi4", date(2026, 1, 12), "prompt ")
+
+
+def test_get_returns_stored_entry_until_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.json"), ttl_seconds=60, max_entries=10)
+    cache.put("k", "Rest day.", now=1000, duration=4.2)
+
+    assert cache.get("k", now=1030)["response"] == "Rest day."
+    assert cache.get("k", now=1030)["duration"] == 4.2
+    assert cache.get("k", now=1061) is None
+    assert cache.get("missing", now=1000) is None
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.json"), ttl_seconds=3600, max_entries=2)
+    cache.put("a", "A", now=1)
+    cache.put("b", "B", now=2)
+    cache.get("a", now=3)
+    cache.put("c", "C", now=4)
+
+    assert cache.get("b", now=5) is None
+    assert cache.get("a", now=5)["response"] == "A"
+    assert cache.get("c", now=5)["response"] == "C"
+
+
+def test_put_drops_expired_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ResponseCache(str(path), ttl_seconds=10, max_entries=10)
+    cache.put("old", "Old", now=0)
+    cache.put("new", "New", now=100)
+    assert list(json.loads(path.read_text())) == ["new"]
+
+
+def test_damaged_file_is_a_cold_cache(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text('{"k": {"respo')
+    cache = ResponseCache(str(path), ttl_seconds=10, max_entries=10)
+    assert cache.get("k") is None
+    cache.put("k", "fresh")
+    assert cache.get("k")["response"] == "fresh"
+
+
+def test_get_does_not_write_the_file(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ResponseCache(str(path), ttl_seconds=60, max_entries=10)
+    cache.put("k", "Rest day.", now=1000)
+    before = path.read_text()
+    assert cache.get("k", now=1010)["response"] == "Rest day."
+    assert path.read_text() == before
+
+
+def test_instances_for_one_file_do_not_lose_puts(tmp_path):
+    path = str(tmp_path / "cache.json")
+    threads = [
+        threading.Thread(target=lambda i=i: ResponseCache(path, 3600, 100).put(f"k{i}", str(i)))
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(json.loads(open(path).read())) == 20
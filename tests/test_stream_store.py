@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from modules.stream_store import (
+    write_streams, read_tier, has_streams, downsample, to_samples, compute_laps, choose_tier,
+    aerobic_decoupling, chart_series, format_laps_for_ai,
+)
+
+START = 1_769_583_600
+
+
+def _run(seconds=3600, speed=3.0, hr_from=130, hr_to=160):
+    return {
+        "timestamp": np.arange(seconds) + START,
+        "heart_rate": np.linspace(hr_from, hr_to, seconds),
+        "speed": np.full(seconds, speed),
+        "distance": np.arange(seconds) * speed,
+        "altitude": np.r_[np.linspace(100, 150, seconds // 2), np.linspace(150, 100, seconds - seconds // 2)],
+    }
+
+
+# =====================================================================
+# tiers
+# =====================================================================
+
+def test_write_and_memory_map_tiers(tmp_path):
+    streams_dir = str(tmp_path)
+    assert not has_streams(streams_dir, 1)
+    assert read_tier(streams_dir, 1, "1s") is None
+
+    write_streams(streams_dir, 1, _run())
+
+    assert has_streams(streams_dir, 1)
+    one_second = read_tier(streams_dir, 1, "1s")
+    assert isinstance(one_second, np.memmap)
+    assert not one_second.flags.writeable
+    assert [len(read_tier(streams_dir, 1, tier)) for tier in ("1s", "10s", "60s")] == [3600, 360, 60]
+
+
+def test_downsample_averages_and_ignores_gaps():
+    records = _run(seconds=20)
+    records["heart_rate"][:5] = np.nan
+    tier = downsample(to_samples(records), 10)
+    assert list(tier["timestamp"]) == [START, START + 10]
+    assert tier["heart_rate"][0] == pytest.approx(np.mean(records["heart_rate"][5:10]))
+    assert tier["speed"][1] == pytest.approx(3.0)
+
+
+def test_to_samples_sorts_and_fills_missing_streams():
+    samples = to_samples({"timestamp": np.array([START + 1, START]), "heart_rate": np.array([150, 140])})
+    assert list(samples["heart_rate"]) == [140, 150]
+    assert np.isnan(samples["power"]).all()
+
+
+def test_choose_tier_fits_the_viewport():
+    assert choose_tier(500, 600) == "1s"
+    assert choose_tier(3600, 600) == "10s"
+    assert choose_tier(36000, 600) == "60s"
+    assert choose_tier(360000, 600) == "60s"
+
+
+# =====================================================================
+# laps and prompt summaries
+# =====================================================================
+
+def test_laps_split_by_kilometre():
+    laps = compute_laps(to_samples(_run(seconds=1200, speed=2.5)))
+    assert list(laps["lap"]) == [1, 2, 3]
+    assert laps["distance_m"][0] == pytest.approx(1000, abs=3)
+    assert laps["distance_m"][-1] == pytest.approx(997.5, abs=3)
+    assert laps["duration_s"][0] == 400
+    assert laps["avg_speed"][0] == pytest.approx(2.5)
+    assert laps["elevation_gain"].sum() == pytest.approx(50, abs=0.5)
+
+
+def test_no_distance_stream_means_no_laps():
+    records = _run(seconds=60)
+    del records["distance"]
+    assert len(compute_laps(to_samples(records))) == 0
+
+
+def test_decoupling_tracks_heart_rate_drift():
+    assert aerobic_decoupling(to_samples(_run(hr_from=140, hr_to=140))) == pytest.approx(0, abs=1e-4)
+    assert aerobic_decoupling(to_samples(_run(hr_from=130, hr_to=160))) > 5
+    records = _run(seconds=60)
+    records["heart_rate"][:] = np.nan
+    assert aerobic_decoupling(to_samples(records)) is None
+
+
+def test_format_laps_for_ai(tmp_path):
+    streams_dir = str(tmp_path)
+    assert format_laps_for_ai(streams_dir, 1) is None
+    write_streams(streams_dir, 1, _run(seconds=1000, speed=3.0))
+    line = format_laps_for_ai(streams_dir, 1)
+    assert line.startswith("  Splits (/km): 1: 5:33 ")
+    assert "| Decoupling: +" in line
+
+
+def test_chart_series_pace_is_nan_when_stopped():
+    records = _run(seconds=120)
+    records["speed"][60:] = 0
+    minutes, heart_rate, pace = chart_series(to_samples(records))
+    assert minutes[-1] == pytest.approx(119 / 60)
+    assert pace[0] == pytest.approx(1000 / 3.0 / 60)
+    assert np.isnan(pace[-1])
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time as time_module
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from modules.data_manager import ensure_user_dirs, load_sync_report, load_garmin_activities
+from modules.garmin_client import get_token_dir, user_sync_lock
+from modules.sync_scheduler import BackoffBudget, authenticated_users, run_sync, main
+
+
+class FakeGarminBackend:
+    """Stands in for garminconnect.Garmin for every athlete of a run."""
+
+    def __init__(self, activities, failures=None, delay=0.0):
+        self.activities = activities
+        # number of leading get_activities_by_date calls that raise
+        self.failures = failures or []
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        # Garmin() / Garmin(email, password)
+        client = MagicMock()
+        client.login.return_value = None
+        client.get_activities_by_date.side_effect = self.get_activities_by_date
+        return client
+
+    def get_activities_by_date(self, start, end):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            error = self.failures.pop(0) if self.failures else None
+        try:
+            time_module.sleep(self.delay)
+            if error:
+                raise error
+            return [a for a in self.activities if start <= a["startTimeLocal"][:10] <= end]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _recent_activities():
+    day = date.today() - timedelta(days=1)
+    return [{"activityId": 500, "startTimeLocal": f"{day.isoformat()} 07:00:00", "distance": 10000}]
+
+
+def _authenticate(user_id):
+    ensure_user_dirs(user_id)
+    token_dir = get_token_dir(user_id)
+    os.makedirs(token_dir, exist_ok=True)
+    with open(os.path.join(token_dir, "oauth1_token.json"), "w") as f:
+        f.write('{"token": "abc"}')
+
+
+def _no_sleep(seconds):
+    pass
+
+
+# =====================================================================
+# authenticated_users
+# =====================================================================
+
+def test_authenticated_users_skips_users_without_tokens(data_dirs):
+    _authenticate("ana")
+    _authenticate("ben")
+    ensure_user_dirs("cara")
+    assert authenticated_users() == ["ana", "ben"]
+
+
+# =====================================================================
+# BackoffBudget
+# =====================================================================
+
+def test_backoff_budget_caps_total_retries():
+    budget = BackoffBudget(retries=2)
+    assert budget.allow_retry() and budget.allow_retry()
+    assert budget.allow_retry() is False
+    assert budget.exhausted and budget.retries_used == 2
+
+
+# =====================================================================
+# run_sync
+# =====================================================================
+
+def test_run_sync_syncs_every_authenticated_user(data_dirs):
+    for user_id in ("ana", "ben", "cara"):
+        _authenticate(user_id)
+    backend = FakeGarminBackend(_recent_activities())
+    report = run_sync(client_factory=backend, sleep=_no_sleep)
+
+    assert report["ok"] == 3 and report["failed"] == 0
+    assert set(report["users"]) == {"ana", "ben", "cara"}
+    for user_id in ("ana", "ben", "cara"):
+        assert [a["activityId"] for a in load_garmin_activities(user_id)] == [500]
+    assert load_sync_report()["ok"] == 3
+
+
+def test_run_sync_bounds_concurrency(data_dirs):
+    users = [f"athlete{i}" for i in range(6)]
+    for user_id in users:
+        _authenticate(user_id)
+    backend = FakeGarminBackend(_recent_activities(), delay=0.05)
+    report = run_sync(max_workers=2, client_factory=backend, sleep=_no_sleep)
+    assert report["ok"] == 6
+    assert 1 < backend.max_active <= 2
+
+
+def test_run_sync_jitters_each_start(data_dirs):
+    _authenticate("ana")
+    _authenticate("ben")
+    delays = []
+    run_sync(jitter=10, client_factory=FakeGarminBackend([]), sleep=delays.append, rng=random.Random(1))
+    assert len(delays) == 2
+    assert all(0 <= d <= 10 for d in delays) and delays[0] != delays[1]
+
+
+def test_run_sync_shares_retry_budget(data_dirs, monkeypatch):
+    monkeypatch.setattr("modules.garmin_client.time.sleep", _no_sleep)
+    for user_id in ("ana", "ben", "cara"):
+        _authenticate(user_id)
+    timeout = ValueError("Expecting value: line 1 column 1 (char 0)")
+    backend = FakeGarminBackend(_recent_activities(), failures=[timeout] * 10)
+    report = run_sync(max_workers=1, retry_budget=2, client_factory=backend, sleep=_no_sleep)
+
+    # Two retries are spent on the first athlete, then its sync fails for good
+    assert report["retries_used"] == 2
+    assert report["users"]["ana"]["status"] == "failed"
+    # The rest of the run fails fast instead of retrying against the API
+    assert report["users"]["ben"]["status"] == "skipped"
+    assert report["users"]["cara"]["status"] == "skipped"
+    assert backend.calls == 3
+
+
+def test_run_sync_skips_user_with_sync_in_progress(data_dirs):
+    _authenticate("ana")
+    _authenticate("ben")
+    backend = FakeGarminBackend(_recent_activities())
+    with user_sync_lock("ana"):
+        report = run_sync(client_factory=backend, sleep=_no_sleep)
+    assert report["users"]["ana"]["status"] == "skipped"
+    assert report["users"]["ben"]["status"] == "ok"
+
+
+def test_run_sync_with_no_users_writes_empty_report(data_dirs):
+    report = run_sync(client_factory=FakeGarminBackend([]), sleep=_no_sleep)
+    assert report["users"] == {} and report["ok"] == 0
+    assert load_sync_report()["users"] == {}
+
+
+@pytest.mark.parametrize("argv", [
+    ["--once", "--workers", "0"],
+    ["--once", "--workers", "-2"],
+    ["--once", "--retry-budget", "-1"],
+])
+def test_main_rejects_out_of_range_counts(argv):
+    with patch("modules.sync_scheduler.run_sync") as run:
+        with pytest.raises(SystemExit) as exc:
+            main(argv)
+    assert exc.value.code == 2
+    run.assert_not_called()
+
+
+def test_main_accepts_zero_retry_budget():
+    with patch("modules.sync_scheduler.run_sync", return_value={"failed": 0}) as run:
+        assert main(["--once", "--retry-budget", "0"]) == 0
+    assert run.call_args.kwargs["retry_budget"] == 0
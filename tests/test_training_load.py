@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from modules.activity_frame import normalize_activities
+from modules.data_manager import save_garmin_activities
+from modules.training_load import (
+    daily_load, compute_training_load, format_training_load, load_training_load, acwr_band, TRAINING_LOAD_CACHE,
+)
+
+TODAY = date(2026, 3, 1)
+
+
+def _sessions(minutes_by_day, te=None):
+    """One activity per (days before TODAY, minutes) pair."""
+    acts = []
+    for i, (days_ago, minutes) in enumerate(minutes_by_day):
+        act = {
+            "activityId": i,
+            "startTimeLocal": f"{TODAY - timedelta(days=days_ago)} 08:00:00",
+            "activityType": {"typeKey": "running"},
+            "distance": 10000,
+            "duration": minutes * 60,
+        }
+        if te is not None:
+            act["aerobicTrainingEffect"] = te
+        acts.append(act)
+    return normalize_activities(acts)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    TRAINING_LOAD_CACHE.clear()
+    yield
+    TRAINING_LOAD_CACHE.clear()
+
+
+# =====================================================================
+# load model
+# =====================================================================
+
+def test_daily_load_fills_rest_days_and_weights_by_te():
+    load = daily_load(_sessions([(3, 40), (3, 20), (1, 30)], te=2.0), TODAY)
+    assert list(load) == [120.0, 0.0, 60.0, 0.0]
+
+
+def test_steady_load_gives_acwr_one():
+    loads = compute_training_load(_sessions([(d, 60) for d in range(40)]), TODAY)
+    assert loads["acwr"].iloc[-1] == pytest.approx(1.0)
+    # No day-to-day variation: monotony is undefined rather than infinite
+    assert np.isnan(loads["monotony"].iloc[-1])
+
+
+def test_spike_raises_acwr():
+    history = [(d, 30) for d in range(7, 35)] + [(d, 90) for d in range(7)]
+    loads = compute_training_load(_sessions(history), TODAY)
+    # acute 90 vs chronic (21 * 30 + 7 * 90) / 28 = 45
+    assert loads["acwr"].iloc[-1] == pytest.approx(2.0)
+    assert acwr_band(loads["acwr"].iloc[-1]) == "spike - high injury risk"
+
+
+def test_fitness_fatigue_match_the_recurrence():
+    loads = compute_training_load(_sessions([(d, 10 * (d % 3)) for d in range(20)]), TODAY)
+    ctl = atl = 0.0
+    for i, value in enumerate(loads["load"]):
+        ctl = value if i == 0 else ctl + (value - ctl) / 42
+        atl = value if i == 0 else atl + (value - atl) / 7
+    assert loads["ctl"].iloc[-1] == pytest.approx(ctl)
+    assert loads["tsb"].iloc[-1] == pytest.approx(ctl - atl)
+
+
+def test_monotony_and_strain():
+    loads = compute_training_load(_sessions([(d, 60) for d in range(0, 7, 2)]), TODAY)
+    week = loads["load"].iloc[-7:]
+    monotony = week.mean() / week.std(ddof=0)
+    assert loads["monotony"].iloc[-1] == pytest.approx(monotony)
+    assert loads["strain"].iloc[-1] == pytest.approx(week.sum() * monotony)
+
+
+def test_format_training_load():
+    assert format_training_load(compute_training_load(_sessions([]), TODAY)) == "No training load history."
+    text = format_training_load(compute_training_load(_sessions([(d, 60) for d in range(30)]), TODAY))
+    assert "ACWR (7d vs 28d): 1.00 (in the 0.8-1.3 range)" in text
+    assert "Form TSB:" in text
+
+
+# =====================================================================
+# per-day cache
+# =====================================================================
+
+def test_cached_until_activities_or_date_change(test_user, weekly_activities):
+    save_garmin_activities(test_user, weekly_activities)
+    with patch("modules.training_load.compute_training_load", wraps=compute_training_load) as compute:
+        first = load_training_load(test_user, TODAY)
+        assert load_training_load(test_user, TODAY) is first
+        assert compute.call_count == 1
+
+        load_training_load(test_user, TODAY + timedelta(days=1))
+        assert compute.call_count == 2
+
+        save_garmin_activities(test_user, [dict(weekly_activities[0], activityId=999, startTimeLocal="2026-02-28 08:00:00")])
+        load_training_load(test_user, TODAY + timedelta(days=1))
+        assert compute.call_count == 3
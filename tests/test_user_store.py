@@ -0,0 +1,68 @@
+import os
+from datetime import date
+from unittest.mock import patch
+
+from modules.user_store import UserStore, get_user_store
+from modules.data_manager import (
+    user_store, load_user_profile, load_coach_plan, load_chat_history, load_model_prompt, load_journal_entries,
+    load_sync_state, prompt_input_stamps, save_coach_plan, save_journal_entry, save_user_profile,
+)
+from modules.garmin_client import is_garmin_authenticated
+
+
+def test_registry_shares_one_store_per_user(tmp_path):
+    users_dir = str(tmp_path)
+    assert get_user_store(users_dir, "alice") is get_user_store(users_dir, "alice")
+    assert get_user_store(users_dir, "alice") is not get_user_store(users_dir, "bob")
+    assert get_user_store(str(tmp_path / "other"), "alice").root == str(tmp_path / "other" / "alice")
+
+
+def test_ensure_creates_the_tree_once(tmp_path):
+    store = UserStore(str(tmp_path), "alice")
+    with patch("modules.user_store.os.makedirs", wraps=os.makedirs) as makedirs:
+        store.ensure()
+        first = makedirs.call_count
+        store.ensure()
+    assert first > 0
+    assert makedirs.call_count == first
+    for directory in (store.journal_dir, store.prompts_dir, store.garmin_dir, store.inbox_dir, store.processed_dir):
+        assert os.path.isdir(directory)
+
+
+def test_reads_have_no_side_effects(data_dirs):
+    load_user_profile("ghost")
+    load_coach_plan("ghost")
+    load_chat_history("ghost")
+    load_model_prompt("ghost", "phi4")
+    load_journal_entries("ghost")
+    load_sync_state("ghost")
+    prompt_input_stamps("ghost", "phi4")
+    assert not is_garmin_authenticated("ghost")
+    assert not os.path.exists(user_store("ghost").root)
+
+
+def test_activity_reads_have_no_side_effects(data_dirs):
+    from modules.data_manager import (
+        load_garmin_activities, iter_activities, count_activities, query_activities, list_activity_types,
+        load_training_rollups, load_activity_frame,
+    )
+    from modules.gemini_coach import peek_coach_assessment
+    assert load_garmin_activities("ghost") == []
+    assert list(iter_activities("ghost", limit=5)) == []
+    assert count_activities("ghost") == 0
+    assert query_activities("ghost") == []
+    assert list_activity_types("ghost") == []
+    assert load_training_rollups("ghost", date(2026, 1, 30))["weeks"] == []
+    assert load_activity_frame("ghost").empty
+    assert peek_coach_assessment("ghost") is None
+    assert not os.path.exists(user_store("ghost").root)
+
+
+def test_repeated_writes_skip_mkdir(data_dirs):
+    save_user_profile("alice", {"name": "Alice"})
+    with patch("modules.user_store.os.makedirs") as makedirs:
+        save_coach_plan("alice", "Run easy")
+        save_journal_entry("alice", date(2026, 1, 5), {"date": "2026-01-05", "rpe": 4})
+        load_coach_plan("alice")
+    makedirs.assert_not_called()
+    assert load_coach_plan("alice") == "Run easy"